@@ -0,0 +1,115 @@
+"""
+Load test of the recommender behind the app, with concurrent sessions against fake backends.
+
+    python -m benchmarks.app_load_test --sessions 20 --requests 5 --llm-delay 0.5
+    python -m benchmarks.app_load_test --sessions 50 --k 10 --output load.json
+    python -m benchmarks.app_load_test --sessions 20 --result-cache
+
+Every session is a thread that sends the labeled queries (round robin) to one shared,
+warmed-up Recommender, as Streamlit sessions share the cached resource. Reports the
+warm-up time, throughput and latency percentiles of the first (lexical) and the
+refined results as JSON. The LLM and embeddings are local stand-ins. With --result-cache,
+repeated and paraphrased queries are answered from a semantic result cache.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from benchmarks.report import git_commit, latency_ms, write_report
+from benchmarks.retrieval_eval import load_queries
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter
+from crea_scraper.recommender import RESULT_STAGES, Recommender
+from crea_scraper.result_cache import ResultCache
+
+
+def _session(recommender: Recommender, queries: List[str], k: int) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {stage: [] for stage in RESULT_STAGES}
+    for query in queries:
+        start_time = time.perf_counter()
+        for recommendations in recommender.recommend(query, k):
+            latencies[recommendations.stage].append(time.perf_counter() - start_time)
+    return latencies
+
+
+def run_load_test(
+    queries: List[str],
+    course_data_path: str = "output/course_data.parquet",
+    n_sessions: int = 10,
+    requests_per_session: int = 5,
+    k: int = 10,
+    llm_delay: float = 0.2,
+    llm_concurrency: int = 4,
+    result_cache: bool = False,
+    tfidf_index_path: Optional[str] = None,
+) -> Dict:
+    rewriter = QueryRewriter(FakeLLM(delay=llm_delay), max_concurrency=llm_concurrency)
+    cache = ResultCache() if result_cache else None
+    recommender = Recommender(
+        course_data_path, rewriter, HashEmbeddings(), tfidf_index_path, result_cache=cache
+    ).warm_up()
+    session_queries = [
+        [queries[(i + j) % len(queries)] for j in range(requests_per_session)]
+        for i in range(n_sessions)
+    ]
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(n_sessions) as executor:
+        sessions = list(executor.map(lambda qs: _session(recommender, qs, k), session_queries))
+    wall_seconds = time.perf_counter() - start_time
+
+    n_requests = n_sessions * requests_per_session
+    latencies = {
+        stage: [seconds for session in sessions for seconds in session[stage]]
+        for stage in RESULT_STAGES
+    }
+    report = {
+        "commit": git_commit(),
+        "sessions": n_sessions,
+        "requests": n_requests,
+        "k": k,
+        "llm_delay": llm_delay,
+        "warm_up_seconds": recommender.warm_up_seconds,
+        "wall_seconds": wall_seconds,
+        "requests_per_second": n_requests / wall_seconds,
+        # cache hits only have refined results
+        "latency_ms": {
+            stage: latency_ms(seconds) for stage, seconds in latencies.items() if seconds
+        },
+        "rewriter": dict(rewriter.stats),
+    }
+    if cache is not None:
+        report["result_cache"] = {**cache.stats, "hit_rate": cache.hit_rate}
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", default="benchmarks/queries.jsonl")
+    parser.add_argument("--course-data", default="output/course_data.parquet")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=5, help="Queries per session")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--llm-delay", type=float, default=0.2, help="Seconds per LLM call")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--result-cache", action="store_true", help="Use the result cache")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        [labeled["query"] for labeled in load_queries(args.queries)],
+        args.course_data,
+        n_sessions=args.sessions,
+        requests_per_session=args.requests,
+        k=args.k,
+        llm_delay=args.llm_delay,
+        llm_concurrency=args.llm_concurrency,
+        result_cache=args.result_cache,
+    )
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Local stand-in for the CREA website, replaying a recorded snapshot of its pages.
+
+    # record a snapshot of the live website (once)
+    python -m benchmarks.crea_server record --output benchmarks/snapshot
+
+    # or build a synthetic one from the test fixtures
+    python -m benchmarks.crea_server synthesize --output /tmp/snapshot --n-courses 300
+
+    # serve it, with injected latency and errors
+    python -m benchmarks.crea_server serve --snapshot benchmarks/snapshot --latency 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from crea_scraper.fetch import FetchScheduler
+from crea_scraper.scraper import (
+    COURSE_OVERVIEW_URL,
+    get_course_overview_subpages,
+    get_course_urls_from_overview_subpages,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures")
+CREA_ORIGIN = "https://www.crea.nl"
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # uniformly distributed extra seconds
+    rate_429: float = 0.0  # fraction of requests answered with 429
+    rate_5xx: float = 0.0  # fraction of requests answered with 503
+    etags: bool = True  # answer conditional requests with 304
+
+
+def _path_key(url: str) -> str:
+    return urlsplit(url).path.rstrip("/") or "/"
+
+
+def save_snapshot(path: str, pages: Dict[str, str], origin: str = CREA_ORIGIN) -> None:
+    os.makedirs(path, exist_ok=True)
+    manifest = {"origin": origin, "pages": {}}
+    for i, (url, body) in enumerate(sorted(pages.items())):
+        file_name = f"{i:05d}.html"
+        with open(os.path.join(path, file_name), "w", encoding="utf-8") as f:
+            f.write(body)
+        manifest["pages"][_path_key(url)] = file_name
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_snapshot(path: str, base_url: str) -> Dict[str, str]:
+    """
+    -> {path: body}, with all links to the recorded origin pointing to `base_url` instead
+    """
+    with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    pages = {}
+    for page_path, file_name in manifest["pages"].items():
+        with open(os.path.join(path, file_name), encoding="utf-8") as f:
+            pages[page_path] = f.read().replace(manifest["origin"], base_url)
+    return pages
+
+
+async def _record(overview_url: str) -> Dict[str, str]:
+    async with FetchScheduler(max_requests_per_host=4, requests_per_second=4) as scheduler:
+        subpages = await get_course_overview_subpages(scheduler, base_url=overview_url)
+        course_urls = get_course_urls_from_overview_subpages(subpages)
+        course_pages = await scheduler.fetch_many(course_urls)
+    return {page.url: page.body for page in subpages + course_pages if page is not None}
+
+
+def record_snapshot(path: str, overview_url: str = COURSE_OVERVIEW_URL) -> None:
+    save_snapshot(path, asyncio.run(_record(overview_url)))
+
+
+def synthesize_snapshot(path: str, n_courses: int, courses_per_subpage: int = 12) -> None:
+    """
+    Builds a snapshot of `n_courses` course pages from the saved test fixtures.
+    """
+    overview_url = COURSE_OVERVIEW_URL
+    templates = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            body = f.read()
+        if name.startswith("course_"):
+            url = next(line for line in body.splitlines() if 'rel="alternate"' in line)
+            templates.append((url.split('href="')[1].split('"')[0], body))
+
+    pages, course_urls = {}, []
+    for i in range(n_courses):
+        template_url, template = templates[i % len(templates)]
+        url = f"{template_url.rstrip('/')}-{i}/"
+        pages[url] = template.replace(template_url, url)
+        course_urls.append(url)
+
+    n_subpages = max(1, -(-n_courses // courses_per_subpage))
+    for page_nr in range(1, n_subpages + 1):
+        page_course_urls = course_urls[
+            (page_nr - 1) * courses_per_subpage : page_nr * courses_per_subpage
+        ]
+        items = "".join(
+            f'<li class="course"><a href="{url}">course</a></li>' for url in page_course_urls
+        )
+        pagination = "".join(
+            f'<a class="page-numbers" href="{overview_url}/page/{nr}/">{nr}</a>'
+            for nr in sorted(
+                {1, max(1, page_nr - 1), page_nr, min(n_subpages, page_nr + 1), n_subpages}
+            )
+        )
+        pages[f"{overview_url}/page/{page_nr}/"] = (
+            f'<html><body><ul class="stm-courses">{items}</ul>'
+            f'<nav class="woocommerce-pagination">{pagination}</nav></body></html>'
+        )
+    save_snapshot(path, pages)
+
+
+def create_app(pages: Dict[str, str], faults: Faults) -> web.Application:
+    etags = {
+        path: '"' + hashlib.sha1(body.encode()).hexdigest() + '"' for path, body in pages.items()
+    }
+    stats = {"requests": 0, "429": 0, "5xx": 0, "304": 0}
+    arrivals: List[float] = []  # time.time() of every request, to check the request rate
+
+    async def handler(request: web.Request) -> web.Response:
+        stats["requests"] += 1
+        arrivals.append(time.time())
+        delay = faults.latency + random.uniform(0, faults.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        draw = random.random()
+        if draw < faults.rate_429:
+            stats["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": "0"})
+        if draw < faults.rate_429 + faults.rate_5xx:
+            stats["5xx"] += 1
+            return web.Response(status=503)
+
+        path = request.path.rstrip("/") or "/"
+        if path not in pages:
+            return web.Response(status=404)
+        if faults.etags and request.headers.get("If-None-Match") == etags[path]:
+            stats["304"] += 1
+            return web.Response(status=304)
+        headers = {"ETag": etags[path]} if faults.etags else {}
+        return web.Response(text=pages[path], content_type="text/html", headers=headers)
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    async def get_arrivals(request: web.Request) -> web.Response:
+        return web.json_response(arrivals)
+
+    app = web.Application()
+    app.router.add_get("/_stats", get_stats)
+    app.router.add_get("/_arrivals", get_arrivals)
+    app.router.add_get("/{tail:.*}", handler)
+    return app
+
+
+def serve(snapshot_path: str, port: int, faults: Faults) -> None:
+    base_url = f"http://127.0.0.1:{port}"
+    app = create_app(load_snapshot(snapshot_path, base_url), faults)
+    web.run_app(app, host="127.0.0.1", port=port, print=None)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve_in_background(snapshot_path: str, faults: Optional[Faults] = None) -> Iterator[str]:
+    """
+    Serves the snapshot from a separate process, so it does not count towards
+    the time and memory of whatever is measured. Yields the overview url.
+    """
+    faults = faults if faults is not None else Faults()
+    port = _free_port()
+    process = multiprocessing.Process(target=serve, args=(snapshot_path, port, faults), daemon=True)
+    process.start()
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError as e:
+                if time.monotonic() > deadline or not process.is_alive():
+                    raise RuntimeError("Stand-in CREA server did not start") from e
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}{urlsplit(COURSE_OVERVIEW_URL).path}"
+    finally:
+        process.terminate()
+        process.join()
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    for name, default in asdict(Faults()).items():
+        option = "--" + name.replace("_", "-")
+        if isinstance(default, bool):
+            parser.add_argument("--no-" + name, dest=name, action="store_false")
+        else:
+            parser.add_argument(option, type=float, default=default)
+
+
+def faults_from_args(args: argparse.Namespace) -> Faults:
+    return Faults(**{name: getattr(args, name) for name in asdict(Faults())})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record a snapshot of the live website")
+    record.add_argument("--output", required=True)
+    record.add_argument("--overview-url", default=COURSE_OVERVIEW_URL)
+
+    synthesize = commands.add_parser("synthesize", help="Build a snapshot from the fixtures")
+    synthesize.add_argument("--output", required=True)
+    synthesize.add_argument("--n-courses", type=int, default=300)
+
+    serve_command = commands.add_parser("serve", help="Serve a snapshot")
+    serve_command.add_argument("--snapshot", required=True)
+    serve_command.add_argument("--port", type=int, default=8080)
+    add_fault_arguments(serve_command)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_snapshot(args.output, args.overview_url)
+    elif args.command == "synthesize":
+        synthesize_snapshot(args.output, args.n_courses)
+    else:
+        print(f"Serving on http://127.0.0.1:{args.port}{urlsplit(COURSE_OVERVIEW_URL).path}")
+        serve(args.snapshot, args.port, faults_from_args(args))
+
+
+if __name__ == "__main__":
+    main()
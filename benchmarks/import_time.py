@@ -0,0 +1,110 @@
+"""
+Import time budget check, imports every module in a fresh interpreter with -X importtime.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time crea_scraper.scraper --budget crea_scraper.scraper=800
+
+Reports the import time of every module (best of --repeat runs), its slowest direct
+imports, and the heavy search backends it loaded, as JSON. Exits with code 1 when a
+module is over its budget (in ms) or imports a heavy backend, which should only be
+imported on first use.
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.report import git_commit, write_report
+
+# budgets for a cold container, the scraper needs pandas, aiohttp and bs4 on import
+BUDGETS_MS = {
+    "crea_scraper.scraper": 1500,
+    "crea_scraper.search": 500,
+    "crea_scraper.streamlit": 2500,
+}
+HEAVY_MODULES = ["langchain", "openai", "sklearn", "scipy", "faiss", "tiktoken"]
+
+
+def _parse_importtime(stderr: str, module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    # lines are "import time: self [us] | cumulative | <indent>package", children first
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            slowest = sorted(children, key=lambda child: -child[1])
+            return int(cumulative) / 1000, slowest[:5]
+        if depth == 0:
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+    raise ValueError(f"No import time found for {module}")
+
+
+def measure_import(module: str, repeat: int = 3) -> Dict:
+    """
+    -> import time of `module` in ms (the fastest of `repeat` fresh interpreters), its
+    slowest direct imports, and the heavy backends in sys.modules after the import
+    """
+    loaded = "{name.split('.')[0] for name in sys.modules}"
+    code = f"import sys, {module}; print(*sorted({loaded} & {set(HEAVY_MODULES)!r}))"
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return {"error": result.stderr.strip().splitlines()[-1]}
+        runs.append((_parse_importtime(result.stderr, module), result.stdout.split()))
+    (import_ms, slowest), heavy = min(runs, key=lambda run: run[0][0])
+    return {
+        "import_ms": import_ms,
+        "slowest": {name: ms for name, ms in slowest},
+        "heavy_modules": heavy,
+    }
+
+
+def check(modules: List[str], budgets: Dict[str, float], repeat: int = 3) -> Dict:
+    results = {}
+    for module in modules:
+        result = measure_import(module, repeat)
+        result["budget_ms"] = budgets.get(module)
+        result["ok"] = (
+            "error" not in result
+            and not result["heavy_modules"]
+            and (result["budget_ms"] is None or result["import_ms"] <= result["budget_ms"])
+        )
+        results[module] = result
+    return {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "ok": all(result["ok"] for result in results.values()),
+        "modules": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS_MS))
+    parser.add_argument(
+        "--budget", action="append", default=[], help="module=ms, overrides the default budget"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for budget in args.budget:
+        module, ms = budget.split("=")
+        budgets[module] = float(ms)
+
+    report = check(args.modules, budgets, args.repeat)
+    write_report(report, args.output)
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the benchmarks: the commit a report belongs to, latency
+percentiles, and writing the JSON report.
+"""
+
+import json
+import subprocess
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_ms(seconds: List[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {f"p{p}": float(np.percentile(ms, p)) for p in [50, 95, 99]}
+
+
+def write_report(report: Dict, output: Optional[str] = None) -> None:
+    """
+    Writes the report as JSON to the output file, or to stdout without one.
+    """
+    report_json = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(report_json + "\n")
+    else:
+        print(report_json)
@@ -0,0 +1,112 @@
+"""
+Offline retrieval evaluation, runs a labeled query file through the batch recommendation api.
+
+    python -m benchmarks.retrieval_eval --queries benchmarks/queries.jsonl --method hybrid --fake
+    python -m benchmarks.retrieval_eval --method tfidf --k 5 --batch-size 8 --output eval.json
+
+Every line of the query file is {"query": ..., "relevant": [course name, ...]}. Reports
+recall@k and MRR, together with latency percentiles of every search stage, as JSON.
+With --fake, the LLM and embeddings are local stand-ins, so no network is needed.
+"""
+
+import argparse
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from benchmarks.report import git_commit, latency_ms, write_report
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter
+from crea_scraper.search import SearchStats, get_relevant_courses_batch
+
+STAGES = ["rewrite", "load", "score", "rank"]
+
+
+def load_queries(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(
+    labeled_queries: List[Dict],
+    course_data_path: str = "output/course_data.parquet",
+    method: str = "hybrid",
+    k: int = 10,
+    batch_size: int = 1,
+    rewriter: Optional[QueryRewriter] = None,
+    embeddings: Optional[Embeddings] = None,
+    tfidf_index_path: Optional[str] = None,
+) -> Dict:
+    course_data = load_course_data(course_data_path, columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+
+    recalls, reciprocal_ranks = [], []
+    stage_seconds: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    for start in range(0, len(labeled_queries), batch_size):
+        batch = labeled_queries[start : start + batch_size]
+        stats = SearchStats()
+        results = get_relevant_courses_batch(
+            [labeled["query"] for labeled in batch],
+            courses,
+            method=method,
+            k=k,
+            rewriter=rewriter,
+            embeddings=embeddings,
+            stats=stats,
+            index_path=tfidf_index_path,
+        )
+        for stage in STAGES:
+            stage_seconds[stage].append(stats.stage_seconds[stage])
+
+        for labeled, found in zip(batch, results):
+            relevant = set(labeled["relevant"])
+            names = [course.metadata["naam"] for course in found]
+            recalls.append(len(relevant.intersection(names)) / len(relevant))
+            ranks = [rank for rank, name in enumerate(names, start=1) if name in relevant]
+            reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+
+    return {
+        "commit": git_commit(),
+        "method": method,
+        "k": k,
+        "batch_size": batch_size,
+        "n_queries": len(labeled_queries),
+        f"recall@{k}": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_ms": {stage: latency_ms(seconds) for stage, seconds in stage_seconds.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--queries", default="benchmarks/queries.jsonl")
+    parser.add_argument("--course-data", default="output/course_data.parquet")
+    parser.add_argument("--method", default="hybrid", choices=["hybrid", "tfidf"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--fake", action="store_true", help="Use a fake LLM and embeddings")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = evaluate(
+        load_queries(args.queries),
+        args.course_data,
+        method=args.method,
+        k=args.k,
+        batch_size=args.batch_size,
+        rewriter=QueryRewriter(FakeLLM()) if args.fake else None,
+        embeddings=HashEmbeddings() if args.fake else None,
+    )
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
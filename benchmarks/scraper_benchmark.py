@@ -0,0 +1,132 @@
+"""
+Offline scraper benchmark, runs `scraper.run()` against the local stand-in CREA server.
+
+    python -m benchmarks.scraper_benchmark --n-courses 300 --latency 0.05 --rate-429 0.02
+    python -m benchmarks.scraper_benchmark --snapshot benchmarks/snapshot --output bench.json
+
+Reports pages/sec, wall time per stage, parse time percentiles and peak memory as JSON.
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.crea_server import (
+    Faults,
+    add_fault_arguments,
+    faults_from_args,
+    serve_in_background,
+    synthesize_snapshot,
+)
+from benchmarks.report import git_commit, write_report
+from crea_scraper.cache import PageCache
+from crea_scraper.parsers import DEFAULT_PARSER
+from crea_scraper.scraper import ScrapeStats, run
+
+
+def _percentiles_ms(seconds: List[float]) -> Dict[str, float]:
+    if not seconds:
+        return {}
+    ms = np.array(seconds) * 1000
+    return {
+        "p50": float(np.percentile(ms, 50)),
+        "p90": float(np.percentile(ms, 90)),
+        "p99": float(np.percentile(ms, 99)),
+        "max": float(ms.max()),
+    }
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on linux, and in bytes on macos
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def benchmark(
+    snapshot_path: str,
+    faults: Optional[Faults] = None,
+    n_parse_workers: Optional[int] = None,
+    parser_name: str = DEFAULT_PARSER,
+    max_requests_per_host: int = 8,
+    requests_per_second: float = 1000.0,
+    cache_path: Optional[str] = None,
+) -> Dict:
+    faults = faults if faults is not None else Faults()
+    stats = ScrapeStats()
+    with serve_in_background(snapshot_path, faults) as overview_url:
+        start_time = time.perf_counter()
+        course_data = run(
+            cache=PageCache(cache_path) if cache_path else None,
+            n_parse_workers=n_parse_workers,
+            parser_name=parser_name,
+            max_requests_per_host=max_requests_per_host,
+            requests_per_second=requests_per_second,
+            base_url=overview_url,
+            stats=stats,
+        )
+        wall_seconds = time.perf_counter() - start_time
+        # the parse workers have exited by now, the server (also a child) has not
+        peak_rss_mb = {
+            "main": _peak_rss_mb(resource.RUSAGE_SELF),
+            "parse_workers": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        }
+
+    n_pages = stats.fetch.get("pages", 0)
+    return {
+        "commit": git_commit(),
+        "parser": parser_name,
+        "n_parse_workers": n_parse_workers,
+        "faults": asdict(faults),
+        "n_courses": int(course_data["url"].nunique()) if len(course_data) else 0,
+        "n_rows": len(course_data),
+        "n_pages": n_pages,
+        "wall_seconds": wall_seconds,
+        "pages_per_second": n_pages / wall_seconds if wall_seconds else None,
+        "stage_seconds": stats.stage_seconds,
+        "parse_ms": _percentiles_ms(stats.parse_seconds),
+        "peak_rss_mb": peak_rss_mb,
+        "fetch": stats.fetch,
+        "n_failures": len(stats.failures),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--snapshot", help="Snapshot to replay (default: a synthetic one)")
+    parser.add_argument("--n-courses", type=int, default=300, help="Size of a synthetic snapshot")
+    parser.add_argument("--parser", default=DEFAULT_PARSER)
+    parser.add_argument("--n-parse-workers", type=int, default=None)
+    parser.add_argument("--max-requests-per-host", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=1000.0)
+    parser.add_argument("--cache", help="Page cache directory, to benchmark a re-scrape")
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = args.snapshot
+        if snapshot_path is None:
+            snapshot_path = os.path.join(tmp_dir, "snapshot")
+            synthesize_snapshot(snapshot_path, args.n_courses)
+        report = benchmark(
+            snapshot_path,
+            faults_from_args(args),
+            n_parse_workers=args.n_parse_workers,
+            parser_name=args.parser,
+            max_requests_per_host=args.max_requests_per_host,
+            requests_per_second=args.requests_per_second,
+            cache_path=args.cache,
+        )
+
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+
+def content_hash(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    body: str
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    records_hash: Optional[str] = None  # content hash the records were parsed from
+    records: Optional[Any] = None  # parsed records, as plain json data
+    not_modified: bool = False  # set when the server answered 304 (not persisted)
+
+    def to_json(self) -> Dict:
+        return {
+            "url": self.url,
+            "body": self.body,
+            "content_hash": self.content_hash,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "records_hash": self.records_hash,
+            "records": self.records,
+        }
+
+
+class PageCache:
+    """
+    On-disk page cache keyed by URL.
+
+    Stores the body, the validators (ETag / Last-Modified) and a content hash
+    of every page, together with the records parsed from it. Parsed records
+    are only handed out when they were parsed from the current body, so a
+    page whose content changed always gets parsed again.
+    """
+
+    def __init__(self, path: str = ".cache/pages"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        try:
+            with open(self._file(url), encoding="utf-8") as f:
+                return CachedPage(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _write(self, page: CachedPage) -> None:
+        # write to a temporary file first, so an interrupted run never leaves a corrupt entry
+        tmp_file = self._file(page.url) + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(page.to_json(), f, ensure_ascii=False)
+        os.replace(tmp_file, self._file(page.url))
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        page = self.get(url)
+        headers = {}
+        if page is None:
+            return headers
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def put(
+        self,
+        url: str,
+        body: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> CachedPage:
+        page = CachedPage(
+            url=url,
+            body=body,
+            content_hash=content_hash(body),
+            etag=etag,
+            last_modified=last_modified,
+        )
+        cached = self.get(url)
+        if cached is not None and cached.records_hash == page.content_hash:
+            # same content under new validators, the parsed records are still valid
+            page.records_hash, page.records = cached.records_hash, cached.records
+        self._write(page)
+        return page
+
+    def get_records(self, page: CachedPage) -> Optional[Any]:
+        if page.records_hash == page.content_hash and page.records is not None:
+            return page.records
+        cached = self.get(page.url)
+        if cached is not None and cached.records_hash == page.content_hash:
+            return cached.records
+        return None
+
+    def put_records(self, page: CachedPage, records: Any) -> None:
+        cached = self.get(page.url)
+        if cached is None or cached.content_hash != page.content_hash:
+            cached = page
+        cached.records_hash, cached.records = page.content_hash, records
+        page.records_hash, page.records = page.content_hash, records
+        self._write(cached)
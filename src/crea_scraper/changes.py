@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from crea_scraper.data import COURSE_DATA_COLUMNS, load_course_data
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_PATH = "output/course_changes.jsonl"
+CHANGE_OPS = ["added", "removed", "modified"]
+
+
+def row_keys(df: pd.DataFrame) -> List[str]:
+    # a course (one row) is identified by the page it is listed on and its course number,
+    # or its time slot when it has none
+    return [
+        f"{url}#{cursusnummer or f'{dag_tijd} {startdatum}'}"
+        for cursusnummer, url, dag_tijd, startdatum in zip(
+            df["cursusnummer"], df["url"], df["dag_tijd"], df["startdatum"]
+        )
+    ]
+
+
+def row_fingerprints(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """
+    -> one 64 bit hash per row of the values in `columns`, independent of dtypes like
+    categoricals, so snapshots with different categories compare by value
+    """
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat()
+    return value
+
+
+def _row(df: pd.DataFrame, i: int, columns: List[str]) -> Dict[str, Any]:
+    return {column: _json_value(df[column].iloc[i]) for column in columns}
+
+
+def diff_snapshots(
+    old: pd.DataFrame, new: pd.DataFrame, columns: Optional[List[str]] = None
+) -> List[Dict]:
+    """
+    -> changes from the `old` to the `new` course data, keyed per course (see `row_keys`):
+
+        {"op": "added", "key": ..., "row": {column: value, ...}}
+        {"op": "removed", "key": ..., "row": {column: value, ...}}
+        {"op": "modified", "key": ..., "changes": {column: [old value, new value], ...}}
+
+    Rows are compared by fingerprint first, only the rows whose fingerprint changed
+    are compared field by field, so the diff is linear in the number of rows.
+    """
+    columns = [c for c in (columns or COURSE_DATA_COLUMNS) if c in old.columns and c in new.columns]
+    old_rows = {
+        key: (i, fingerprint)
+        for i, (key, fingerprint) in enumerate(zip(row_keys(old), row_fingerprints(old, columns)))
+    }
+    changes = []
+    new_keys = set()
+    for i, (key, fingerprint) in enumerate(zip(row_keys(new), row_fingerprints(new, columns))):
+        new_keys.add(key)
+        if key not in old_rows:
+            changes.append({"op": "added", "key": key, "row": _row(new, i, columns)})
+            continue
+        j, old_fingerprint = old_rows[key]
+        if fingerprint == old_fingerprint:
+            continue
+        old_row, new_row = _row(old, j, columns), _row(new, i, columns)
+        deltas = {
+            column: [old_row[column], new_row[column]]
+            for column in columns
+            if old_row[column] != new_row[column]
+        }
+        if deltas:
+            changes.append({"op": "modified", "key": key, "changes": deltas})
+    for key, (j, _) in old_rows.items():
+        if key not in new_keys:
+            changes.append({"op": "removed", "key": key, "row": _row(old, j, columns)})
+    return changes
+
+
+def apply_changes(rows: Dict[str, Dict], changes: Iterable[Dict]) -> Dict[str, Dict]:
+    """
+    Applies a change feed to the rows of the old snapshot by key, -> the rows of the new one
+    """
+    rows = {key: dict(row) for key, row in rows.items()}
+    for change in changes:
+        if change["op"] == "added":
+            rows[change["key"]] = dict(change["row"])
+        elif change["op"] == "removed":
+            del rows[change["key"]]
+        else:
+            for column, (_, value) in change["changes"].items():
+                rows[change["key"]][column] = value
+    return rows
+
+
+def snapshot_rows(df: pd.DataFrame) -> Dict[str, Dict]:
+    """
+    -> {key: {column: value}}, the rows of a snapshot as they appear in the change feed
+    """
+    columns = list(df.columns)
+    return {key: _row(df, i, columns) for i, key in enumerate(row_keys(df))}
+
+
+def write_change_feed(changes: Iterable[Dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change, ensure_ascii=False) + "\n")
+
+
+def read_change_feed(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def update_snapshot(
+    new_path: str, snapshot_path: str, change_feed_path: str = CHANGE_FEED_PATH
+) -> Dict[str, int]:
+    """
+    Replaces the course data at `snapshot_path` by the one at `new_path`, and writes
+    the changes between the two to `change_feed_path` (JSONL, one change per line).
+
+    -> the number of added, removed and modified courses
+    """
+    new = load_course_data(new_path)
+    if os.path.exists(snapshot_path):
+        changes = diff_snapshots(load_course_data(snapshot_path), new)
+    else:
+        changes = [
+            {"op": "added", "key": key, "row": row} for key, row in snapshot_rows(new).items()
+        ]
+    write_change_feed(changes, change_feed_path)
+    os.replace(new_path, snapshot_path)
+    counts = {op: sum(change["op"] == op for change in changes) for op in CHANGE_OPS}
+    logger.info(f"Course data changes: {counts}")
+    return counts
@@ -0,0 +1,72 @@
+import logging
+from typing import List, Optional
+
+import typer
+
+from crea_scraper import metrics
+from crea_scraper.parsers import DEFAULT_PARSER
+from crea_scraper.pipeline import FAILED, crea_pipeline
+
+app = typer.Typer(help="Scrapes the CREA courses and builds the search indexes.")
+
+
+@app.command()
+def run(
+    output_dir: str = typer.Option("output", help="Directory of the artifacts and manifests"),
+    cache_dir: str = typer.Option(".cache/pages", help="Page cache of the scraper"),
+    journal_dir: str = typer.Option(".cache/journal", help="Checkpoints of the scraper"),
+    scrape: bool = typer.Option(True, help="Scrape the website, or use the course data on disk"),
+    stage: Optional[List[str]] = typer.Option(None, help="Only run these stages"),
+    force: bool = typer.Option(False, help="Run stages even when they are up to date"),
+    parser: str = typer.Option(DEFAULT_PARSER, help="Parser backend of the scraper"),
+    max_workers: int = typer.Option(4, help="Stages that run at the same time"),
+    metrics_path: Optional[str] = typer.Option(
+        None, "--metrics", help="Write timings and counters here (.json, else Prometheus text)"
+    ),
+) -> None:
+    """
+    Runs the pipeline, skipping the stages whose inputs and outputs did not change.
+    """
+    if metrics_path:
+        metrics.enable()
+    logging.basicConfig(
+        format="%(levelname)s:%(funcName)s:%(lineno)d: %(message)s", level=logging.INFO
+    )
+    pipeline = crea_pipeline(
+        output_dir,
+        cache_dir,
+        journal_dir,
+        scrape=scrape,
+        parser_name=parser,
+        max_workers=max_workers,
+    )
+    results = pipeline.run(force=force, only=stage or None)
+    metrics.dump(metrics_path)
+    for result in results.values():
+        error = f" ({result.error})" if result.error else ""
+        typer.echo(f"{result.name:<12} {result.status:<16} {result.seconds:8.1f}s{error}")
+    if any(result.status in FAILED for result in results.values()):
+        raise typer.Exit(1)
+
+
+@app.command()
+def status(
+    output_dir: str = typer.Option("output", help="Directory of the artifacts and manifests"),
+) -> None:
+    """
+    Shows which stages are up to date with their inputs.
+    """
+    pipeline = crea_pipeline(output_dir, scrape=False)
+    for name, pipeline_stage in pipeline.stages.items():
+        manifest = pipeline.load_manifest(name)
+        if manifest is None:
+            state = "never ran"
+        elif pipeline.is_up_to_date(pipeline_stage):
+            state = "up to date"
+        else:
+            state = "outdated"
+        typer.echo(f"{name:<12} {state}")
+
+
+if __name__ == "__main__":
+    app()
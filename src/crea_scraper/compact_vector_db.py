@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import faiss
+import numpy as np
+import pyarrow as pa
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+
+COMPACT_VECTOR_DB_FILES = ["vectors.faiss", "codes.npy", "docs.arrow", "meta.json"]
+QUANTIZATIONS = ["fp16", "sq8", "pq"]
+
+
+def _quantized_index(vectors: np.ndarray, quantization: str) -> faiss.Index:
+    n, dim = vectors.shape
+    if quantization == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    elif quantization == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    elif quantization == "pq":
+        # 16 dimensions per sub-quantizer, with as many centroids as the data allows
+        n_bits = max(1, min(8, int(math.log2(max(n, 2)))))
+        index = faiss.IndexPQ(dim, max(1, dim // 16), n_bits)
+        index.pq.cp.min_points_per_centroid = 1
+    else:
+        raise ValueError(f"Unknown quantization {quantization}, choose from {QUANTIZATIONS}")
+    index.train(vectors)
+    return index
+
+
+class MemoryMappedIndex:
+    """
+    Quantized vectors as a memory mapped array of codes, with the search api of a
+    FAISS index. Only the trained quantizer is loaded. On the first search, the codes
+    are copied into a clone of it (faiss cannot memory map the codes of these index
+    types), which scores queries in code space, without decoding the vectors.
+    """
+
+    def __init__(self, quantizer: faiss.Index, codes: np.ndarray):
+        self.quantizer = quantizer
+        self.codes = codes
+        self.d = quantizer.d
+        self.ntotal = len(codes)
+        self._index: Optional[faiss.Index] = None
+        self._lock = threading.Lock()
+
+    def _searchable(self) -> faiss.Index:
+        with self._lock:
+            if self._index is None:
+                index = faiss.clone_index(self.quantizer)
+                faiss.copy_array_to_vector(np.ascontiguousarray(self.codes).ravel(), index.codes)
+                index.ntotal = self.ntotal
+                self._index = index
+        return self._index
+
+    def search(self, vectors: np.ndarray, k: int):
+        """
+        -> (distances, rows), both (n_queries, k), by squared L2 distance like IndexFlatL2
+        """
+        return self._searchable().search(np.ascontiguousarray(vectors, dtype="float32"), k)
+
+    def reconstruct_n(self, start: int, n: int) -> np.ndarray:
+        """
+        -> (n, d) decoded vectors of rows `start` to `start + n`
+        """
+        return self.quantizer.sa_decode(np.ascontiguousarray(self.codes[start : start + n]))
+
+
+def vectors_and_documents(db: FAISS):
+    """
+    -> (vectors, documents) of all courses in `db`, in the same order
+    """
+    index = db.index
+    if isinstance(index, faiss.IndexIDMap2):
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    else:
+        ids = np.arange(index.ntotal)
+        vectors = index.reconstruct_n(0, index.ntotal)
+    documents = [db.docstore.search(db.index_to_docstore_id[int(i)]) for i in ids]
+    return vectors, documents
+
+
+def save_compact_vector_db(db: FAISS, path: str, quantization: str = "sq8") -> None:
+    """
+    Saves `db` in the compact format: the trained quantizer as a FAISS index, the codes
+    of the quantized vectors as a .npy array, and the documents in a columnar Arrow
+    file, by row. The codes and documents are memory mapped on load.
+    """
+    vectors, documents = vectors_and_documents(db)
+    columns: Dict[str, List[Any]] = {"page_content": [doc.page_content for doc in documents]}
+    for key in sorted({key for doc in documents for key in doc.metadata}):
+        columns[key] = [doc.metadata.get(key) for doc in documents]
+
+    # write next to the old db first, and swap the metadata last
+    tmp_path = path.rstrip("/") + ".tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    quantizer = _quantized_index(vectors, quantization)
+    faiss.write_index(quantizer, os.path.join(tmp_path, "vectors.faiss"))
+    np.save(os.path.join(tmp_path, "codes.npy"), quantizer.sa_encode(vectors))
+    table = pa.table({key: pa.array(values) for key, values in columns.items()})
+    with pa.OSFile(os.path.join(tmp_path, "docs.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"quantization": quantization, "n": len(documents), "dim": vectors.shape[1]}, f)
+    os.makedirs(path, exist_ok=True)
+    for file in COMPACT_VECTOR_DB_FILES:
+        os.replace(os.path.join(tmp_path, file), os.path.join(path, file))
+    shutil.rmtree(tmp_path)
+
+
+def is_compact_vector_db(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "docs.arrow"))
+
+
+class CompactVectorDb:
+    """
+    Read-only vector db in the compact format, with the search api of langchain's FAISS.
+
+    Both the codes of the vectors and the documents are memory mapped, so loading reads
+    next to nothing (the quantizer only), and processes on one machine share the pages of
+    the documents through the OS page cache. The codes are read into memory on the first
+    search. Documents are only materialized for the returned hits.
+    """
+
+    def __init__(self, path: str, embedding_function: Callable[[str], List[float]]):
+        self.path = path
+        self.embedding_function = embedding_function
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.index = MemoryMappedIndex(
+            faiss.read_index(os.path.join(path, "vectors.faiss")),
+            np.load(os.path.join(path, "codes.npy"), mmap_mode="r"),
+        )
+        self.docs = pa.ipc.open_file(pa.memory_map(os.path.join(path, "docs.arrow"))).read_all()
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def memory_bytes(self) -> int:
+        """
+        -> the size of what is loaded into memory: the trained quantizer and the codes
+        searched, not the documents
+        """
+        return os.path.getsize(os.path.join(self.path, "vectors.faiss")) + self.index.codes.nbytes
+
+    def _documents(self, rows: List[int]) -> List[Document]:
+        records = self.docs.take(rows).to_pylist()
+        return [Document(page_content=r.pop("page_content"), metadata=r) for r in records]
+
+    def _matches(self, rows: np.ndarray, filter: Dict[str, Any]) -> np.ndarray:
+        # reads the filtered columns of the candidate rows only
+        keep = np.ones(len(rows), dtype=bool)
+        for key, values in filter.items():
+            values = set(values) if isinstance(values, list) else {values}
+            column = self.docs.column(key).take(rows).to_pylist()
+            keep &= np.array([value in values for value in column], dtype=bool)
+        return keep
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        fetch_k: int = 20,
+    ) -> List[tuple]:
+        vector = np.array([embedding], dtype="float32")
+        scores, rows = self.index.search(vector, k if filter is None else max(k, fetch_k))
+        found = rows[0] >= 0
+        rows, scores = rows[0][found], scores[0][found]
+        if filter is not None:
+            keep = self._matches(rows, filter)
+            rows, scores = rows[keep], scores[keep]
+        rows, scores = rows[:k], scores[:k]
+        return list(zip(self._documents(rows.tolist()), scores.tolist()))
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        fetch_k: int = 20,
+    ) -> List[Document]:
+        embedding = self.embedding_function(query)
+        hits = self.similarity_search_with_score_by_vector(embedding, k, filter, fetch_k)
+        return [doc for doc, _ in hits]
@@ -1,20 +1,92 @@
+import datetime
+import enum
+import re
 from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 
+DATE_FORMAT = "%d-%m-%Y"  # as shown on the website, e.g. 15-04-2025
+DEFAULT_PRICE_TIER = "overigen"  # the full price, which everyone can pay
 
-class CourseClass:
-    def __post_init__(self):
-        self._replace_commas()
 
-    def _replace_comma(self, attr: str, replacement=";"):
-        self.__setattr__(attr, self.__getattribute__(attr).replace(",", replacement))
+class Weekday(enum.IntEnum):
+    MA = 0
+    DI = 1
+    WO = 2
+    DO = 3
+    VR = 4
+    ZA = 5
+    ZO = 6
+
+
+# the website shows Dutch abbreviations, the English pages English ones
+_WEEKDAYS = {
+    **{day.name.lower(): day for day in Weekday},
+    **{name: day for name, day in zip(["mon", "tue", "wed", "thu", "fri", "sat", "sun"], Weekday)},
+}
+_PRICE_PATTERN = re.compile(r"([^€:]*?)\s*:?\s*€\s*(\d+(?:[.,;]\d\d)?)")
+_TIME_PATTERN = re.compile(r"(\d{1,2}):(\d\d)\s*-\s*(\d{1,2}):(\d\d)")
+_DURATION_PATTERN = re.compile(r"(\d+)\s*(week|weken|weeks|dag|dagen|day|days)\b")
+
+
+def parse_weekday(dag: str) -> Optional[Weekday]:
+    return _WEEKDAYS.get(dag.strip().lower()[:3]) if isinstance(dag, str) else None
+
+
+def parse_time(tijd: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    e.g. "19:45 - 21:45" -> (1185, 1305), in minutes since midnight
+    """
+    match = _TIME_PATTERN.search(tijd) if isinstance(tijd, str) else None
+    if match is None:
+        return None, None
+    start_h, start_m, end_h, end_m = map(int, match.groups())
+    return start_h * 60 + start_m, end_h * 60 + end_m
+
+
+def parse_duration_weeks(duur: str) -> Optional[float]:
+    """
+    e.g. "9 weken" -> 9.0, "5 dagen" -> 0.71
+    """
+    match = _DURATION_PATTERN.search(duur.lower()) if isinstance(duur, str) else None
+    if match is None:
+        return None
+    n, unit = int(match.group(1)), match.group(2)
+    return round(n / 7, 2) if unit.startswith("da") else float(n)
+
+
+def parse_price(prijs: str) -> Dict[str, float]:
+    """
+    e.g. "student:€115jong-alumnus UvA/HvA:€173overigen:€230"
+    -> {"student": 115.0, "jong-alumnus UvA/HvA": 173.0, "overigen": 230.0}
+
+    A price without a tier is taken as the full price.
+    """
+    prices = {}
+    for tier, amount in _PRICE_PATTERN.findall(prijs if isinstance(prijs, str) else ""):
+        prices[tier.strip() or DEFAULT_PRICE_TIER] = float(re.sub("[,;]", ".", amount))
+    return prices
+
 
-    def _replace_commas(self, replacement=";"):
-        for attr in self.__dict__.keys():
-            self._replace_comma(attr, replacement)
+def parse_date(startdatum: str) -> Optional[datetime.date]:
+    try:
+        return datetime.datetime.strptime(startdatum, DATE_FORMAT).date()
+    except (TypeError, ValueError):
+        return None
+
+
+class CourseClass:
+    # subclasses list their fields as __slots__ (in field order),
+    # so records are compact and have no __dict__
+    __slots__: Tuple[str, ...] = ()
+
+    def values(self) -> Tuple[str, ...]:
+        return tuple(self.__getattribute__(attr) for attr in self.__slots__)
 
 
 @dataclass
 class CourseGeneralInfo(CourseClass):
+    __slots__ = ("url", "naam", "categorie", "beschrijving")
+
     url: str
     naam: str  # e.g. zangles
     categorie: str  # e.g. muziek
@@ -23,6 +95,21 @@ class CourseGeneralInfo(CourseClass):
 
 @dataclass
 class Course(CourseClass):
+    __slots__ = (
+        "naam",
+        "dag",
+        "tijd",
+        "dag_tijd",
+        "startdatum",
+        "duur",
+        "periode",
+        "prijs",
+        "cursusnummer",
+        "docent",
+        "taal",
+        "status",
+    )
+
     naam: str  # e.g zangles
 
     dag: str  # e.g. ma, di, ...
@@ -38,3 +125,29 @@ class Course(CourseClass):
     docent: str  # e.g. Yke Rusticus
     taal: str  # e.g. 🇳🇱
     status: str  # e.g. open
+
+    # typed views on the raw values shown on the website
+
+    @property
+    def weekdag(self) -> Optional[Weekday]:
+        return parse_weekday(self.dag)
+
+    @property
+    def start_minuut(self) -> Optional[int]:
+        return parse_time(self.tijd)[0]
+
+    @property
+    def eind_minuut(self) -> Optional[int]:
+        return parse_time(self.tijd)[1]
+
+    @property
+    def duur_weken(self) -> Optional[float]:
+        return parse_duration_weeks(self.duur)
+
+    @property
+    def prijzen(self) -> Dict[str, float]:
+        return parse_price(self.prijs)
+
+    @property
+    def startdatum_datum(self) -> Optional[datetime.date]:
+        return parse_date(self.startdatum)
@@ -0,0 +1,212 @@
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from crea_scraper.course import (
+    DATE_FORMAT,
+    DEFAULT_PRICE_TIER,
+    Weekday,
+    parse_duration_weeks,
+    parse_price,
+    parse_time,
+    parse_weekday,
+)
+
+
+@dataclass
+class CourseQuery:
+    """
+    Combined filter on the course data, fields that are None are not filtered on.
+
+    e.g. Tuesday evenings, under €150 for students, starting after March, in English:
+
+        CourseQuery(
+            weekdays=[Weekday.DI],
+            starts_after=18 * 60,
+            max_price=150,
+            price_tier="student",
+            starts_from=datetime.date(2025, 4, 1),
+            languages=["English"],
+        )
+    """
+
+    weekdays: Optional[List[Weekday]] = None
+    starts_after: Optional[int] = None  # minutes since midnight
+    ends_before: Optional[int] = None  # minutes since midnight
+    max_price: Optional[float] = None
+    price_tier: str = DEFAULT_PRICE_TIER
+    starts_from: Optional[datetime.date] = None
+    starts_until: Optional[datetime.date] = None
+    max_weeks: Optional[float] = None
+    languages: Optional[List[str]] = None  # any of
+    statuses: Optional[List[str]] = None  # any of
+    categories: Optional[List[str]] = None  # any of
+
+
+def _split(value, separators: str = ",;/") -> List[str]:
+    if not isinstance(value, str):
+        return []
+    return [part.strip() for part in re.split(f"[{separators}]", value) if part.strip()]
+
+
+def _dates_as_days(values: pd.Series) -> np.ndarray:
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, format=DATE_FORMAT, errors="coerce")
+    days = values.to_numpy(dtype="datetime64[D]").astype("float64")
+    days[values.isna().to_numpy()] = np.nan
+    return days
+
+
+def _date_as_days(date: datetime.date) -> float:
+    return float(np.datetime64(date, "D").astype("int64"))
+
+
+class _SortedColumn:
+    """
+    Numeric column kept in sorted order, so range filters are two binary searches.
+    Missing values (NaN) sort last and never match a range.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.order = np.argsort(values, kind="stable")
+        self.values = values[self.order]
+        self.n_valid = int(np.count_nonzero(~np.isnan(self.values)))
+
+    def range_mask(self, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        valid = self.values[: self.n_valid]
+        start = 0 if low is None else np.searchsorted(valid, low, side="left")
+        stop = self.n_valid if high is None else np.searchsorted(valid, high, side="right")
+        mask = np.zeros(len(self.order), dtype=bool)
+        mask[self.order[start:stop]] = True
+        return mask
+
+
+class CourseIndex:
+    """
+    In-memory index on the typed schedule, price and status fields of the course data.
+
+    Weekday, language, status and category get a bitmap (boolean array) per value, the
+    numeric fields a sorted column. A query combines these with a few vectorized and's.
+    Build it once, e.g. with `CourseIndex(load_course_data(path))`.
+    """
+
+    def __init__(self, course_data: pd.DataFrame):
+        self.course_data = course_data.reset_index(drop=True)
+        self.urls = self.course_data["url"].to_numpy()
+        n_rows = len(self.course_data)
+
+        self._bitmaps: Dict[str, Dict] = {
+            "weekday": self._build_bitmaps(
+                [parse_weekday(dag) for dag in self.course_data["dag"]], n_rows
+            ),
+            "taal": self._build_bitmaps(
+                [_split(taal) for taal in self.course_data["taal"]], n_rows
+            ),
+            "status": self._build_bitmaps(self.course_data["status"], n_rows),
+            "categorie": self._build_bitmaps(
+                [_split(categorie, "/") for categorie in self.course_data["categorie"]], n_rows
+            ),
+        }
+
+        times = [parse_time(tijd) for tijd in self.course_data["tijd"]]
+        prices = [parse_price(prijs) for prijs in self.course_data["prijs"]]
+        tiers = sorted({tier for course_prices in prices for tier in course_prices})
+        self._columns: Dict[str, _SortedColumn] = {
+            "start_minuut": self._build_column(start for start, _ in times),
+            "eind_minuut": self._build_column(end for _, end in times),
+            "duur_weken": self._build_column(
+                parse_duration_weeks(duur) for duur in self.course_data["duur"]
+            ),
+            "startdatum": _SortedColumn(_dates_as_days(self.course_data["startdatum"])),
+            # courses without a price for some tier can be taken at the full price
+            **{
+                f"prijs:{tier}": self._build_column(
+                    p.get(tier, p.get(DEFAULT_PRICE_TIER)) for p in prices
+                )
+                for tier in tiers
+            },
+        }
+
+    @staticmethod
+    def _build_bitmaps(values: Iterable, n_rows: int) -> Dict:
+        bitmaps: Dict = {}
+        for row, row_values in enumerate(values):
+            if not isinstance(row_values, list):
+                row_values = [] if row_values is None or pd.isna(row_values) else [row_values]
+            for value in row_values:
+                if value not in bitmaps:
+                    bitmaps[value] = np.zeros(n_rows, dtype=bool)
+                bitmaps[value][row] = True
+        return bitmaps
+
+    @staticmethod
+    def _build_column(values: Iterable[Optional[float]]) -> _SortedColumn:
+        return _SortedColumn(
+            np.array([np.nan if v is None else v for v in values], dtype="float64")
+        )
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def values(self, field: str) -> List:
+        """
+        The distinct values of a bitmap field (weekday, taal, status or categorie).
+        """
+        return list(self._bitmaps[field])
+
+    def _any_of(self, field: str, values: Iterable) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        for value in values:
+            bitmap = self._bitmaps[field].get(value)
+            if bitmap is not None:
+                mask |= bitmap
+        return mask
+
+    def mask(self, query: CourseQuery) -> np.ndarray:
+        mask = np.ones(len(self), dtype=bool)
+        if query.weekdays is not None:
+            mask &= self._any_of("weekday", query.weekdays)
+        if query.languages is not None:
+            mask &= self._any_of("taal", query.languages)
+        if query.statuses is not None:
+            mask &= self._any_of("status", query.statuses)
+        if query.categories is not None:
+            mask &= self._any_of("categorie", query.categories)
+        if query.starts_after is not None:
+            mask &= self._columns["start_minuut"].range_mask(low=query.starts_after)
+        if query.ends_before is not None:
+            mask &= self._columns["eind_minuut"].range_mask(high=query.ends_before)
+        if query.max_weeks is not None:
+            mask &= self._columns["duur_weken"].range_mask(high=query.max_weeks)
+        if query.starts_from is not None or query.starts_until is not None:
+            mask &= self._columns["startdatum"].range_mask(
+                low=None if query.starts_from is None else _date_as_days(query.starts_from),
+                high=None if query.starts_until is None else _date_as_days(query.starts_until),
+            )
+        if query.max_price is not None:
+            column = self._columns.get(
+                f"prijs:{query.price_tier}", self._columns.get(f"prijs:{DEFAULT_PRICE_TIER}")
+            )
+            if column is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= column.range_mask(high=query.max_price)
+        return mask
+
+    def query(self, query: CourseQuery) -> np.ndarray:
+        """
+        -> row numbers of the matching courses
+        """
+        return np.flatnonzero(self.mask(query))
+
+    def filter(self, query: CourseQuery) -> pd.DataFrame:
+        return self.course_data.iloc[self.query(query)]
+
+    def query_urls(self, query: CourseQuery) -> Set[str]:
+        """
+        -> urls of the course pages with at least one matching course, to pre-filter search
+        """
+        return set(self.urls[self.mask(query)])
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from crea_scraper.cache import CachedPage, PageCache
+from crea_scraper.course import Course, CourseGeneralInfo
+from crea_scraper.data import CourseDataBuilder, CourseDataWriter
+from crea_scraper.fetch import FetchScheduler
+from crea_scraper.frontier import FRONTIER_PATH, Frontier, Lease
+from crea_scraper.metrics import count
+from crea_scraper.scraper import ScrapeStats, cache_course_data, get_cached_course_data
+from crea_scraper.sites import COURSE, OVERVIEW, CreaSite, SiteAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def _course_records(
+    site: SiteAdapter, url: str, page: CachedPage, cache: Optional[PageCache]
+) -> Dict:
+    # parses the page, or reuses the records parsed from an identical page before
+    course_data = get_cached_course_data(page, cache)
+    if course_data is None:
+        course_data = site.extract(url, page.body)
+        cache_course_data(page, *course_data, cache)
+    general_info, courses = course_data
+    return {
+        "general_info": asdict(general_info),
+        "courses": [asdict(course) for course in courses],
+    }
+
+
+async def _crawl_url(
+    scheduler: FetchScheduler, frontier: Frontier, site: SiteAdapter, lease: Lease
+) -> None:
+    """
+    Fetches a leased url, and adds the links of an overview page to the frontier or
+    stores the records of a course page. A url that fails is not tried again.
+
+    Parsing and the frontier (SQLite) run in threads, so they don't block the fetches.
+    """
+    delay = lease.not_before - time.time()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    page = await scheduler.try_fetch(lease.url)
+    if page is None:
+        error = scheduler.failures.get(lease.url, "page not found")
+        count("failures.fetch")
+        await asyncio.to_thread(frontier.fail, lease.url, f"fetch: {error}")
+        return
+    try:
+        if lease.kind == OVERVIEW:
+            links = await asyncio.to_thread(site.discover, lease.url, page.body)
+            for kind, urls in links.items():
+                await asyncio.to_thread(frontier.add, urls, site.name, kind)
+            await asyncio.to_thread(frontier.complete, lease.url)
+            return
+        records = await asyncio.to_thread(_course_records, site, lease.url, page, scheduler.cache)
+    except Exception as e:
+        logger.error(f"Could not parse {lease.url} ({e!r})")
+        count("failures.parse")
+        await asyncio.to_thread(frontier.fail, lease.url, f"parse: {e!r}")
+        return
+    await asyncio.to_thread(frontier.complete, lease.url, records)
+
+
+async def _work(
+    scheduler: FetchScheduler,
+    frontier: Frontier,
+    sites: Dict[str, SiteAdapter],
+    worker: str,
+    max_in_flight: int,
+    poll_interval: float,
+) -> None:
+    tasks = set()
+    async with scheduler:
+        while True:
+            if len(tasks) < max_in_flight:
+                leases = await asyncio.to_thread(frontier.lease, worker, max_in_flight - len(tasks))
+                for lease in leases:
+                    crawl_url = _crawl_url(scheduler, frontier, sites[lease.site], lease)
+                    tasks.add(asyncio.ensure_future(crawl_url))
+            if not tasks:
+                # other workers can still find new urls on the pages they crawl
+                if not await asyncio.to_thread(frontier.has_work):
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+            done, tasks = await asyncio.wait(
+                tasks, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+
+
+def _crawl_worker(
+    worker: str,
+    frontier_path: str,
+    sites: Dict[str, SiteAdapter],
+    cache: Optional[PageCache],
+    max_requests_per_host: int,
+    requests_per_second: float,
+    max_in_flight: int,
+    poll_interval: float,
+) -> Dict[str, int]:
+    """
+    Runs in a crawl worker process, until the frontier is empty. -> the fetch stats
+    """
+    frontier = Frontier(frontier_path, requests_per_second)
+    scheduler = FetchScheduler(
+        cache=cache,
+        max_requests_per_host=max_requests_per_host,
+        requests_per_second=requests_per_second,
+    )
+    try:
+        asyncio.run(_work(scheduler, frontier, sites, worker, max_in_flight, poll_interval))
+    finally:
+        frontier.close()
+    return dict(scheduler.stats)
+
+
+def crawl(
+    sites: List[SiteAdapter],
+    frontier_path: str = FRONTIER_PATH,
+    cache: Optional[PageCache] = None,
+    output_path: Optional[str] = None,
+    n_workers: int = 4,
+    max_requests_per_host: int = 8,
+    requests_per_second: float = 10.0,
+    max_in_flight: int = 16,
+    poll_interval: float = 0.05,
+    resume: bool = True,
+    stats: Optional[ScrapeStats] = None,
+) -> pd.DataFrame:
+    """
+    Crawls the courses of all `sites` with `n_workers` worker processes, which lease
+    urls from the frontier at `frontier_path` and keep up to `max_in_flight` of them
+    in flight each. Every host is requested at most `requests_per_second` times per
+    second in total, however many workers there are.
+
+    An interrupted crawl is resumed from the frontier, unless `resume` is False.
+    Urls that cannot be fetched or parsed are skipped and listed in `stats.failures`.
+    If an `output_path` is given, the course data is written to it as Parquet.
+    """
+    stats = stats if stats is not None else ScrapeStats()
+    sites_by_name = {site.name: site for site in sites}
+    if len(sites_by_name) != len(sites):
+        raise ValueError("Every site needs a different name")
+
+    frontier = Frontier(frontier_path, requests_per_second)
+    if resume and frontier.has_work():
+        logger.info(f"Resuming the crawl, {frontier.counts()}")
+    else:
+        frontier.clear()
+        for site in sites:
+            frontier.add(site.seed_urls(), site.name, OVERVIEW)
+    # the workers open their own connections
+    frontier.close()
+
+    logger.info(f"Crawling {list(sites_by_name)} with {n_workers} workers ...")
+    start_time = time.perf_counter()
+    stats.fetch = defaultdict(int, stats.fetch)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _crawl_worker,
+                f"worker-{i}",
+                frontier_path,
+                sites_by_name,
+                cache,
+                max_requests_per_host,
+                requests_per_second,
+                max_in_flight,
+                poll_interval,
+            )
+            for i in range(n_workers)
+        ]
+        for future in futures:
+            for name, value in future.result().items():
+                stats.fetch[name] += value
+                count(f"fetch.{name}", value)
+    stats.stage_seconds["crawl"] = time.perf_counter() - start_time
+
+    frontier = Frontier(frontier_path, requests_per_second)
+    stats.failures.update(frontier.failures())
+    if stats.failures:
+        logger.error(f"{len(stats.failures)} pages could not be crawled")
+    builder = CourseDataBuilder()
+    with ExitStack() as stack:
+        stack.callback(frontier.close)
+        writer = stack.enter_context(CourseDataWriter(output_path)) if output_path else None
+        for _, records in frontier.records(COURSE):
+            general_info = CourseGeneralInfo(**records["general_info"])
+            courses = [Course(**course) for course in records["courses"]]
+            builder.add(general_info, courses)
+            if writer is not None:
+                writer.add(general_info, courses)
+    return builder.to_dataframe()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(levelname)s:%(funcName)s:%(lineno)d: %(message)s", level=logging.INFO
+    )
+    start_time = time.perf_counter()
+    crawl([CreaSite()], cache=PageCache(".cache/pages"), output_path="output/crawl_data.parquet")
+    logger.info(f"Crawled in {time.perf_counter() - start_time:.1f}s")
@@ -1,13 +1,44 @@
-from typing import List
+import hashlib
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 
 import pandas as pd
-from langchain.document_loaders import DataFrameLoader
-from langchain.schema import Document
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from crea_scraper.course import DATE_FORMAT, Course, CourseGeneralInfo, parse_date
+from crea_scraper.metrics import span
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+# one row per course, extended with the general info of its course page
+GENERAL_INFO_COLUMNS = [column for column in CourseGeneralInfo.__slots__ if column != "naam"]
+COURSE_DATA_COLUMNS = list(Course.__slots__) + GENERAL_INFO_COLUMNS
+
+# columns with few distinct values are dictionary encoded, the rest are plain strings
+CATEGORICAL_COLUMNS = ["dag", "taal", "status", "categorie"]
+DATE_COLUMNS = ["startdatum"]
+COURSE_DATA_SCHEMA = pa.schema(
+    [
+        (
+            column,
+            (
+                pa.dictionary(pa.int32(), pa.string())
+                if column in CATEGORICAL_COLUMNS
+                else pa.date32() if column in DATE_COLUMNS else pa.string()
+            ),
+        )
+        for column in COURSE_DATA_COLUMNS
+    ]
+)
+
+# the only columns needed to search courses
+SEARCH_COLUMNS = ["naam", "beschrijving", "url", "categorie"]
 
 
 def prepare_for_search(course_data: pd.DataFrame) -> pd.DataFrame:
     return (
-        course_data.drop(columns=["dag", "tijd", "dag_tijd", "startdatum", "status"])
+        course_data[SEARCH_COLUMNS]
         .drop_duplicates(subset=["naam"])
         .reset_index(drop=True)
         .assign(
@@ -19,15 +50,148 @@ def prepare_for_search(course_data: pd.DataFrame) -> pd.DataFrame:
     )
 
 
-def get_course_documents_for_search(data_for_search: pd.DataFrame) -> List[Document]:
+def get_course_documents_for_search(data_for_search: pd.DataFrame) -> List["Document"]:
+    # langchain takes seconds to import, and the scraper never needs it
+    from langchain.document_loaders import DataFrameLoader
+
     loader = DataFrameLoader(data_for_search, "search_info")
     documents = loader.load()
     return documents
 
 
+def get_course_rows(general_info: CourseGeneralInfo, courses: List[Course]) -> List[Tuple]:
+    """
+    -> [(value_1, ..., value_n), ...], in the order of COURSE_DATA_COLUMNS
+    """
+    info = tuple(general_info.__getattribute__(column) for column in GENERAL_INFO_COLUMNS)
+    return [course.values() + info for course in courses]
+
+
+class CourseDataBuilder:
+    """
+    Collects course records in column buffers, and materializes them into a DataFrame once.
+
+    Courses are joined to the general info of their course page by url (through a
+    hash index), so distinct courses that share a name are never mixed up.
+    """
+
+    def __init__(self):
+        self._course_columns: Dict[str, List[str]] = {c: [] for c in Course.__slots__}
+        self._course_info_rows: List[int] = []  # row in the info columns, per course
+        self._info_columns: Dict[str, List[str]] = {c: [] for c in GENERAL_INFO_COLUMNS}
+        self._info_index: Dict[str, int] = {}  # url -> row in the info columns
+
+    def __len__(self) -> int:
+        return len(self._course_info_rows)
+
+    def add(self, general_info: CourseGeneralInfo, courses: List[Course]) -> None:
+        info_row = self._info_index.get(general_info.url)
+        if info_row is None:
+            info_row = self._info_index[general_info.url] = len(self._info_index)
+            for column, values in self._info_columns.items():
+                values.append(general_info.__getattribute__(column))
+        for course in courses:
+            for column, value in zip(Course.__slots__, course.values()):
+                self._course_columns[column].append(value)
+            self._course_info_rows.append(info_row)
+
+    def _columns(self) -> Dict[str, List[str]]:
+        columns = dict(self._course_columns)
+        for column, values in self._info_columns.items():
+            columns[column] = [values[row] for row in self._course_info_rows]
+        return columns
+
+    def to_arrow(self) -> pa.Table:
+        columns = self._columns()
+        for column in DATE_COLUMNS:
+            columns[column] = [parse_date(value) for value in columns[column]]
+        return pa.table(
+            [pa.array(columns[field.name], type=field.type) for field in COURSE_DATA_SCHEMA],
+            schema=COURSE_DATA_SCHEMA,
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        with span("build.dataframe"):
+            return _to_pandas(self.to_arrow())
+
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    # dictionary encoded columns become categoricals, dates become datetime64
+    df = table.to_pandas()
+    for column in DATE_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def _row_hash(values: Tuple) -> int:
+    digest = hashlib.blake2b(repr(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class CourseDataWriter:
+    """
+    Streams course records to a Parquet file as soon as a course page is parsed.
+
+    Records are written in row groups of `row_group_size` courses, duplicate rows are skipped
+    (by a 64 bit hash of the row, so the written rows are not kept in memory).
+    """
+
+    def __init__(self, output_path: str, row_group_size: int = 1000):
+        self.output_path = output_path
+        self.row_group_size = row_group_size
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._builder = CourseDataBuilder()
+        self._written: Set[int] = set()
+
+    def __enter__(self) -> "CourseDataWriter":
+        self._writer = pq.ParquetWriter(self.output_path, COURSE_DATA_SCHEMA)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._flush()
+        self._writer.close()
+
+    def _flush(self) -> None:
+        if len(self._builder):
+            with span("write.row_group"):
+                self._writer.write_table(self._builder.to_arrow())
+            self._builder = CourseDataBuilder()
+
+    def add(self, general_info: CourseGeneralInfo, courses: List[Course]) -> None:
+        new_courses = []
+        for course, values in zip(courses, get_course_rows(general_info, courses)):
+            row_hash = _row_hash(values)
+            if row_hash not in self._written:
+                self._written.add(row_hash)
+                new_courses.append(course)
+        self._builder.add(general_info, new_courses)
+        if len(self._builder) >= self.row_group_size:
+            self._flush()
+
+
+def load_course_data(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Loads the course data from Parquet (typed) or CSV, optionally only the given `columns`.
+    """
+    if path.endswith(".csv"):
+        return pd.read_csv(path, usecols=columns)
+    return _to_pandas(pq.read_table(path, columns=columns))
+
+
 def write_course_data(df: pd.DataFrame, output_path: str) -> None:
+    """
+    Exports the course data to CSV, with commas in values replaced by semicolons.
+    """
+    df = df.copy()
+    for column in DATE_COLUMNS:
+        if column in df and pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime(DATE_FORMAT)
+    for column in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype("string").str.replace(",", ";")
     df.drop_duplicates().to_csv(output_path, index=False, sep=",")
 
 
-def load_course_data(path: str) -> pd.DataFrame:
-    return pd.read_csv(path)
+def export_course_data_csv(path: str, output_path: str) -> None:
+    write_course_data(load_course_data(path), output_path)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = ".cache/embeddings"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache of one model, keyed by the sha256 of the embedded text.
+
+    All vectors are kept in one float32 array file (`vectors.npy`), with a json
+    index from text hash to row next to it.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, model: str = "text-embedding-ada-002"):
+        self.path = os.path.join(path, model)
+        self.model = model
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._n_saved = 0
+        try:
+            with open(os.path.join(self.path, "index.json"), encoding="utf-8") as f:
+                self._rows = json.load(f)
+            self._vectors = np.load(os.path.join(self.path, "vectors.npy"))
+            self._n_saved = len(self._rows)
+        except (OSError, ValueError):
+            self._rows, self._vectors = {}, None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return text_hash(text) in self._rows
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        row = self._rows.get(text_hash(text))
+        return None if row is None else self._vectors[row]
+
+    def put_many(self, texts: List[str], vectors: np.ndarray) -> None:
+        new = {}
+        for text, vector in zip(texts, np.asarray(vectors, dtype="float32")):
+            key = text_hash(text)
+            if key not in self._rows and key not in new:
+                new[key] = vector
+        if not new:
+            return
+        stacked = np.stack(list(new.values()))
+        if self._vectors is None:
+            self._vectors = stacked
+        else:
+            self._vectors = np.concatenate([self._vectors, stacked])
+        for key in new:
+            self._rows[key] = len(self._rows)
+
+    def save(self) -> None:
+        if len(self._rows) == self._n_saved:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # the index goes last, so it never points past the end of the vectors
+        np.save(os.path.join(self.path, "vectors.tmp.npy"), self._vectors)
+        os.replace(
+            os.path.join(self.path, "vectors.tmp.npy"), os.path.join(self.path, "vectors.npy")
+        )
+        with open(os.path.join(self.path, "index.tmp.json"), "w", encoding="utf-8") as f:
+            json.dump(self._rows, f)
+        os.replace(os.path.join(self.path, "index.tmp.json"), os.path.join(self.path, "index.json"))
+        self._n_saved = len(self._rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings provider with an EmbeddingCache.
+
+    Only texts that are not cached yet are sent to the provider, in batches of
+    `batch_size` texts with at most `max_concurrency` batches in flight.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        batch_size: int = 16,
+        max_concurrency: int = 4,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.n_embedded = 0  # texts sent to the provider
+
+    @property
+    def model(self) -> str:
+        return self.cache.model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        missing = list(dict.fromkeys(text for text in texts if text not in self.cache))
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(texts)} texts")
+            batches = [
+                missing[i : i + self.batch_size] for i in range(0, len(missing), self.batch_size)
+            ]
+            with ThreadPoolExecutor(self.max_concurrency) as executor:
+                for batch, vectors in zip(
+                    batches, executor.map(self.embeddings.embed_documents, batches)
+                ):
+                    self.cache.put_many(batch, np.array(vectors))
+            self.n_embedded += len(missing)
+            self.cache.save()
+        return [self.cache.get(text).tolist() for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic local stand-in for an embeddings provider, to build and test offline.
+
+    Every word is hashed to a (dimension, sign) pair, so texts that share words get
+    similar vectors. Vectors are l2 normalized.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.model = f"hash-{size}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype="float32")
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.sha256(word.encode("utf-8")).digest()
+            dim = int.from_bytes(digest[:4], "little") % self.size
+            vector[dim] += 1.0 if digest[4] % 2 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def embeddings_name(embeddings: Embeddings) -> str:
+    """
+    -> the model of `embeddings`, which stays the same across instances and processes
+    """
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def embed_queries(embeddings: Embeddings, queries: List[str]) -> List[List[float]]:
+    """
+    Embeds a batch of queries in one call, past the embedding cache (queries rarely repeat).
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.embeddings
+    return embeddings.embed_documents(queries) if queries else []
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from crea_scraper.cache import CachedPage, PageCache, content_hash
+from crea_scraper.metrics import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    pass
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of at most `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchScheduler:
+    """
+    Long-lived fetcher shared by all requests of a scrape run.
+
+    One pooled keep-alive session is used for all requests. Every host gets its
+    own concurrency cap and token bucket, and 429/5xx responses, timeouts and
+    connection errors are retried with jittered exponential backoff. Requests are
+    made conditional when a page cache is given.
+
+    Use as an async context manager:
+
+        async with FetchScheduler() as scheduler:
+            pages = await scheduler.fetch_many(urls)
+    """
+
+    def __init__(
+        self,
+        cache: Optional[PageCache] = None,
+        max_requests_per_host: int = 8,
+        requests_per_second: float = 10.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 30.0,
+    ):
+        self.cache = cache
+        self.max_requests_per_host = max_requests_per_host
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.failures: Dict[str, str] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def __aenter__(self) -> "FetchScheduler":
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.max_requests_per_host, keepalive_timeout=30
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+        self._session = None
+
+    def _host_limits(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_requests_per_host)
+            self._buckets[host] = TokenBucket(
+                self.requests_per_second, burst=self.max_requests_per_host
+            )
+        return self._semaphores[host], self._buckets[host]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # "full jitter": a random delay up to the exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _request(self, url: str) -> Optional[CachedPage]:
+        headers = self.cache.conditional_headers(url) if self.cache is not None else {}
+        async with self._session.get(url, headers=headers) as resp:
+            self.stats["requests"] += 1
+            if resp.status == 304 and self.cache is not None:
+                page = self.cache.get(url)
+                if page is not None:
+                    self.stats["pages"] += 1
+                    self.stats["not_modified"] += 1
+                    page.not_modified = True
+                    return page
+            if resp.status == 200:
+                body = await resp.text()
+                self.stats["pages"] += 1
+                self.stats["bytes"] += len(body)
+                if self.cache is None:
+                    return CachedPage(url=url, body=body, content_hash=content_hash(body))
+                return self.cache.put(
+                    url,
+                    body,
+                    etag=resp.headers.get("ETag"),
+                    last_modified=resp.headers.get("Last-Modified"),
+                )
+            if resp.status == 404:
+                return None
+            if resp.status in RETRY_STATUSES:
+                raise _RetryableError(f"HTTP {resp.status}", resp.headers.get("Retry-After"))
+            raise FetchError(f"HTTP {resp.status}")
+
+    async def fetch(self, url: str) -> Optional[CachedPage]:
+        """
+        Returns the page, or None if it does not exist (404).
+
+        Raises FetchError when the page could not be fetched within the retry budget.
+        """
+        semaphore, bucket = self._host_limits(url)
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with semaphore:
+                await bucket.acquire()
+                try:
+                    with span("fetch", url=url):
+                        return await self._request(url)
+                except _RetryableError as e:
+                    reason, retry_after = str(e), e.retry_after
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = repr(e)
+            if attempt == self.max_retries:
+                break
+            self.stats["retries"] += 1
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(f"Retrying {url} in {delay:.2f}s ({reason})")
+            await asyncio.sleep(delay)
+        raise FetchError(f"Giving up on {url} after {self.max_retries + 1} attempts ({reason})")
+
+    async def try_fetch(self, url: str) -> Optional[CachedPage]:
+        """
+        Like `fetch`, but returns None for pages that could not be fetched,
+        and records them in `self.failures`.
+        """
+        try:
+            return await self.fetch(url)
+        except FetchError as e:
+            logger.error(str(e))
+            self.failures[url] = str(e)
+            return None
+
+    async def fetch_many(self, urls: List[str]) -> List[Optional[CachedPage]]:
+        """
+        Fetches all urls concurrently (within the per-host limits), in order.
+        """
+        return await asyncio.gather(*[self.try_fetch(url) for url in urls])
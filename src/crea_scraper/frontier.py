@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urldefrag, urlsplit
+
+logger = logging.getLogger(__name__)
+
+FRONTIER_PATH = ".cache/frontier.sqlite"
+STATUSES = ["pending", "leased", "done", "failed"]
+
+
+@dataclass
+class Lease:
+    url: str
+    site: str
+    kind: str
+    not_before: float  # time.time() at which the host may be requested
+
+
+class Frontier:
+    """
+    The urls of a crawl in a SQLite database, shared by the crawl worker processes.
+
+    Urls are added once (by url, without fragment) and leased to one worker at a time.
+    A lease that is not completed within `lease_seconds`, e.g. because its worker
+    died, is handed out again, at most `max_attempts` times in total.
+
+    Politeness is per host, across all workers: every lease of a host gets a time
+    slot `1 / requests_per_second` after the previous one, and only urls whose slot
+    is at most `max_wait` seconds away are leased.
+
+    The methods can be called from any thread (e.g. with `asyncio.to_thread`), one
+    at a time per frontier.
+    """
+
+    def __init__(
+        self,
+        path: str = FRONTIER_PATH,
+        requests_per_second: float = 10.0,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 3,
+        max_wait: float = 1.0,
+    ):
+        self.path = path
+        self.interval = 1 / requests_per_second
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # transactions are explicit, so leasing can lock the database before reading
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, "
+                "url TEXT UNIQUE NOT NULL, site TEXT NOT NULL, kind TEXT NOT NULL, "
+                "host TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, worker TEXT, "
+                "records TEXT, error TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS urls_by_host ON urls (host, status)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, next_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _query(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._db.execute(sql, parameters).fetchall()
+
+    def clear(self) -> None:
+        with self._transaction():
+            self._db.execute("DELETE FROM urls")
+            self._db.execute("DELETE FROM hosts")
+
+    def add(self, urls: Iterable[str], site: str, kind: str) -> int:
+        """
+        -> the number of urls that were new
+        """
+        rows = []
+        for url in urls:
+            url = urldefrag(url)[0]
+            rows.append((url, site, kind, urlsplit(url).netloc))
+        with self._transaction():
+            n_before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO urls (url, site, kind, host) VALUES (?, ?, ?, ?)", rows
+            )
+            n_added = self._db.total_changes - n_before
+            self._db.executemany(
+                "INSERT OR IGNORE INTO hosts VALUES (?, 0)", {(row[3],) for row in rows}
+            )
+        return n_added
+
+    def lease(self, worker: str, n: int = 1) -> List[Lease]:
+        """
+        -> up to `n` urls for `worker`, from the hosts with the earliest free slots
+        """
+        now = time.time()
+        leases = []
+        with self._transaction():
+            for _ in range(n):
+                row = self._db.execute(
+                    "SELECT urls.id, url, site, kind, urls.host, next_at FROM urls "
+                    "JOIN hosts ON urls.host = hosts.host "
+                    "WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) "
+                    "AND attempts < ? AND next_at <= ? ORDER BY next_at, urls.id LIMIT 1",
+                    (now, self.max_attempts, now + self.max_wait),
+                ).fetchone()
+                if row is None:
+                    break
+                url_id, url, site, kind, host, next_at = row
+                not_before = max(next_at, now)
+                self._db.execute(
+                    "UPDATE urls SET status = 'leased', attempts = attempts + 1, "
+                    "lease_until = ?, worker = ? WHERE id = ?",
+                    (not_before + self.lease_seconds, worker, url_id),
+                )
+                self._db.execute(
+                    "UPDATE hosts SET next_at = ? WHERE host = ?",
+                    (not_before + self.interval, host),
+                )
+                leases.append(Lease(url, site, kind, not_before))
+        return leases
+
+    def complete(self, url: str, records: Optional[Dict] = None) -> None:
+        with self._transaction():
+            self._db.execute(
+                "UPDATE urls SET status = 'done', lease_until = NULL, records = ? WHERE url = ?",
+                (json.dumps(records, ensure_ascii=False) if records is not None else None, url),
+            )
+
+    def fail(self, url: str, error: str) -> None:
+        with self._transaction():
+            self._db.execute(
+                "UPDATE urls SET status = 'failed', lease_until = NULL, error = ? WHERE url = ?",
+                (error, url),
+            )
+
+    def has_work(self) -> bool:
+        """
+        -> whether urls are left to crawl, or still being crawled
+        """
+        rows = self._query(
+            "SELECT 1 FROM urls WHERE status IN ('pending', 'leased') AND attempts < ? LIMIT 1",
+            (self.max_attempts,),
+        )
+        return bool(rows)
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._query("SELECT status, COUNT(*) FROM urls GROUP BY status"))
+        return counts
+
+    def records(self, kind: str) -> List[Tuple[str, Dict]]:
+        """
+        -> [(url, records)] of the crawled urls of `kind`, in the order they were found
+        """
+        rows = self._query(
+            "SELECT url, records FROM urls WHERE status = 'done' AND kind = ? "
+            "AND records IS NOT NULL ORDER BY id",
+            (kind,),
+        )
+        return [(url, json.loads(records)) for url, records in rows]
+
+    def failures(self) -> Dict[str, str]:
+        """
+        -> {url: reason} of the urls that failed, or were leased `max_attempts` times
+        """
+        rows = self._query(
+            "SELECT url, COALESCE(error, 'lease expired ' || attempts || ' times') FROM urls "
+            "WHERE status = 'failed' OR (status IN ('pending', 'leased') AND attempts >= ?)",
+            (self.max_attempts,),
+        )
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
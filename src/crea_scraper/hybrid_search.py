@@ -0,0 +1,187 @@
+import re
+from typing import Callable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+
+from crea_scraper.embeddings import embed_queries, embeddings_name
+from crea_scraper.metrics import span
+from crea_scraper.tfidf_index import (
+    TFIDF_INDEX_PATH,
+    TfidfIndex,
+    get_tfidf_index,
+    top_k,
+)
+
+# the rewrite prompt negates keywords with one of these words
+NEGATIONS = ["not", "no", "niet", "geen"]
+FUSIONS = ["weighted", "rrf"]
+_NEGATION_PATTERN = re.compile(rf"^(?:{'|'.join(NEGATIONS)})\s+(.+)$", re.IGNORECASE)
+
+# the hybrid index of this process, by the embeddings model and the corpus version
+_hybrid_index: Optional[Tuple[Tuple[str, str], "HybridIndex"]] = None
+
+
+def split_negated_keywords(search_query: str) -> Tuple[str, List[str]]:
+    """
+    e.g. "instrument, piano, not guitar" -> ("instrument, piano", ["guitar"])
+    """
+    keywords, negated = [], []
+    for keyword in search_query.split(","):
+        keyword = keyword.strip()
+        match = _NEGATION_PATTERN.match(keyword)
+        if match:
+            negated.append(match.group(1))
+        elif keyword:
+            keywords.append(keyword)
+    return ", ".join(keywords), negated
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    # per row
+    low, high = scores.min(axis=1, keepdims=True), scores.max(axis=1, keepdims=True)
+    spread = high - low
+    return np.where(spread > 0, (scores - low) / np.where(spread > 0, spread, 1), 0.0)
+
+
+def _reciprocal_ranks(scores: np.ndarray, k: int = 60) -> np.ndarray:
+    # per row
+    ranks = np.empty(scores.shape, dtype="float64")
+    order = np.argsort(-scores, axis=1, kind="stable")
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1)[None, :], axis=1)
+    return 1.0 / (k + ranks)
+
+
+class HybridIndex:
+    """
+    Scores courses by lexical (TF-IDF) and dense (embedding) similarity at once.
+
+    Both document matrices are precomputed, so a batch of queries is one sparse and
+    one dense matrix product. Courses that contain a negated keyword are excluded (or,
+    with a `negation_penalty`, pushed down), found through the TF-IDF term columns
+    of the negated words.
+    """
+
+    def __init__(
+        self,
+        tfidf: TfidfIndex,
+        vectors: np.ndarray,
+        embed_queries: Callable[[List[str]], List[List[float]]],
+    ):
+        self.tfidf = tfidf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = (vectors / np.where(norms > 0, norms, 1)).astype("float32")
+        self.embed_queries = embed_queries
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def negation_mask(self, negated: List[str]) -> np.ndarray:
+        """
+        -> True for courses that contain all words of any of the negated keywords
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        for keyword in negated:
+            term_ids = self.tfidf.term_ids(keyword)
+            if term_ids:
+                counts = (self.tfidf.term_columns[:, term_ids] > 0).sum(axis=1)
+                mask |= np.asarray(counts).ravel() == len(term_ids)
+        return mask
+
+    def scores(
+        self,
+        search_queries: List[str],
+        fusion: str = "weighted",
+        alpha: float = 0.5,
+        negation_penalty: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        -> (n_queries, n_courses) fused scores, higher is better, -inf for excluded courses
+
+        `alpha` weighs the dense score against the lexical one in the weighted fusion.
+        """
+        if fusion not in FUSIONS:
+            raise ValueError(f"Unknown fusion {fusion}, choose from {FUSIONS}")
+        split = [split_negated_keywords(query) for query in search_queries]
+        keywords = [keywords for keywords, _ in split]
+        lexical = self.tfidf.scores(keywords)
+        dense = np.asarray(self.embed_queries(keywords), dtype="float32") @ self.vectors.T
+        if fusion == "weighted":
+            scores = alpha * _min_max(dense) + (1 - alpha) * _min_max(lexical)
+        else:
+            scores = _reciprocal_ranks(dense) + _reciprocal_ranks(lexical)
+
+        for row, (_, negated) in enumerate(split):
+            if negated:
+                mask = self.negation_mask(negated)
+                if negation_penalty is None:
+                    scores[row, mask] = -np.inf
+                else:
+                    scores[row, mask] -= negation_penalty
+        return scores
+
+    def search(
+        self,
+        search_queries: List[str],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        **kwargs,
+    ) -> List[List[int]]:
+        """
+        -> indices of the top `k` courses per query, best first, only where `mask` is True
+        """
+        indices, _ = top_k(self.scores(search_queries, **kwargs), k, mask)
+        return [[int(i) for i in row if i >= 0] for row in indices]
+
+
+def get_hybrid_index(
+    courses: List[Document],
+    embeddings: Embeddings,
+    tfidf_index_path: str = TFIDF_INDEX_PATH,
+    vector_db_path: Optional[str] = None,
+) -> HybridIndex:
+    """
+    Returns the hybrid index for these course documents, built once per process. Only
+    the last index is kept, for the model of `embeddings` and the version of the corpus.
+
+    Pass cached embeddings (see `crea_scraper.embeddings`), so the course vectors
+    come from the embedding cache instead of the provider, or the `vector_db_path` of
+    a vector db built with the same model, to read them from there.
+    """
+    global _hybrid_index
+
+    tfidf = get_tfidf_index(courses, tfidf_index_path)
+    key = (embeddings_name(embeddings), tfidf.data_hash)
+    if _hybrid_index is None or _hybrid_index[0] != key:
+        if vector_db_path is not None:
+            from crea_scraper.vector_db import load_course_vectors
+
+            with span("index.load_course_vectors", path=vector_db_path):
+                vectors = load_course_vectors(courses, embeddings, vector_db_path)
+        else:
+            with span("index.embed_courses", courses=len(courses)):
+                vectors = embeddings.embed_documents([c.page_content for c in courses])
+        index = HybridIndex(
+            tfidf,
+            np.array(vectors, dtype="float32"),
+            lambda queries: embed_queries(embeddings, queries),
+        )
+        _hybrid_index = (key, index)
+    return _hybrid_index[1]
+
+
+def hybrid_search(
+    search_query: str,
+    courses: List[Document],
+    k: int,
+    embeddings: Embeddings,
+    urls: Optional[Set[str]] = None,
+    tfidf_index_path: str = TFIDF_INDEX_PATH,
+    **kwargs,
+) -> List[Document]:
+    index = get_hybrid_index(courses, embeddings, tfidf_index_path)
+    mask = None
+    if urls is not None:
+        mask = np.array([course.metadata["url"] in urls for course in courses])
+    return [courses[i] for i in index.search([search_query], k, mask, **kwargs)[0]]
@@ -0,0 +1,93 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from crea_scraper.metrics import observe
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FileVersion = Tuple[Tuple[str, int, int], ...]  # (file, mtime_ns, size) per file
+
+
+class IndexHandle(Generic[T]):
+    """
+    Long-lived handle on an index stored on disk, loaded once and shared by all callers.
+
+    Every `get()` compares the modification time and size of the index files with the
+    loaded version (a few stat calls), and reloads when they changed. A reload builds
+    the new index next to the old one and then swaps the reference, so callers never
+    wait for it: while one thread reloads, the others keep getting the old index.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        load: Callable[[str], T],
+        files: List[str],
+        size: Optional[Callable[[T], int]] = None,
+    ):
+        self.path = path
+        self.files = files
+        self._load = load
+        self._size = size
+        self._index: Optional[T] = None
+        self._version: Optional[FileVersion] = None
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {"loads": 0}
+
+    def version(self) -> Optional[FileVersion]:
+        try:
+            stats = [(file, os.stat(os.path.join(self.path, file))) for file in self.files]
+        except FileNotFoundError:
+            return None
+        return tuple((file, stat.st_mtime_ns, stat.st_size) for file, stat in stats)
+
+    def get(self) -> T:
+        index, version = self._index, self.version()
+        if index is not None and (version == self._version or version is None):
+            return index
+        # only one thread reloads, the others keep using the loaded index meanwhile
+        if not self._lock.acquire(blocking=index is None):
+            return index
+        try:
+            if self._index is None or self._version != version:
+                self._reload(version)
+            return self._index
+        finally:
+            self._lock.release()
+
+    def _reload(self, version: Optional[FileVersion]) -> None:
+        if version is None:
+            raise FileNotFoundError(f"No index found at {self.path}")
+        start_time = time.perf_counter()
+        index = self._load(self.path)
+        # files that change while loading have a new version, and are reloaded on the next get
+        self._index, self._version = index, version
+        self.metrics["loads"] += 1
+        self.metrics["load_seconds"] = time.perf_counter() - start_time
+        observe("index.load", self.metrics["load_seconds"])
+        self.metrics["file_bytes"] = sum(size for _, _, size in version)
+        if self._size is not None:
+            self.metrics["memory_bytes"] = self._size(index)
+        logger.info(f"Loaded index {self.path} in {self.metrics['load_seconds']:.3f}s")
+
+
+# handles shared by the whole process, by path
+_handles: Dict[str, IndexHandle] = {}
+_handles_lock = threading.Lock()
+
+
+def get_index_handle(
+    path: str,
+    load: Callable[[str], T],
+    files: List[str],
+    size: Optional[Callable[[T], int]] = None,
+) -> IndexHandle[T]:
+    with _handles_lock:
+        if path not in _handles:
+            _handles[path] = IndexHandle(path, load, files, size)
+        return _handles[path]
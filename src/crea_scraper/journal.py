@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+from crea_scraper.course import Course, CourseGeneralInfo
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = ".cache/journal"
+
+
+class ScrapeJournal:
+    """
+    Checkpoints a scrape run to an append-only journal (`journal.jsonl`), line by line:
+    the course urls from the overview, the records of every parsed course page, and the
+    pages that failed (with the stage they failed in and why).
+
+    When the previous run was interrupted, its journal is resumed: the overview and the
+    course pages that were parsed are taken from it instead of being fetched again, and
+    only failed and unvisited pages are tried (again). When an overview subpage failed,
+    the overview is fetched again too, so the courses listed on it are not missed. A
+    finished run writes a failure report (`quarantine.json`), and the next run starts
+    a new journal.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH, resume: bool = True):
+        self.path = path
+        self.course_urls: Optional[List[str]] = None
+        self.failures: Dict[str, Dict[str, str]] = {}  # url -> {"stage": ..., "error": ...}
+        self._records: Dict[str, Dict] = {}
+        os.makedirs(path, exist_ok=True)
+        self.resumed = resume and self._load()
+        if self.resumed:
+            logger.info(f"Resuming the scrape, {len(self._records)} course pages done before")
+        self._file = open(self._journal_file, "a" if self.resumed else "w", encoding="utf-8")
+
+    @property
+    def _journal_file(self) -> str:
+        return os.path.join(self.path, "journal.jsonl")
+
+    @property
+    def quarantine_file(self) -> str:
+        return os.path.join(self.path, "quarantine.json")
+
+    def _load(self) -> bool:
+        """
+        -> whether there is an unfinished journal to resume
+        """
+        try:
+            with open(self._journal_file, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return False
+        overview_failed = False
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # the last line of an interrupted run can be cut off
+            if "done" in entry:
+                # a finished run, its records are not reused
+                self.course_urls, self._records = None, {}
+                return False
+            if "course_urls" in entry:
+                self.course_urls = entry["course_urls"]
+            elif "records" in entry:
+                self._records[entry["url"]] = entry["records"]
+            elif entry.get("stage") == "overview":
+                overview_failed = True
+            # failures are not restored, those pages are tried again
+        if overview_failed:
+            self.course_urls = None  # misses the courses of the failed subpages
+        return bool(lines)
+
+    def _append(self, entry: Dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def set_course_urls(self, course_urls: List[str]) -> None:
+        self.course_urls = course_urls
+        self._append({"course_urls": course_urls})
+
+    def get(self, url: str) -> Optional[Tuple[CourseGeneralInfo, List[Course]]]:
+        records = self._records.get(url)
+        if records is None:
+            return None
+        return (
+            CourseGeneralInfo(**records["general_info"]),
+            [Course(**course) for course in records["courses"]],
+        )
+
+    def add(self, url: str, general_info: CourseGeneralInfo, courses: List[Course]) -> None:
+        records = {
+            "general_info": asdict(general_info),
+            "courses": [asdict(course) for course in courses],
+        }
+        self._records[url] = records
+        self._append({"url": url, "records": records})
+
+    def quarantine(self, url: str, stage: str, error: str) -> None:
+        self.failures[url] = {"stage": stage, "error": error}
+        self._append({"url": url, "stage": stage, "error": error})
+
+    def finish(self) -> None:
+        """
+        Writes the failure report and closes the journal, the next run starts over.
+        """
+        with open(self.quarantine_file, "w", encoding="utf-8") as f:
+            json.dump(self.failures, f, indent=2, ensure_ascii=False)
+        self._append({"done": True})
+        self._file.close()
+        if self.failures:
+            logger.warning(f"{len(self.failures)} pages failed, see {self.quarantine_file}")
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
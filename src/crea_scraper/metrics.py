@@ -0,0 +1,161 @@
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds, from a cached lookup to a slow page or a full index build
+BUCKETS = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0]
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: List[float] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: Dict) -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other["counts"])]
+        self.count += other["count"]
+        self.sum += other["sum"]
+
+    def to_json(self) -> Dict:
+        return {"count": self.count, "sum": self.sum, "counts": list(self.counts)}
+
+
+class Metrics:
+    """
+    Counters, and a histogram of the durations of every span, by name.
+
+    Recording is off by default: `span` then hands out one shared no-op context and
+    `count` returns right away, so instrumented hot paths cost a function call.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters, self.histograms = {}, {}
+
+    def count(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def _span(self, name: str, fields: Dict) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.observe(name, seconds)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(json.dumps({"span": name, "ms": seconds * 1000, **fields}))
+
+    def span(self, name: str, **fields):
+        """
+        Times the block into the histogram `name`. The `fields` only go to the debug log.
+        """
+        return self._span(name, fields) if self.enabled else _NULL_SPAN
+
+    def to_json(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "spans": {name: h.to_json() for name, h in self.histograms.items()},
+                "buckets": BUCKETS,
+            }
+
+    def merge(self, snapshot: Dict) -> None:
+        """
+        Adds a `to_json` snapshot, e.g. from a parser worker process.
+        """
+        for name, value in snapshot["counters"].items():
+            self.count(name, value)
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, histogram in snapshot["spans"].items():
+                self.histograms.setdefault(name, Histogram()).merge(histogram)
+
+    def to_prometheus(self, prefix: str = "crea") -> str:
+        lines = []
+        snapshot = self.to_json()
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, histogram in sorted(snapshot["spans"].items()):
+            metric = f"{prefix}_{_metric_name(name)}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {histogram['sum']}", f"{metric}_count {histogram['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """
+        Writes the metrics as JSON (for a .json path) or in the Prometheus text format.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.to_json(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+# the metrics of this process
+metrics = Metrics()
+
+
+def enable(reset: bool = True) -> None:
+    if reset:
+        metrics.reset()
+    metrics.enabled = True
+
+
+def disable() -> None:
+    metrics.enabled = False
+
+
+# bound once, so an instrumented call costs one method call when recording is off
+span = metrics.span
+count = metrics.count
+observe = metrics.observe
+
+
+def dump(path: Optional[str]) -> None:
+    if path and metrics.enabled:
+        metrics.dump(path)
+        logger.info(f"Metrics written to {path}")
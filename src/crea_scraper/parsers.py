@@ -0,0 +1,367 @@
+import html
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from crea_scraper.course import Course, CourseGeneralInfo
+from crea_scraper.metrics import span
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # pragma: no cover
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# one raw table per course, with the status from its register link
+RawTable = Tuple[List[List[str]], str]
+
+
+class ParseError(ValueError):
+    pass
+
+
+class HtmlParser(ABC):
+    """
+    Extracts course data from the html of the CREA website.
+
+    Backends only implement the extraction of raw values from a page, the
+    course records are built from those values the same way for every backend.
+    A backend that misses one of the abstract methods cannot be instantiated.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def parse_course_page(self, body: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def parse_overview_page(self, body: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_course_url(self, course_html) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_course_name(self, course_html) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_course_category_names(self, course_html) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_course_description_parts(self, course_html) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_raw_tables(self, course_html) -> List[RawTable]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_overview_course_urls(self, subpage_html) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_overview_page_nrs(self, subpage_html) -> List[int]:
+        raise NotImplementedError
+
+    def get_overview_records(self, body: str) -> Dict:
+        """
+        subpage -> {"course_urls": [course_url_1, ..., course_url_n], "last_page_nr": m}
+
+        The pagination links to the first, surrounding and last subpages,
+        so the highest page number is the last subpage.
+        """
+        subpage_html = self.parse_overview_page(body)
+        return {
+            "course_urls": self._get_overview_course_urls(subpage_html),
+            "last_page_nr": max(self._get_overview_page_nrs(subpage_html), default=1),
+        }
+
+    def _get_course_category(self, course_html) -> str:
+        """
+        A course can have multiple categories. These get returned
+        as one category, separated by " / ".
+        """
+        categories = [name[:-1] for name in self._get_course_category_names(course_html)]
+        return " / ".join(categories)
+
+    def _get_course_description(self, course_html) -> str:
+        description = "\n\n".join(self._get_course_description_parts(course_html))
+
+        description = re.sub(r"\.([a-zA-Z])", r". \1", description)
+        description = re.sub(r"\?([a-zA-Z])", r"? \1", description)
+        description = re.sub(r"\!([a-zA-Z])", r"! \1", description)
+        description = re.sub(r"([a-z])([A-Z])", r"\1, \2", description)
+
+        return description
+
+    def _get_course_table_data(self, course_html) -> List[Dict]:
+        raw_tables = self._get_raw_tables(course_html)
+        if not len(raw_tables):
+            logger.warning(f"No tables found for {self._get_course_url(course_html)}")
+        table_data = []
+        for raw_table_data, course_status in raw_tables:
+            table_dict = _extract_data_from_table(raw_table_data)
+            table_dict["status"] = course_status
+            table_data.append(table_dict)
+        return table_data
+
+    def get_course_data(self, body: str) -> Tuple[CourseGeneralInfo, List[Course]]:
+        with span("parse.page"):
+            course_html = self.parse_course_page(body)
+        with span("parse.url"):
+            url = self._get_course_url(course_html)
+        logger.debug(f"Parsing {url} ...")
+        with span("parse.name"):
+            naam = self._get_course_name(course_html)
+        with span("parse.category"):
+            categorie = self._get_course_category(course_html)
+        with span("parse.description"):
+            beschrijving = self._get_course_description(course_html)
+        general_info = CourseGeneralInfo(
+            url=url, naam=naam, categorie=categorie, beschrijving=beschrijving
+        )
+        course_data = []
+        with span("parse.tables"):
+            table_data = self._get_course_table_data(course_html)
+        for table in table_data:
+            tbl = {}
+            for key in table:
+                if "prijs" in key:
+                    tbl["prijs"] = table[key]
+                else:
+                    tbl[key] = table[key]
+            course_data.append(Course(naam=general_info.naam, **tbl))
+        return general_info, course_data
+
+
+def _get_dict_from_raw_table_data(table_data):
+    table_dict = {}
+    for i, row in enumerate(table_data):
+        if i % 2 != 0:
+            continue
+        for j, col in enumerate(row):
+            if not col:
+                continue
+            table_dict[col] = table_data[i + 1][j]
+    return table_dict
+
+
+def _separate_time_from_day(table_dict):
+    time_data = table_dict.get("tijd", "")
+    time_data_split = time_data.split()
+    if not time_data_split or len(time_data_split) >= 5:
+        raise ParseError(f"Error while parsing: {time_data!r}")
+
+    day = time_data_split[0]
+    time = " ".join(time_data_split[1:])
+
+    table_dict["dag"] = day
+    table_dict["tijd"] = time
+    table_dict["dag_tijd"] = f"{day} {time}"
+    return table_dict
+
+
+def _extract_data_from_table(table_data):
+    table_dict = _get_dict_from_raw_table_data(table_data)
+    table_dict = _separate_time_from_day(table_dict)
+    return table_dict
+
+
+class SoupParser(HtmlParser):
+    """
+    Reference backend, parses the full page with BeautifulSoup's html.parser.
+    """
+
+    name = "bs4"
+
+    def parse_course_page(self, body: str):
+        return BeautifulSoup(body, "html.parser")
+
+    def parse_overview_page(self, body: str):
+        return BeautifulSoup(body, "html.parser")
+
+    def _get_course_url(self, course_html) -> str:
+        return course_html.find("link", {"rel": "alternate"}, href=True)["href"]
+
+    def _get_course_name(self, course_html) -> str:
+        return course_html.find(class_="product_title entry-title").text
+
+    def _get_course_category_names(self, course_html) -> List[str]:
+        for e in course_html.find_all("div", class_="meta_values"):
+            element_content = e.text.lower()
+            if "categorie" in element_content or "category" in element_content:
+                return [a.text for a in e.find_all("a")]
+        return []
+
+    def _get_course_description_parts(self, course_html) -> List[str]:
+        return [e.text for e in course_html.find(class_="wpb_wrapper").find_all("p")]
+
+    @staticmethod
+    def _get_raw_table_data(table_html, incl_empty_values=True) -> List[List[str]]:
+        table_data = []
+        rows = table_html.find_all("tr")
+        for row in rows:
+            cols = row.find_all("td")
+            cols_extracted = []
+            for col in cols:
+                if col.find("img"):
+                    cols_extracted.append(", ".join([img["title"] for img in col.find_all("img")]))
+                else:
+                    cols_extracted.append(col.text.strip())
+            table_data.append([e for e in cols_extracted if e or incl_empty_values])
+        return table_data
+
+    def _get_raw_tables(self, course_html) -> List[RawTable]:
+        div = course_html.find("div", class_="product_main_data")
+        register_links_html = div.find_all("a", class_="register_link")
+        tables_html = div.find_all("table", recursive=False)
+        return [
+            (self._get_raw_table_data(table_html), register_link_html.text)
+            for table_html, register_link_html in zip(tables_html, register_links_html)
+        ]
+
+    def _get_overview_course_urls(self, subpage_html) -> List[str]:
+        selection = subpage_html.find("ul", {"class": "stm-courses"})
+        courses_html = selection.find_all("li", recursive=False)
+        return [course_html.find("a", href=True)["href"] for course_html in courses_html]
+
+    def _get_overview_page_nrs(self, subpage_html) -> List[int]:
+        return [
+            int(e.text)
+            for e in subpage_html.find_all(class_="page-numbers")
+            if e.text.strip().isdigit()
+        ]
+
+
+def _has_class(class_name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+if etree is not None:
+    # compiled once, rather than on every lookup
+    _COURSE_NAME = etree.XPath("(//*[@class='product_title entry-title'])[1]")
+    _META_VALUES = etree.XPath(f"//div[{_has_class('meta_values')}]")
+    _DESCRIPTION_PARTS = etree.XPath(f"(//*[{_has_class('wpb_wrapper')}])[1]//p")
+    _MAIN_DATA = etree.XPath(f"(//div[{_has_class('product_main_data')}])[1]")
+    _REGISTER_LINKS = etree.XPath(f".//a[{_has_class('register_link')}]")
+    _OVERVIEW_COURSES = etree.XPath(f"(//ul[{_has_class('stm-courses')}])[1]/li")
+    _PAGE_NUMBERS = etree.XPath(f"//*[{_has_class('page-numbers')}]")
+
+# the regions of a course page we extract data from
+_COURSE_REGIONS = re.compile(
+    r"<[a-zA-Z][^>]*\bclass=[\"'][^\"']*"
+    r"\b(?:product_title|meta_values|wpb_wrapper|product_main_data)\b"
+)
+_OVERVIEW_REGIONS = re.compile(r"<[a-zA-Z][^>]*\bclass=[\"'][^\"']*\bstm-courses\b")
+_BODY_TAG = re.compile(r"<body\b", re.IGNORECASE)
+_LINK_TAG = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+_ATTRIBUTE = re.compile(r"([\w-]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+
+
+def _parse_from(body: str, regions: re.Pattern):
+    """
+    Only parses the part of the page from the first region of interest onwards.
+    Everything before it (head, inline scripts and styles, navigation) is skipped.
+    """
+    body_tag = _BODY_TAG.search(body)
+    match = regions.search(body, body_tag.start() if body_tag else 0)
+    start = match.start() if match else 0
+    return lxml_html.document_fromstring(body[start:] or "<html></html>")
+
+
+class LxmlParser(HtmlParser):
+    """
+    Fast backend, parses only the regions of interest with lxml, using precompiled XPaths.
+    """
+
+    name = "lxml"
+
+    def parse_course_page(self, body: str):
+        return _parse_from(body, _COURSE_REGIONS), body
+
+    def parse_overview_page(self, body: str):
+        return _parse_from(body, _OVERVIEW_REGIONS)
+
+    def _get_course_url(self, course_html) -> str:
+        # the alternate link lives in the head, which is not parsed
+        _, body = course_html
+        for tag in _LINK_TAG.findall(body):
+            attributes = {m[0].lower(): m[1] or m[2] for m in _ATTRIBUTE.findall(tag)}
+            if "alternate" in attributes.get("rel", "").split() and "href" in attributes:
+                return html.unescape(attributes["href"])
+        raise ValueError("No alternate link found in course page")
+
+    def _get_course_name(self, course_html) -> str:
+        tree, _ = course_html
+        return _COURSE_NAME(tree)[0].text_content()
+
+    def _get_course_category_names(self, course_html) -> List[str]:
+        tree, _ = course_html
+        for e in _META_VALUES(tree):
+            element_content = e.text_content().lower()
+            if "categorie" in element_content or "category" in element_content:
+                return [a.text_content() for a in e.iter("a")]
+        return []
+
+    def _get_course_description_parts(self, course_html) -> List[str]:
+        tree, _ = course_html
+        return [p.text_content() for p in _DESCRIPTION_PARTS(tree)]
+
+    @staticmethod
+    def _get_raw_table_data(table_html, incl_empty_values=True) -> List[List[str]]:
+        table_data = []
+        for row in table_html.iter("tr"):
+            cols_extracted = []
+            for col in row.iter("td"):
+                images = list(col.iter("img"))
+                if images:
+                    cols_extracted.append(", ".join([img.attrib["title"] for img in images]))
+                else:
+                    cols_extracted.append(col.text_content().strip())
+            table_data.append([e for e in cols_extracted if e or incl_empty_values])
+        return table_data
+
+    def _get_raw_tables(self, course_html) -> List[RawTable]:
+        tree, _ = course_html
+        div = _MAIN_DATA(tree)[0]
+        register_links_html = _REGISTER_LINKS(div)
+        tables_html = div.findall("table")
+        return [
+            (self._get_raw_table_data(table_html), register_link_html.text_content())
+            for table_html, register_link_html in zip(tables_html, register_links_html)
+        ]
+
+    def _get_overview_course_urls(self, subpage_html) -> List[str]:
+        course_urls = []
+        for course_html in _OVERVIEW_COURSES(subpage_html):
+            link = next(a for a in course_html.iter("a") if a.get("href") is not None)
+            course_urls.append(link.get("href"))
+        return course_urls
+
+    def _get_overview_page_nrs(self, subpage_html) -> List[int]:
+        return [
+            int(e.text_content())
+            for e in _PAGE_NUMBERS(subpage_html)
+            if e.text_content().strip().isdigit()
+        ]
+
+
+PARSERS = {parser.name: parser for parser in (LxmlParser, SoupParser)}
+DEFAULT_PARSER = "lxml" if etree is not None else "bs4"
+
+
+def get_parser(name: str = DEFAULT_PARSER) -> HtmlParser:
+    if name == "lxml" and etree is None:
+        raise ImportError("The lxml parser backend requires lxml, install it or use 'bs4'.")
+    if name not in PARSERS:
+        raise ValueError(f"Parser {name} not supported, choose from {list(PARSERS)}.")
+    return PARSERS[name]()
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from crea_scraper.metrics import observe
+from crea_scraper.parsers import DEFAULT_PARSER
+
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+
+logger = logging.getLogger(__name__)
+
+FAILED = ["failed", "upstream_failed"]
+
+
+def artifact_fingerprint(path: str) -> Optional[str]:
+    """
+    -> sha256 of the file, or of all files in the directory by relative path, None if missing
+    """
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.relpath(os.path.join(root, name), path)
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    else:
+        files = [""]
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(file.encode("utf-8"))
+        with open(os.path.join(path, file) if file else path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], None]
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    params: Dict[str, Any] = field(default_factory=dict)  # settings that change the outputs
+    always_run: bool = False  # e.g. the scrape, its input is the website
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str  # ran, skipped, failed or upstream_failed
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+class Pipeline:
+    """
+    Runs stages that depend on each other through their artifacts (files or directories).
+
+    Every stage that ran writes a manifest with the fingerprint of its inputs and params,
+    and of its outputs. A stage is skipped when neither changed since, so a stage whose
+    upstream ran but produced the same artifacts is skipped too. Stages run as soon as
+    their upstream stages are done, at most `max_workers` at a time.
+    """
+
+    def __init__(self, stages: List[Stage], manifest_dir: str, max_workers: int = 4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.manifest_dir = manifest_dir
+        self.max_workers = max_workers
+        producers = {
+            os.path.normpath(path): stage.name for stage in stages for path in stage.outputs
+        }
+        order = list(self.stages)
+        self.upstream: Dict[str, List[str]] = {}
+        for stage in stages:
+            upstream = {producers.get(os.path.normpath(path)) for path in stage.inputs} - {None}
+            if any(order.index(name) >= order.index(stage.name) for name in upstream):
+                raise ValueError(f"Stage {stage.name} must come after the stages it reads from")
+            self.upstream[stage.name] = sorted(upstream)
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self.manifest_dir, f"{name}.json")
+
+    def load_manifest(self, name: str) -> Optional[Dict]:
+        try:
+            with open(self._manifest_path(name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        tmp_file = self._manifest_path(manifest["stage"]) + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_file, self._manifest_path(manifest["stage"]))
+
+    def input_fingerprint(self, stage: Stage) -> str:
+        inputs = {path: artifact_fingerprint(path) for path in stage.inputs}
+        key = json.dumps({"inputs": inputs, "params": stage.params}, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def is_up_to_date(self, stage: Stage, fingerprint: Optional[str] = None) -> bool:
+        manifest = self.load_manifest(stage.name)
+        if stage.always_run or manifest is None:
+            return False
+        if manifest["fingerprint"] != (fingerprint or self.input_fingerprint(stage)):
+            return False
+        return all(
+            artifact_fingerprint(path) == manifest["outputs"].get(path) for path in stage.outputs
+        )
+
+    def _run_stage(self, stage: Stage, force: bool) -> StageResult:
+        start_time = time.perf_counter()
+        fingerprint = self.input_fingerprint(stage)
+        if not force and self.is_up_to_date(stage, fingerprint):
+            logger.info(f"Skipping {stage.name}, its inputs and outputs did not change")
+            return StageResult(stage.name, "skipped", time.perf_counter() - start_time)
+        logger.info(f"Running {stage.name} ...")
+        try:
+            stage.run()
+        except Exception as e:
+            logger.exception(f"Stage {stage.name} failed")
+            return StageResult(stage.name, "failed", time.perf_counter() - start_time, repr(e))
+        seconds = time.perf_counter() - start_time
+        self._write_manifest(
+            {
+                "stage": stage.name,
+                "fingerprint": fingerprint,
+                "inputs": stage.inputs,
+                "params": stage.params,
+                "outputs": {path: artifact_fingerprint(path) for path in stage.outputs},
+                "seconds": seconds,
+                "finished_at": time.time(),
+            }
+        )
+        observe(f"stage.{stage.name}", seconds)
+        logger.info(f"Finished {stage.name} in {seconds:.1f}s")
+        return StageResult(stage.name, "ran", seconds)
+
+    def run(self, force: bool = False, only: Optional[List[str]] = None) -> Dict[str, StageResult]:
+        """
+        Runs all stages (or `only` these, assuming the artifacts of the others exist),
+        skipping the ones that are up to date unless `force`.
+        """
+        names = [name for name in self.stages if only is None or name in only]
+        unknown = set(only or []) - set(self.stages)
+        if unknown:
+            raise ValueError(f"Unknown stages {sorted(unknown)}, choose from {list(self.stages)}")
+
+        results: Dict[str, StageResult] = {}
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            while len(results) < len(names):
+                for name in names:
+                    if name in results or name in running.values():
+                        continue
+                    upstream = [results.get(u) for u in self.upstream[name] if u in names]
+                    if any(r is not None and r.status in FAILED for r in upstream):
+                        results[name] = StageResult(name, "upstream_failed")
+                    elif all(r is not None for r in upstream):
+                        running[executor.submit(self._run_stage, self.stages[name], force)] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+        return {name: results[name] for name in names}
+
+
+def crea_pipeline(
+    output_dir: str = "output",
+    cache_dir: str = ".cache/pages",
+    journal_path: str = ".cache/journal",
+    scrape: bool = True,
+    parser_name: str = DEFAULT_PARSER,
+    quantization: str = "sq8",
+    embeddings: Optional["Embeddings"] = None,
+    max_workers: int = 4,
+) -> Pipeline:
+    """
+    The weekly job: scrape -> csv, and scrape -> search_data -> tfidf_index and vector_db.
+
+    Scraping, normalizing and writing the course data are one stage, as the scraper
+    streams the parsed courses to Parquet, and it always runs (its input is the website).
+    It also writes the changes since the previous course data (`course_changes.jsonl`).
+    The search data only holds the searched columns, so changes to e.g. the course
+    status don't rebuild the indexes. Without `scrape`, the course data on disk is used.
+    """
+    course_data_path = os.path.join(output_dir, "course_data.parquet")
+    csv_path = os.path.join(output_dir, "course_data.csv")
+    change_feed_path = os.path.join(output_dir, "course_changes.jsonl")
+    search_data_path = os.path.join(output_dir, "search_data.parquet")
+    tfidf_index_path = os.path.join(output_dir, "tfidf_index")
+    vector_db_path = os.path.join(output_dir, "vector_db")
+    compact_vector_db_path = os.path.join(output_dir, f"vector_db_{quantization}")
+
+    # the stages import their dependencies, so the cli starts fast
+    def run_scrape() -> None:
+        from crea_scraper.cache import PageCache
+        from crea_scraper.changes import update_snapshot
+        from crea_scraper.journal import ScrapeJournal
+        from crea_scraper.scraper import run
+
+        # written next to the old course data first, so a failed scrape leaves it intact
+        # (an interrupted scrape resumes from its journal on the next run), and then
+        # diffed against it for the change feed
+        tmp_path = course_data_path + ".tmp"
+        run(
+            cache=PageCache(cache_dir),
+            output_path=tmp_path,
+            parser_name=parser_name,
+            journal=ScrapeJournal(journal_path),
+        )
+        update_snapshot(tmp_path, course_data_path, change_feed_path)
+
+    def export_csv() -> None:
+        from crea_scraper.data import export_course_data_csv
+
+        export_course_data_csv(course_data_path, csv_path)
+
+    def prepare_search_data() -> None:
+        from crea_scraper.data import SEARCH_COLUMNS, load_course_data, prepare_for_search
+
+        course_data = load_course_data(course_data_path, columns=SEARCH_COLUMNS)
+        prepare_for_search(course_data).to_parquet(search_data_path, index=False)
+
+    def build_tfidf_index() -> None:
+        import pandas as pd
+
+        from crea_scraper.data import get_course_documents_for_search
+        from crea_scraper.tfidf_index import get_tfidf_index
+
+        courses = get_course_documents_for_search(pd.read_parquet(search_data_path))
+        get_tfidf_index(courses, tfidf_index_path)
+
+    def build_vector_db() -> None:
+        import pandas as pd
+
+        from crea_scraper.compact_vector_db import save_compact_vector_db
+        from crea_scraper.vector_db import create_vector_db
+
+        db = create_vector_db(
+            pd.read_parquet(search_data_path), vector_db_path, embeddings=embeddings
+        )
+        save_compact_vector_db(db, compact_vector_db_path, quantization)
+
+    embeddings_name = "openai" if embeddings is None else type(embeddings).__name__
+    stages = [
+        Stage("csv", export_csv, inputs=[course_data_path], outputs=[csv_path]),
+        Stage(
+            "search_data",
+            prepare_search_data,
+            inputs=[course_data_path],
+            outputs=[search_data_path],
+        ),
+        Stage(
+            "tfidf_index", build_tfidf_index, inputs=[search_data_path], outputs=[tfidf_index_path]
+        ),
+        Stage(
+            "vector_db",
+            build_vector_db,
+            inputs=[search_data_path],
+            outputs=[vector_db_path, compact_vector_db_path],
+            params={"quantization": quantization, "embeddings": embeddings_name},
+        ),
+    ]
+    if scrape:
+        stages.insert(
+            0,
+            Stage(
+                "scrape", run_scrape, outputs=[course_data_path, change_feed_path], always_run=True
+            ),
+        )
+    return Pipeline(stages, os.path.join(output_dir, "manifests"), max_workers)
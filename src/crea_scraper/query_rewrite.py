@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from crea_scraper.metrics import count
+from crea_scraper.prompts import search_prompt_template
+
+if TYPE_CHECKING:
+    from langchain.llms import AzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+REWRITE_CACHE_PATH = ".cache/query_rewrites.sqlite"
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+@lru_cache(maxsize=None)
+def prompt_hash() -> str:
+    return hashlib.sha256(search_prompt_template().template.encode("utf-8")).hexdigest()
+
+
+def rewrite_key(query: str, template_hash: Optional[str] = None) -> str:
+    """
+    Queries that only differ in case or whitespace share a key, prompt edits change it.
+    """
+    template_hash = template_hash or prompt_hash()
+    return hashlib.sha256(f"{template_hash}\n{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class RewriteCache:
+    """
+    Query rewrites, in an in-memory LRU in front of a SQLite table.
+
+    Entries expire `ttl` seconds after they were written, in both layers.
+    """
+
+    def __init__(
+        self,
+        path: str = REWRITE_CACHE_PATH,
+        max_size: int = 1024,
+        ttl: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (rewrite, created_at)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS rewrites "
+                "(key TEXT PRIMARY KEY, rewrite TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _remember(self, key: str, rewrite: str, created_at: float) -> None:
+        self._lru[key] = (rewrite, created_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                entry = self._db.execute(
+                    "SELECT rewrite, created_at FROM rewrites WHERE key = ?", (key,)
+                ).fetchone()
+            if entry is None:
+                return None
+            rewrite, created_at = entry
+            if time.time() - created_at > self.ttl:
+                self._lru.pop(key, None)
+                return None
+            self._remember(key, rewrite, created_at)
+            return rewrite
+
+    def put(self, key: str, rewrite: str) -> None:
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, rewrite, created_at)
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rewrites VALUES (?, ?, ?)", (key, rewrite, created_at)
+                )
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class QueryRewriter:
+    """
+    Rewrites user queries into search keywords with an LLM, through a RewriteCache.
+
+    Concurrent requests for the same query share one LLM call. When the call takes
+    longer than `timeout` seconds or fails, the raw query is used (and not cached).
+    """
+
+    def __init__(
+        self,
+        llm: Callable[[str], str],
+        cache: Optional[RewriteCache] = None,
+        timeout: float = 20.0,
+        max_concurrency: int = 4,
+    ):
+        self.llm = llm
+        self.cache = cache
+        self.timeout = timeout
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "fallbacks": 0}
+        self._template_hash = prompt_hash()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_concurrency)
+
+    def _call_llm(self, key: str, query: str) -> str:
+        try:
+            rewrite = self.llm(search_prompt_template().format(query=query))
+            if self.cache is not None:
+                self.cache.put(key, rewrite)
+            return rewrite
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def rewrite(self, query: str) -> str:
+        key = rewrite_key(query, self._template_hash)
+        if self.cache is not None:
+            rewrite = self.cache.get(key)
+            if rewrite is not None:
+                self.stats["hits"] += 1
+                count("rewrite.hits")
+                return rewrite
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                self.stats["misses"] += 1
+                count("rewrite.misses")
+                future = self._in_flight[key] = self._executor.submit(self._call_llm, key, query)
+            else:
+                self.stats["coalesced"] += 1
+                count("rewrite.coalesced")
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Query rewrite took over {self.timeout}s, using the raw query")
+        except Exception as e:
+            logger.warning(f"Query rewrite failed ({e!r}), using the raw query")
+        self.stats["fallbacks"] += 1
+        count("rewrite.fallbacks")
+        return query
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for the LLM, returns the words of the user query as keywords.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.prompts: List[str] = []
+
+    def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.delay:
+            time.sleep(self.delay)
+        query = prompt.rsplit("Users query:", 1)[-1]
+        return ", ".join(re.findall(r"\w+", query.lower()))
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> "AzureOpenAI":
+    from langchain.llms import AzureOpenAI
+
+    from crea_scraper.vector_db import configure_openai
+
+    configure_openai()
+    return AzureOpenAI(
+        model_name="gpt-4",
+        temperature=0.7,
+        max_tokens=250,
+        top_p=1.0,
+        verbose=True,
+        engine="gpt-4-us",
+    )
+
+
+@lru_cache(maxsize=None)
+def get_query_rewriter() -> QueryRewriter:
+    """
+    The query rewriter shared by the whole process (e.g. all Streamlit sessions).
+    """
+    return QueryRewriter(lambda prompt: get_llm()(prompt), RewriteCache(REWRITE_CACHE_PATH))
@@ -0,0 +1,156 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from crea_scraper.metrics import observe
+
+# the search backends are imported on warm-up, so the app renders before they are loaded
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+    from langchain.schema import Document
+
+    from crea_scraper.hybrid_search import HybridIndex
+    from crea_scraper.query_rewrite import QueryRewriter
+    from crea_scraper.result_cache import ResultCache
+    from crea_scraper.tfidf_index import TfidfIndex
+
+logger = logging.getLogger(__name__)
+
+RESULT_STAGES = ["lexical", "refined"]
+
+
+@dataclass
+class Recommendations:
+    stage: str  # lexical or refined
+    courses: List["Document"]
+    stage_seconds: Dict[str, float] = field(default_factory=dict)  # of this and earlier stages
+
+
+class Recommender:
+    """
+    The search resources of the app, shared by all sessions: the course documents,
+    the TF-IDF index and the hybrid index, loaded once by `warm_up`.
+
+    Recommendations come in two stages: lexical hits for the raw query first, which
+    take milliseconds, then refined hits of the hybrid index for the LLM rewrite.
+    Pass a `rewriter` and `embeddings` to use other backends than Azure OpenAI, e.g.
+    FakeLLM and HashEmbeddings to run offline.
+
+    The course vectors are read from the vector db at `vector_db_path`, or from the one
+    built by the pipeline when the embeddings are of its model, so a cold start does not
+    embed the courses again.
+
+    With a `result_cache`, the refined recommendations of a recent query that means
+    the same are returned right away, as the only stage.
+    """
+
+    def __init__(
+        self,
+        course_data_path: str = "output/course_data.parquet",
+        rewriter: Optional["QueryRewriter"] = None,
+        embeddings: Optional["Embeddings"] = None,
+        tfidf_index_path: Optional[str] = None,
+        result_cache: Optional["ResultCache"] = None,
+        vector_db_path: Optional[str] = None,
+    ):
+        self.course_data_path = course_data_path
+        self.rewriter = rewriter
+        self.embeddings = embeddings
+        self.tfidf_index_path = tfidf_index_path
+        self.result_cache = result_cache
+        self.vector_db_path = vector_db_path
+        self.courses: List["Document"] = []
+        self.warm_up_seconds: Dict[str, float] = {}
+        self._tfidf: Optional["TfidfIndex"] = None
+        self._hybrid: Optional["HybridIndex"] = None
+        self._version = ""
+
+    def warm_up(self) -> "Recommender":
+        from crea_scraper.data import (
+            SEARCH_COLUMNS,
+            get_course_documents_for_search,
+            load_course_data,
+            prepare_for_search,
+        )
+        from crea_scraper.embeddings import embeddings_name
+        from crea_scraper.hybrid_search import get_hybrid_index
+        from crea_scraper.query_rewrite import get_query_rewriter
+        from crea_scraper.search import index_version
+        from crea_scraper.tfidf_index import TFIDF_INDEX_PATH, get_tfidf_index
+        from crea_scraper.vector_db import (
+            EMBEDDING_MODEL,
+            default_vector_db_path,
+            get_cached_embeddings,
+        )
+
+        start_time = time.perf_counter()
+        course_data = load_course_data(self.course_data_path, columns=SEARCH_COLUMNS)
+        self.courses = get_course_documents_for_search(prepare_for_search(course_data))
+        self._warmed("documents", start_time)
+
+        start_time = time.perf_counter()
+        tfidf_index_path = self.tfidf_index_path or TFIDF_INDEX_PATH
+        self._tfidf = get_tfidf_index(self.courses, tfidf_index_path)
+        self._warmed("tfidf_index", start_time)
+
+        start_time = time.perf_counter()
+        self.rewriter = self.rewriter or get_query_rewriter()
+        self.embeddings = self.embeddings or get_cached_embeddings()
+        vector_db_path = self.vector_db_path
+        if vector_db_path is None and embeddings_name(self.embeddings) == EMBEDDING_MODEL:
+            vector_db_path = default_vector_db_path()
+        self._hybrid = get_hybrid_index(
+            self.courses, self.embeddings, tfidf_index_path, vector_db_path
+        )
+        self._version = index_version(
+            "hybrid", self.courses, embeddings=self.embeddings, index_path=tfidf_index_path
+        )
+        self._warmed("hybrid_index", start_time)
+        logger.info(f"Warmed up in {sum(self.warm_up_seconds.values()):.2f}s")
+        return self
+
+    def _warmed(self, resource: str, start_time: float) -> None:
+        self.warm_up_seconds[resource] = time.perf_counter() - start_time
+        observe(f"warm_up.{resource}", self.warm_up_seconds[resource])
+
+    def _courses(self, indices) -> List["Document"]:
+        return [self.courses[i] for i in indices if i >= 0]
+
+    def recommend(self, query: str, k: int) -> Iterator[Recommendations]:
+        """
+        Yields the lexical recommendations, and then the refined ones (or only the
+        refined ones, from the result cache).
+        """
+        if self._hybrid is None:
+            self.warm_up()
+        stage_seconds: Dict[str, float] = {}
+
+        if self.result_cache is not None:
+            start_time = time.perf_counter()
+            courses = self.result_cache.get(query, self._version, k)
+            stage_seconds["cache"] = time.perf_counter() - start_time
+            observe("recommend.cache", stage_seconds["cache"])
+            if courses is not None:
+                yield Recommendations("refined", courses, dict(stage_seconds))
+                return
+
+        start_time = time.perf_counter()
+        indices, _ = self._tfidf.search([query], k)
+        stage_seconds["lexical"] = time.perf_counter() - start_time
+        yield Recommendations("lexical", self._courses(indices[0]), dict(stage_seconds))
+
+        start_time = time.perf_counter()
+        search_query = self.rewriter.rewrite(query)
+        stage_seconds["rewrite"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        indices = self._hybrid.search([search_query], k)
+        stage_seconds["refined"] = time.perf_counter() - start_time
+        courses = self._courses(indices[0])
+        if self.result_cache is not None:
+            self.result_cache.put(query, self._version, k, courses)
+        yield Recommendations("refined", courses, dict(stage_seconds))
+
+        for stage in ["lexical", "rewrite", "refined"]:
+            observe(f"recommend.{stage}", stage_seconds[stage])
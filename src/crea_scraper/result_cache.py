@@ -0,0 +1,183 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import numpy as np
+
+from crea_scraper.metrics import count
+
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+
+# words that say nothing about the interest, in English and Dutch
+STOPWORDS = set(
+    "i me my a an the to and or of in on for with like love want would learn some "
+    "ik mij me mijn een de het en of in op voor met graag wil wilt leren houd hou van".split()
+)
+_SUFFIXES = ("ing", "ers", "en", "er", "es", "s", "e")
+_NEGATIONS = {"not", "no", "niet", "geen"}  # as in hybrid_search, which is slow to import
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def embed_query_text(query: str, size: int = 512) -> np.ndarray:
+    """
+    Cheap local query embedding, l2 normalized: the character trigrams of the stemmed
+    words without stopwords, hashed to (dimension, sign) pairs. Takes microseconds,
+    and maps paraphrases like "draw and paint" and "painting, drawing" close together.
+    The trigrams of a negated word are hashed differently, so "not drawing" does not
+    match "drawing".
+
+    Only paraphrases that share words (up to their endings) are close: "ik wil leren
+    tekenen" and "drawing lessons" are not. Give the ResultCache an embeddings model
+    to match those as well.
+    """
+    vector = np.zeros(size, dtype="float32")
+    negated = False
+    for word in re.findall(r"\w+", query.lower()):
+        if word in _NEGATIONS:
+            negated = True
+            continue
+        if word in STOPWORDS:
+            continue
+        prefix, word, negated = "!" if negated else "", f"<{_stem(word)}>", False
+        for i in range(len(word) - 2):
+            trigram = prefix + word[i : i + 3]
+            digest = hashlib.blake2b(trigram.encode("utf-8"), digest_size=5).digest()
+            vector[int.from_bytes(digest[:4], "little") % size] += 1.0 if digest[4] % 2 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class _Entry:
+    query: str
+    version: str
+    k: int
+    results: List[Any]
+
+
+class ResultCache:
+    """
+    Search results of recent queries, found by the meaning of the query.
+
+    A query is embedded with the `embeddings` model, or with `embed_query_text`
+    without one, and compared to the queries in the cache, all at once in one matrix product (the cache is small, so this exact search
+    takes well under a millisecond). The results of the most similar query are reused
+    when its similarity is at least `threshold`, it was searched in the same index
+    `version` and for at least `k` results. The least recently used query is evicted
+    when the cache holds `max_size` queries.
+
+    A model matches paraphrases without words in common, and in another language, at
+    the cost of a request per new query. Pass CachedEmbeddings to embed a query once:
+    its vector is kept in the embedding cache (in memory, it is saved with the next
+    course embeddings).
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_size: int = 1024,
+        size: int = 512,
+        embeddings: Optional["Embeddings"] = None,
+    ):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.size = size
+        self.embeddings = embeddings
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+        self._vectors: Optional[np.ndarray] = None  # of the model size, on the first put
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # slot -> entry, LRU first
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        n_lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / n_lookups if n_lookups else 0.0
+
+    def embed(self, query: str) -> np.ndarray:
+        if self.embeddings is None:
+            return embed_query_text(query, self.size)
+        from crea_scraper.embeddings import CachedEmbeddings
+
+        if not isinstance(self.embeddings, CachedEmbeddings):
+            vector = self.embeddings.embed_query(query)
+        else:
+            with self._lock:
+                vector = self.embeddings.cache.get(query)
+            if vector is None:
+                vector = self.embeddings.embed_query(query)
+                with self._lock:
+                    self.embeddings.cache.put_many([query], np.array([vector]))
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _miss(self) -> None:
+        self.stats["misses"] += 1
+        count("result_cache.misses")
+
+    def get(self, query: str, version: str, k: int) -> Optional[List[Any]]:
+        vector = self.embed(query)
+        with self._lock:
+            if not self._entries or not vector.any():
+                self._miss()
+                return None
+            slots = np.fromiter(self._entries, dtype=int, count=len(self._entries))
+            similarities = self._vectors[slots] @ vector
+            for i, slot in enumerate(slots):
+                entry = self._entries[slot]
+                if entry.version != version or entry.k < k:
+                    similarities[i] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._miss()
+                return None
+            slot = int(slots[best])
+            self._entries.move_to_end(slot)
+            self.stats["hits"] += 1
+            count("result_cache.hits")
+            return self._entries[slot].results[:k]
+
+    def put(self, query: str, version: str, k: int, results: List[Any]) -> None:
+        vector = self.embed(query)
+        if not vector.any():
+            return  # only stopwords, nothing to match on
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype="float32")
+            if len(self._entries) < self.max_size:
+                slot = len(self._entries)
+            else:
+                slot, _ = self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._vectors[slot] = vector
+            self._entries[slot] = _Entry(query, version, k, list(results))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@lru_cache(maxsize=None)
+def get_result_cache() -> ResultCache:
+    """
+    The result cache shared by the whole process (e.g. all Streamlit sessions), which
+    matches queries by their embeddings of the course embeddings model.
+    """
+    from crea_scraper.vector_db import get_cached_embeddings
+
+    # the cosine similarity of ada-002 embeddings is rarely below 0.7, even for unrelated texts
+    return ResultCache(threshold=0.95, embeddings=get_cached_embeddings())
@@ -1,270 +1,410 @@
 import asyncio
 import logging
-import os
-import re
 import time
-from typing import Dict, List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
 
-import aiohttp
 import pandas as pd
-from bs4 import BeautifulSoup
 
+from crea_scraper.cache import CachedPage, PageCache
+from crea_scraper.changes import CHANGE_FEED_PATH, update_snapshot
 from crea_scraper.course import Course, CourseGeneralInfo
-from crea_scraper.data import write_course_data
+from crea_scraper.data import CourseDataBuilder, CourseDataWriter, export_course_data_csv
+from crea_scraper.fetch import FetchError, FetchScheduler
+from crea_scraper.journal import ScrapeJournal
+from crea_scraper.metrics import count, enable, metrics, observe
+from crea_scraper.parsers import DEFAULT_PARSER, get_parser
+from crea_scraper.sites import COURSE_OVERVIEW_URL, CreaSite
 
 logger = logging.getLogger(__name__)
 
 
-async def _request_async(session, url: str):
-    async with session.get(url) as resp:
-        if resp.status == 200:
-            return BeautifulSoup(await resp.text(), "html.parser")
-        return None
-
-
-async def _multi_request_async(urls: List[str]) -> List:
-    # see https://www.twilio.com/blog/asynchronous-http-requests-in-python-with-aiohttp
-    async with aiohttp.ClientSession() as session:
-        tasks = []
-        for url in urls:
-            tasks.append(asyncio.ensure_future(_request_async(session, url)))
-        contents = await asyncio.gather(*tasks)
-        return contents
+@dataclass
+class ScrapeStats:
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    parse_seconds: List[float] = field(default_factory=list)  # per parsed course page
+    fetch: Dict[str, int] = field(default_factory=dict)
+    failures: Dict[str, str] = field(default_factory=dict)  # url -> reason, fetch or parse
 
 
 def _get_course_overview_subpage_urls(
     page_from: int,
     page_to: int,
-    base_url: str = "https://www.crea.nl/cursussen/cursussen-overzicht",
+    base_url: str = COURSE_OVERVIEW_URL,
 ) -> List[str]:
-    subpage_urls = []
-    for page_nr in range(page_from, page_to):
-        subpage_urls.append(os.path.join(base_url, "page", str(page_nr)))
-    return subpage_urls
+    site = CreaSite(base_url)
+    return [site.overview_url(page_nr) for page_nr in range(page_from, page_to)]
 
 
-def get_course_overview_subpages_html_content(
-    max_subpages: int = 27, n_sim_requests: int = 9
-) -> List[str]:
-    """
-    -> [subpage_1, ..., subpage_n]
+def _get_overview_subpage_records(
+    subpage: CachedPage, cache: Optional[PageCache] = None, parser_name: str = DEFAULT_PARSER
+) -> Dict:
     """
+    subpage -> {"course_urls": [course_url_1, ..., course_url_n], "last_page_nr": m}
 
-    n_sim_requests = min(max_subpages, n_sim_requests)
-
-    # The course overview page consists of several subpages, so we have
-    # to send multiple requests until we've reached all subpages
-    subpage_from, subpage_to = 1, n_sim_requests + 1
-    subpage_urls = _get_course_overview_subpage_urls(subpage_from, subpage_to)
-    subpages_html = []
-
-    while subpage_to <= max_subpages + 1:
-        logger.info(f"Requesting subpages {subpage_from} to {subpage_to} ...")
-
-        subpages_html += asyncio.run(_multi_request_async(subpage_urls))
-        if subpages_html[-1] is None:
-            break
-
-        subpage_from += n_sim_requests
-        subpage_to += n_sim_requests
-
-    subpages_html = [sp for sp in subpages_html if sp is not None]
-    return subpages_html
-
+    Subpages that did not change since the previous run reuse their cached records.
+    """
+    records = cache.get_records(subpage) if cache is not None else None
+    if records is None and subpage.records_hash == subpage.content_hash:
+        records = subpage.records
+    if records is None:
+        records = get_parser(parser_name).get_overview_records(subpage.body)
+        if cache is not None:
+            cache.put_records(subpage, records)
+        else:
+            subpage.records_hash, subpage.records = subpage.content_hash, records
+    return records
+
+
+async def get_course_overview_subpages(
+    scheduler: FetchScheduler,
+    max_subpages: int = 27,
+    base_url: str = COURSE_OVERVIEW_URL,
+    parser_name: str = DEFAULT_PARSER,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> List[CachedPage]:
+    """
+    -> [subpage_1, ..., subpage_n]
 
-def _get_courses_html_content_from_overview_subpage(subpage_html) -> List:
+    The course overview page consists of several subpages. The first one
+    tells us how many there are, after which the rest is requested at once.
+    Subpages that cannot be fetched are quarantined, as their courses are missed.
+    """
+    first_subpage_url = _get_course_overview_subpage_urls(1, 2, base_url)[0]
+    first_subpage = await scheduler.fetch(first_subpage_url)
+    if first_subpage is None:
+        raise FetchError(f"Course overview not found at {first_subpage_url}")
+
+    last_page_nr = _get_overview_subpage_records(first_subpage, scheduler.cache, parser_name)[
+        "last_page_nr"
+    ]
+    last_page_nr = min(last_page_nr, max_subpages)
+    logger.info(f"Requesting subpages 2 to {last_page_nr} ...")
+    subpage_urls = _get_course_overview_subpage_urls(2, last_page_nr + 1, base_url)
+    subpages = await scheduler.fetch_many(subpage_urls)
+    for url, subpage in zip(subpage_urls, subpages):
+        if subpage is None:
+            error = scheduler.failures.get(url, "page not found")
+            _quarantine(url, "overview", error, stats, journal)
+    return [first_subpage] + [sp for sp in subpages if sp is not None]
+
+
+def get_course_urls_from_overview_subpages(
+    subpages: List[CachedPage], cache: Optional[PageCache] = None, parser_name: str = DEFAULT_PARSER
+) -> List[str]:
     """
-    subpage -> [course_1, ..., course_n]
+    [subpage_1, ..., subpage_n] -> [course_url_1, ..., course_url_m]
     """
-    selection = subpage_html.find("ul", {"class": "stm-courses"})
-    courses_html = selection.findChildren("li", recursive=False)
-    return courses_html
+    course_urls = []
+    for subpage in subpages:
+        course_urls += _get_overview_subpage_records(subpage, cache, parser_name)["course_urls"]
+    # a course can be listed on more than one subpage
+    return list(dict.fromkeys(course_urls))
 
 
-def get_courses_html_content_from_overview_subpages(subpages_html: List) -> List:
+def _parse_course_page(
+    body: str, parser_name: str = DEFAULT_PARSER
+) -> Tuple[CourseGeneralInfo, List[Course]]:
     """
-    [subpage_1, ..., subpage_n] -> [course_1, ..., course_m]
+    Runs in a parser worker process. Only the records are sent back,
+    the parsed page is dropped as soon as they are extracted.
     """
-    courses_html = []
-    for subpage in subpages_html:
-        courses_html += _get_courses_html_content_from_overview_subpage(subpage)
-    return courses_html
+    return get_parser(parser_name).get_course_data(body)
 
 
-def _get_course_url(course_html, from_overview_page: bool = False) -> str:
-    if from_overview_page:
-        return course_html.find("a", href=True)["href"]
-    # else from course page
-    return course_html.find("link", {"rel": "alternate"}, href=True)["href"]
+def _timed_parse_course_page(
+    body: str, parser_name: str = DEFAULT_PARSER, collect_metrics: bool = False
+) -> Tuple[float, Tuple[CourseGeneralInfo, List[Course]], Optional[Dict]]:
+    """
+    With `collect_metrics` (in a worker process), the metrics recorded while parsing
+    are returned too, to be merged into the metrics of the main process.
+    """
+    if collect_metrics:
+        enable(reset=True)
+    start_time = time.perf_counter()
+    course_data = _parse_course_page(body, parser_name)
+    parse_seconds = time.perf_counter() - start_time
+    return parse_seconds, course_data, metrics.to_json() if collect_metrics else None
 
 
-def get_course_urls(overview_courses_html: List) -> List[str]:
-    course_urls = []
-    for overview_course_html in overview_courses_html:
-        course_urls.append(_get_course_url(overview_course_html, from_overview_page=True))
-    return course_urls
+def get_cached_course_data(
+    page: CachedPage, cache: Optional[PageCache] = None
+) -> Optional[Tuple[CourseGeneralInfo, List[Course]]]:
+    """
+    -> the course data parsed from this version of `page` before, if it is in `cache`
+    """
+    records = cache.get_records(page) if cache is not None else None
+    if records is None:
+        count("parse.cache_misses")
+        return None
+    count("parse.cache_hits")
+    logger.debug(f"Reusing cached records for {page.url}")
+    return (
+        CourseGeneralInfo(**records["general_info"]),
+        [Course(**course) for course in records["courses"]],
+    )
 
 
-def get_courses_html_content(course_urls):
-    return asyncio.run(_multi_request_async(course_urls))
+def cache_course_data(
+    page: CachedPage, info: CourseGeneralInfo, data: List[Course], cache: Optional[PageCache]
+) -> None:
+    """
+    Stores the course data parsed from `page` with the page in `cache`, if given.
+    """
+    if cache is not None:
+        cache.put_records(
+            page, {"general_info": asdict(info), "courses": [asdict(course) for course in data]}
+        )
 
 
-def _get_course_category(course_html) -> str:
+def _get_course_data_from_page(
+    page: CachedPage, cache: Optional[PageCache] = None, parser_name: str = DEFAULT_PARSER
+) -> Tuple[CourseGeneralInfo, List[Course]]:
     """
-    A course can have multiple categories. These get returned
-    as one category, separated by " / ".
-
+    Parses a course page, or reuses the records parsed from an identical page before.
+    """
+    course_data = get_cached_course_data(page, cache)
+    if course_data is None:
+        course_data = _parse_course_page(page.body, parser_name)
+        cache_course_data(page, *course_data, cache)
+    return course_data
+
+
+async def _get_course_data_from_page_async(
+    page: CachedPage,
+    cache: Optional[PageCache] = None,
+    executor: Optional[Executor] = None,
+    parser_name: str = DEFAULT_PARSER,
+    stats: Optional[ScrapeStats] = None,
+) -> Tuple[CourseGeneralInfo, List[Course]]:
+    """
+    Like `_get_course_data_from_page`, but parses in the executor (if given)
+    so that the event loop can keep fetching in the meantime.
+    """
+    course_data = get_cached_course_data(page, cache)
+    if course_data is None:
+        if executor is None:
+            parse_seconds, course_data, _ = _timed_parse_course_page(page.body, parser_name)
+        else:
+            loop = asyncio.get_running_loop()
+            parse_seconds, course_data, worker_metrics = await loop.run_in_executor(
+                executor, _timed_parse_course_page, page.body, parser_name, metrics.enabled
+            )
+            if worker_metrics is not None:
+                metrics.merge(worker_metrics)
+        observe("parse", parse_seconds)
+        if stats is not None:
+            stats.parse_seconds.append(parse_seconds)
+        cache_course_data(page, *course_data, cache)
+    return course_data
+
+
+def _quarantine(
+    url: str,
+    stage: str,
+    error: str,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> None:
+    count(f"failures.{stage}")
+    if stats is not None:
+        stats.failures[url] = f"{stage}: {error}"
+    if journal is not None:
+        journal.quarantine(url, stage, error)
+
+
+async def _scrape_course(
+    scheduler: FetchScheduler,
+    course_url: str,
+    pending_pages: asyncio.Semaphore,
+    executor: Optional[Executor] = None,
+    parser_name: str = DEFAULT_PARSER,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> Optional[Tuple[CourseGeneralInfo, List[Course]]]:
+    """
+    Fetches and parses one course page. A page that cannot be fetched or parsed is
+    quarantined (and skipped), so it never stops the other pages.
+    """
+    course_data = journal.get(course_url) if journal is not None else None
+    if course_data is not None:
+        return course_data
+    # the semaphore is held until the page is parsed, which bounds the number of pages in memory
+    async with pending_pages:
+        page = await scheduler.try_fetch(course_url)
+        if page is None:
+            error = scheduler.failures.get(course_url, "page not found")
+            _quarantine(course_url, "fetch", error, stats, journal)
+            return None
+        try:
+            course_data = await _get_course_data_from_page_async(
+                page, scheduler.cache, executor, parser_name, stats
+            )
+        except Exception as e:
+            logger.error(f"Could not parse {course_url} ({e!r})")
+            _quarantine(course_url, "parse", repr(e), stats, journal)
+            return None
+    if journal is not None:
+        journal.add(course_url, *course_data)
+    return course_data
+
+
+async def scrape_courses(
+    scheduler: FetchScheduler,
+    course_urls: List[str],
+    on_course_data: Callable[[CourseGeneralInfo, List[Course]], None],
+    executor: Optional[Executor] = None,
+    max_pending_pages: int = 32,
+    parser_name: str = DEFAULT_PARSER,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> None:
+    """
+    Fetches and parses all course pages as a stream. Every page is handed to the
+    parser as soon as it arrives, and its records are passed on to `on_course_data`
+    in the order of `course_urls`. Pages already in the `journal` are not fetched again.
+    """
+    pending_pages = asyncio.Semaphore(max_pending_pages)
+    tasks = [
+        asyncio.ensure_future(
+            _scrape_course(scheduler, url, pending_pages, executor, parser_name, stats, journal)
+        )
+        for url in course_urls
+    ]
+    try:
+        for task in tasks:
+            course_data = await task
+            if course_data is not None:
+                on_course_data(*course_data)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_courses_data(
+    course_pages: List[CachedPage],
+    cache: Optional[PageCache] = None,
+    parser_name: str = DEFAULT_PARSER,
+) -> pd.DataFrame:
+    builder = CourseDataBuilder()
+    for course_page in course_pages:
+        builder.add(*_get_course_data_from_page(course_page, cache, parser_name))
+    return builder.to_dataframe()
+
+
+async def _run_async(
+    scheduler: FetchScheduler,
+    on_course_data: Callable[[CourseGeneralInfo, List[Course]], None],
+    executor: Optional[Executor] = None,
+    parser_name: str = DEFAULT_PARSER,
+    base_url: str = COURSE_OVERVIEW_URL,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> None:
+    stats = stats if stats is not None else ScrapeStats()
+    async with scheduler:
+        start_time = time.perf_counter()
+        course_urls = journal.course_urls if journal is not None else None
+        if course_urls is None:
+            overview_subpages = await get_course_overview_subpages(
+                scheduler, base_url=base_url, parser_name=parser_name, stats=stats, journal=journal
+            )
+            course_urls = get_course_urls_from_overview_subpages(
+                overview_subpages, scheduler.cache, parser_name
+            )
+            if journal is not None:
+                journal.set_course_urls(course_urls)
+        stats.stage_seconds["overview"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        await scrape_courses(
+            scheduler,
+            course_urls,
+            on_course_data,
+            executor,
+            parser_name=parser_name,
+            stats=stats,
+            journal=journal,
+        )
+        stats.stage_seconds["courses"] = time.perf_counter() - start_time
+
+    stats.fetch.update(scheduler.stats)
+    for name, value in scheduler.stats.items():
+        count(f"fetch.{name}", value)
+    n_not_modified = scheduler.stats["not_modified"]
+    logger.info(f"{n_not_modified}/{scheduler.stats['requests']} pages not modified")
+    if scheduler.failures:
+        logger.error(f"{len(scheduler.failures)} pages could not be fetched")
+
+
+def run(
+    cache: Optional[PageCache] = None,
+    output_path: Optional[str] = None,
+    n_parse_workers: Optional[int] = None,
+    parser_name: str = DEFAULT_PARSER,
+    max_requests_per_host: int = 8,
+    requests_per_second: float = 10.0,
+    base_url: str = COURSE_OVERVIEW_URL,
+    stats: Optional[ScrapeStats] = None,
+    journal: Optional[ScrapeJournal] = None,
+) -> pd.DataFrame:
+    """
+    Scrapes all courses. Course pages are parsed by `n_parse_workers` worker
+    processes (one per CPU by default, or on the event loop if 0) while the
+    remaining pages are still being fetched, using the `parser_name` backend
+    (see `crea_scraper.parsers`). If an `output_path` is given, the course
+    data is streamed to it as Parquet.
+
+    `base_url` is the course overview to start from, and `stats` (if given)
+    is filled with the timings and fetch statistics of the run.
+
+    Pages that cannot be fetched or parsed are skipped and listed in `stats.failures`.
+    With a `journal`, the run is checkpointed as it goes, an interrupted run is resumed
+    from it, and the failures are written to its quarantine file at the end.
     """
-
-    for e in course_html.find_all("div", class_="meta_values"):
-        element_content = e.text.lower()
-        if "categorie" in element_content or "category" in element_content:
-            category_html = e
-            break
-    categories = [e.text[:-1] for e in category_html.find_all("a")]
-    return " / ".join(categories)
-
-
-def _get_course_name(course_html) -> str:
-    return course_html.find(class_="product_title entry-title").text
-
-
-def _get_course_description(course_html) -> str:
-    parts = [e.text for e in course_html.find(class_="wpb_wrapper").findChildren("p")]
-    description = "\n\n".join(parts)
-
-    description = re.sub(r"\.([a-zA-Z])", r". \1", description)
-    description = re.sub(r"\?([a-zA-Z])", r"? \1", description)
-    description = re.sub(r"\!([a-zA-Z])", r"! \1", description)
-    description = re.sub(r"([a-z])([A-Z])", r"\1, \2", description)
-
-    return description
-
-
-def _get_raw_table_data(table_html, incl_empty_values=True):
-    table_data = []
-    rows = table_html.find_all("tr")
-    for row in rows:
-        cols = row.find_all("td")
-        cols_extracted = []
-        for col in cols:
-            if col.find("img"):
-                cols_extracted.append(", ".join([img["title"] for img in col.find_all("img")]))
-            else:
-                cols_extracted.append(col.text.strip())
-        table_data.append([e for e in cols_extracted if e or incl_empty_values])
-    return table_data
-
-
-def _get_dict_from_raw_table_data(table_data):
-    table_dict = {}
-    for i, row in enumerate(table_data):
-        if i % 2 != 0:
-            continue
-        for j, col in enumerate(row):
-            if not col:
-                continue
-            table_dict[col] = table_data[i + 1][j]
-    return table_dict
-
-
-def _separate_time_from_day(table_dict):
-    time_data_split = table_dict["tijd"].split()
-
-    error_msg = f"Error while parsing: {table_dict['tijd']}"
-    assert len(time_data_split) < 5, error_msg
-
-    day = time_data_split[0]
-    time = " ".join(time_data_split[1:])
-
-    table_dict["dag"] = day
-    table_dict["tijd"] = time
-    table_dict["dag_tijd"] = f"{day} {time}"
-    return table_dict
-
-
-def _extract_data_from_table(table_html):
-    table_data = _get_raw_table_data(table_html)
-    table_dict = _get_dict_from_raw_table_data(table_data)
-    table_dict = _separate_time_from_day(table_dict)
-    return table_dict
-
-
-def _get_course_status(register_link_html):
-    return register_link_html.text
-
-
-def _get_course_table_data(course_html) -> List[Dict]:
-    div = course_html.find("div", class_="product_main_data")
-    register_links_html = div.findChildren("a", class_="register_link")
-    tables_html = div.findChildren("table", recursive=False)
-    if not len(tables_html):
-        print(f"No tables found for {_get_course_url(course_html)}")
-    table_data = []
-    for table_html, register_link_html in zip(tables_html, register_links_html):
-        table_dict = _extract_data_from_table(table_html)
-        course_status = _get_course_status(register_link_html)
-        table_dict["status"] = course_status
-        table_data.append(table_dict)
-    return table_data
-
-
-def _get_course_data(course_html) -> Tuple[CourseGeneralInfo, List[Course]]:
-    url = _get_course_url(course_html)
-    print(f"Parsing {url} ...")
-    general_info = CourseGeneralInfo(
-        url=url,
-        naam=_get_course_name(course_html),
-        categorie=_get_course_category(course_html),
-        beschrijving=_get_course_description(course_html),
-    )
-    course_data = []
-    table_data = _get_course_table_data(course_html)
-    for table in table_data:
-        tbl = {}
-        for key in table:
-            if "prijs" in key:
-                tbl["prijs"] = table[key]
-            else:
-                tbl[key] = table[key]
-        course_data.append(Course(naam=general_info.naam, **tbl))
-
-    print("Success!")
-    return general_info, course_data
-
-
-def get_courses_data(courses_html) -> pd.DataFrame:
-    courses_data: List[List[Course]] = []
-    general_info: List[CourseGeneralInfo] = []
-    for course_html in courses_html:
-        info, data = _get_course_data(course_html)
-        courses_data.append(data)
-        general_info.append(info)
-
-    general_info_df = pd.DataFrame(general_info)
-    courses_data_df = pd.concat([pd.DataFrame(data) for data in courses_data])
-
-    df = courses_data_df.merge(general_info_df, how="inner", on="naam")
-    assert len(df) >= len(courses_data_df), "Each course should have general info"
-    return df
-
-
-def run() -> pd.DataFrame:
     logger.info("Starting scraper ...")
-    overview_subpages_html = get_course_overview_subpages_html_content()
-    overview_courses_html = get_courses_html_content_from_overview_subpages(overview_subpages_html)
+    scheduler = FetchScheduler(
+        cache=cache,
+        max_requests_per_host=max_requests_per_host,
+        requests_per_second=requests_per_second,
+    )
+    builder = CourseDataBuilder()
+
+    with ExitStack() as stack:
+        writer = stack.enter_context(CourseDataWriter(output_path)) if output_path else None
+        executor = None
+        if n_parse_workers != 0:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=n_parse_workers))
+
+        def on_course_data(general_info: CourseGeneralInfo, courses: List[Course]) -> None:
+            builder.add(general_info, courses)
+            if writer is not None:
+                writer.add(general_info, courses)
 
-    course_urls = get_course_urls(overview_courses_html)
-    courses_html = get_courses_html_content(course_urls)
+        asyncio.run(
+            _run_async(scheduler, on_course_data, executor, parser_name, base_url, stats, journal)
+        )
+    if journal is not None:
+        journal.finish()
 
-    courses_data = get_courses_data(courses_html)
-    return courses_data
+    return builder.to_dataframe()
 
 
 if __name__ == "__main__":
     logging.basicConfig(
         format="%(levelname)s:%(funcName)s:%(lineno)d: %(message)s", level=logging.INFO
     )
-    start_time = time.time()
-    write_course_data(run(), "output/course_data.csv")
-    print("--- %s seconds ---" % (time.time() - start_time))
+    start_time = time.perf_counter()
+    run(
+        cache=PageCache(".cache/pages"),
+        output_path="output/course_data.parquet.tmp",
+        journal=ScrapeJournal(".cache/journal"),
+    )
+    update_snapshot(
+        "output/course_data.parquet.tmp", "output/course_data.parquet", CHANGE_FEED_PATH
+    )
+    export_course_data_csv("output/course_data.parquet", "output/course_data.csv")
+    logger.info(f"Scraped in {time.perf_counter() - start_time:.1f}s")
@@ -1,66 +1,233 @@
+import hashlib
+import logging
 import os
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
 
-from langchain.llms import AzureOpenAI
-from langchain.schema import Document
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
+import numpy as np
 
-from crea_scraper.prompts import search_prompt_template
-from crea_scraper.vector_db import load_vector_db
+from crea_scraper.metrics import observe, span
 
+# the search backends (langchain, openai, sklearn, faiss) are imported on first use,
+# so importing this module (e.g. on the first render of the app) stays fast
+if TYPE_CHECKING:
+    from langchain.embeddings.base import Embeddings
+    from langchain.schema import Document
+
+    from crea_scraper.query_rewrite import QueryRewriter
+    from crea_scraper.result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SearchStats:
+    stage_seconds: Dict[str, float] = field(default_factory=dict)  # rewrite, load, score, rank
+
+
+def embedding_search(
+    query: str, k: int, vector_db_path: str, urls: Optional[Set[str]] = None
+) -> List["Document"]:
+    from crea_scraper.vector_db import get_vector_db
 
-def embedding_search(query: str, k: int, vector_db_path: str) -> List[Document]:
     if not os.path.exists(vector_db_path):
         raise FileNotFoundError(
             "Vector database not found. Run `python -m crea_scraper.vector_db` to create it."
         )
-    db = load_vector_db(vector_db_path)
-    return db.similarity_search(query, k=k)
+    db = get_vector_db(vector_db_path)
+    if urls is None:
+        return db.similarity_search(query, k=k)
+    # only keep courses from the given pages, out of all stored courses
+    return db.similarity_search(query, k=k, filter={"url": list(urls)}, fetch_k=db.index.ntotal)
+
+
+def tfidf_search(
+    query: str,
+    courses: List["Document"],
+    k: int,
+    urls: Optional[Set[str]] = None,
+    index_path: Optional[str] = None,
+) -> List["Document"]:
+    return tfidf_search_batch([query], courses, k, urls, index_path)[0]
+
 
+def tfidf_search_batch(
+    queries: List[str],
+    courses: List["Document"],
+    k: int,
+    urls: Optional[Set[str]] = None,
+    index_path: Optional[str] = None,
+) -> List[List["Document"]]:
+    """
+    Scores all queries at once against the prebuilt TF-IDF index of `courses`.
+    """
+    from crea_scraper.tfidf_index import TFIDF_INDEX_PATH, get_tfidf_index
 
-def tfidf_search(query: str, courses: List[Document], k: int) -> List[Document]:
-    vectorizer = TfidfVectorizer()
-    course_descriptions = [course.page_content for course in courses]
-    tfidf_documents = vectorizer.fit_transform(course_descriptions)
-    tfidf_query = vectorizer.transform([query])
-    similarities = linear_kernel(tfidf_query, tfidf_documents).flatten()
-    top_k_indices = similarities.argsort()[-k:][::-1]
-    top_k_documents = [courses[index] for index in top_k_indices]
-    return top_k_documents
+    if not courses:
+        return [[] for _ in queries]
+    index = get_tfidf_index(courses, index_path or TFIDF_INDEX_PATH)
+    mask = None
+    if urls is not None:
+        mask = np.array([course.metadata["url"] in urls for course in courses])
+    top_k_indices, _ = index.search(queries, k, mask)
+    return [[courses[i] for i in row if i >= 0] for row in top_k_indices]
 
 
 def prepare_query_for_search(query: str) -> str:
-    llm = AzureOpenAI(
-        model_name="gpt-4",
-        temperature=0.7,
-        max_tokens=250,
-        top_p=1.0,
-        verbose=True,
-        engine="gpt-4-us",
-    )
-    return llm(search_prompt_template().format(query=query))
+    from crea_scraper.query_rewrite import get_query_rewriter
+
+    return get_query_rewriter().rewrite(query)
+
+
+def index_version(
+    method: str,
+    courses: List["Document"],
+    vector_db_path: str = "output/vector_db",
+    urls: Optional[Set[str]] = None,
+    embeddings: Optional["Embeddings"] = None,
+    index_path: Optional[str] = None,
+) -> str:
+    """
+    -> a key of the index (and url filter) a search runs against, for the result cache
+
+    The key changes with the course data, the embeddings model and the rewrite prompt.
+    The course data is versioned by the loaded TF-IDF index, so the corpus is only
+    hashed when the index is loaded.
+    """
+    from crea_scraper.query_rewrite import prompt_hash
+
+    if method == "embedding":
+        from crea_scraper.vector_db import EMBEDDING_MODEL, get_vector_db_version
+
+        index = f"{EMBEDDING_MODEL}:{vector_db_path}:{get_vector_db_version(vector_db_path)}"
+    else:
+        from crea_scraper.tfidf_index import TFIDF_INDEX_PATH, get_tfidf_index
+
+        index = get_tfidf_index(courses, index_path or TFIDF_INDEX_PATH).data_hash
+        if method == "hybrid":
+            from crea_scraper.embeddings import embeddings_name
+            from crea_scraper.vector_db import get_cached_embeddings
+
+            index = f"{embeddings_name(embeddings or get_cached_embeddings())}:{index}"
+    index += f":{prompt_hash()}"
+    if urls is not None:
+        index += ":" + hashlib.sha256("\n".join(sorted(urls)).encode("utf-8")).hexdigest()
+    return f"{method}:{index}"
 
 
 def get_relevant_courses(
     query: str,
-    courses: List[Document],
+    courses: List["Document"],
     method: str = "embedding",
     k: int = 10,
     vector_db_path: str = "output/vector_db",
     verbose: bool = True,
-) -> List[Document]:
-    assert method in ["embedding", "tfidf"]
+    urls: Optional[Set[str]] = None,
+    result_cache: Optional["ResultCache"] = None,
+    index_path: Optional[str] = None,
+) -> List["Document"]:
+    """
+    Returns the `k` courses most relevant to `query`. Pass `urls`, e.g. from
+    `CourseIndex.query_urls`, to only consider courses from those course pages.
 
-    search_query = prepare_query_for_search(query)
+    With a `result_cache` (e.g. `get_result_cache()`), the results of a recent query
+    that means the same are returned right away, without a rewrite or search.
+    """
+    assert method in ["embedding", "tfidf", "hybrid"]
+
+    if result_cache is not None:
+        version = index_version(method, courses, vector_db_path, urls, index_path=index_path)
+        with span("search.result_cache"):
+            results = result_cache.get(query, version, k)
+        if results is not None:
+            return results
+
+    with span("search.rewrite"):
+        search_query = prepare_query_for_search(query)
     if verbose:
-        print(f"Search query:\n{search_query}")
+        logger.info(f"Search query: {search_query}")
+
+    with span(f"search.{method}", k=k):
+        if method == "tfidf":
+            results = tfidf_search(search_query, courses, k, urls, index_path)
+        elif method == "hybrid":
+            from crea_scraper.hybrid_search import hybrid_search
+            from crea_scraper.tfidf_index import TFIDF_INDEX_PATH
+            from crea_scraper.vector_db import get_cached_embeddings
+
+            results = hybrid_search(
+                search_query,
+                courses,
+                k,
+                get_cached_embeddings(),
+                urls,
+                tfidf_index_path=index_path or TFIDF_INDEX_PATH,
+            )
+        elif method == "embedding":
+            results = embedding_search(
+                search_query, k, vector_db_path, urls
+            )  # courses already stored in vector db
+        else:
+            raise ValueError(f"Method {method} not supported.")
+    if result_cache is not None:
+        result_cache.put(query, version, k, results)
+    return results
 
+
+def get_relevant_courses_batch(
+    queries: List[str],
+    courses: List["Document"],
+    method: str = "hybrid",
+    k: int = 10,
+    urls: Optional[Set[str]] = None,
+    rewriter: Optional["QueryRewriter"] = None,
+    embeddings: Optional["Embeddings"] = None,
+    max_concurrency: int = 8,
+    stats: Optional[SearchStats] = None,
+    index_path: Optional[str] = None,
+) -> List[List["Document"]]:
+    """
+    Like `get_relevant_courses`, for many queries at once: the queries are rewritten
+    concurrently, and then scored against the index in one matrix product.
+
+    Pass a `rewriter` and `embeddings` to use other backends than Azure OpenAI, e.g.
+    FakeLLM and HashEmbeddings to run offline.
+    """
+    from crea_scraper.hybrid_search import get_hybrid_index
+    from crea_scraper.query_rewrite import get_query_rewriter
+    from crea_scraper.tfidf_index import TFIDF_INDEX_PATH, get_tfidf_index, top_k
+    from crea_scraper.vector_db import get_cached_embeddings
+
+    assert method in ["tfidf", "hybrid"]
+    stats = stats if stats is not None else SearchStats()
+
+    start_time = time.perf_counter()
+    rewriter = rewriter or get_query_rewriter()
+    with ThreadPoolExecutor(max_concurrency) as executor:
+        search_queries = list(executor.map(rewriter.rewrite, queries))
+    stats.stage_seconds["rewrite"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    index_path = index_path or TFIDF_INDEX_PATH
     if method == "tfidf":
-        return tfidf_search(search_query, courses, k)
-    elif method == "embedding":
-        return embedding_search(
-            search_query, k, vector_db_path
-        )  # courses already stored in vector db
+        index = get_tfidf_index(courses, index_path)
     else:
-        raise ValueError(f"Method {method} not supported.")
+        index = get_hybrid_index(courses, embeddings or get_cached_embeddings(), index_path)
+    stats.stage_seconds["load"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    scores = index.scores(search_queries)
+    stats.stage_seconds["score"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    mask = None
+    if urls is not None:
+        mask = np.array([course.metadata["url"] in urls for course in courses])
+    indices, _ = top_k(scores, k, mask)
+    results = [[courses[i] for i in row if i >= 0] for row in indices]
+    stats.stage_seconds["rank"] = time.perf_counter() - start_time
+    for stage, seconds in stats.stage_seconds.items():
+        observe(f"search.batch.{stage}", seconds)
+    return results
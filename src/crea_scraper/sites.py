@@ -0,0 +1,88 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Type
+
+from crea_scraper.course import Course, CourseGeneralInfo
+from crea_scraper.parsers import DEFAULT_PARSER, get_parser
+
+COURSE_OVERVIEW_URL = "https://www.crea.nl/cursussen/cursussen-overzicht"
+
+# kinds of pages in the crawl frontier
+OVERVIEW = "overview"
+COURSE = "course"
+
+
+class SiteAdapter(ABC):
+    """
+    A course provider for the crawler: where to start, which links to follow from
+    an overview page, and how to extract the course records from a course page.
+
+    Adapters are sent to the crawl worker processes, so they should stay picklable.
+    An adapter that misses one of the abstract methods cannot be instantiated.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def seed_urls(self) -> List[str]:
+        """
+        -> the overview pages to start from
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def discover(self, url: str, body: str) -> Dict[str, List[str]]:
+        """
+        overview page -> {OVERVIEW: [overview_url, ...], COURSE: [course_url, ...]}
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def extract(self, url: str, body: str) -> Tuple[CourseGeneralInfo, List[Course]]:
+        raise NotImplementedError
+
+
+class CreaSite(SiteAdapter):
+    """
+    The CREA website: a paginated course overview, linking to one page per course.
+    """
+
+    name = "crea"
+
+    def __init__(
+        self,
+        base_url: str = COURSE_OVERVIEW_URL,
+        parser_name: str = DEFAULT_PARSER,
+        max_subpages: int = 27,
+        name: str = "crea",
+    ):
+        self.base_url = base_url
+        self.parser_name = parser_name
+        self.max_subpages = max_subpages
+        self.name = name
+
+    def overview_url(self, page_nr: int) -> str:
+        return f"{self.base_url.rstrip('/')}/page/{page_nr}"
+
+    def seed_urls(self) -> List[str]:
+        return [self.overview_url(1)]
+
+    def discover(self, url: str, body: str) -> Dict[str, List[str]]:
+        # every subpage links to the last one, the frontier drops the ones seen before
+        records = get_parser(self.parser_name).get_overview_records(body)
+        last_page_nr = min(records["last_page_nr"], self.max_subpages)
+        return {
+            OVERVIEW: [self.overview_url(nr) for nr in range(2, last_page_nr + 1)],
+            COURSE: records["course_urls"],
+        }
+
+    def extract(self, url: str, body: str) -> Tuple[CourseGeneralInfo, List[Course]]:
+        return get_parser(self.parser_name).get_course_data(body)
+
+
+SITES: Dict[str, Type[SiteAdapter]] = {site.name: site for site in (CreaSite,)}
+
+
+def get_site(name: str, **kwargs) -> SiteAdapter:
+    if name not in SITES:
+        raise ValueError(f"Site {name} not supported, choose from {list(SITES)}.")
+    return SITES[name](**kwargs)
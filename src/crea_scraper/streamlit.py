@@ -4,18 +4,14 @@ import pandas as pd
 import streamlit as st
 from streamlit import error, session_state, text_input  # type: ignore
 
-from crea_scraper.data import get_course_documents_for_search, load_course_data, prepare_for_search
-from crea_scraper.search import get_relevant_courses
+from crea_scraper.recommender import Recommendations, Recommender
+from crea_scraper.result_cache import get_result_cache
 
-demo_password = os.environ["CREA_DEMO_PASSWORD"]
 
-
-@st.cache_data
-def load_data():
-    course_data = load_course_data("output/course_data.csv")
-    data_for_search = prepare_for_search(course_data)
-    course_documents = get_course_documents_for_search(data_for_search)
-    return course_data, course_documents
+@st.cache_resource(show_spinner="Loading the courses ...")
+def get_recommender() -> Recommender:
+    # one per server, shared by all sessions
+    return Recommender("output/course_data.parquet", result_cache=get_result_cache()).warm_up()
 
 
 def check_password():
@@ -23,7 +19,7 @@ def check_password():
 
     def password_entered():
         """Checks whether a password entered by the user is correct."""
-        if session_state["password"] == demo_password:
+        if session_state["password"] == os.environ["CREA_DEMO_PASSWORD"]:
             session_state["password_correct"] = True
             del session_state["password"]  # don't store password
         else:
@@ -60,36 +56,44 @@ def app():
     with center:
         generate_button = st.button("Recommend")
 
+    # loaded once per server, after the page is rendered
+    recommender = get_recommender()
+
     if generate_button:
-        course_data, course_documents = load_data()
-        recommendations = get_relevant_courses(
-            query=interests,
-            courses=course_documents,
-            k=n_recommendations,
-            method="embedding",
-            vector_db_path="output/vector_db",
-            verbose=True,
-        )
-        course_names = [course.metadata["naam"] for course in recommendations]
-        course_links = [make_clickable(course.metadata["url"]) for course in recommendations]
-        # course_names = ["Course 1", "Course 2", "Course 3"]
-        # course_links = [make_clickable("www.nos.nl") for course in course_names]
-        # table with "naam" as index and clickable urls with shortcut "link"
-        df = pd.DataFrame({"Course name": course_names, "Webpage": course_links})
-
-        # Display the DataFrame as an HTML table with clickable links
-        with st.container():
-            st.write(
-                df.to_html(
-                    escape=False,
-                    index=False,
-                    col_space=350,
-                    justify="left",
-                ),
-                unsafe_allow_html=True,
-            )
+        results = st.empty()
+        for recommendations in recommender.recommend(interests, n_recommendations):
+            with results.container():
+                show_recommendations(recommendations)
+
+    with st.expander("Debug"):
+        st.write("Warm-up (s)", recommender.warm_up_seconds)
+        st.write(f"Result cache hit rate: {recommender.result_cache.hit_rate:.0%}")
+        if generate_button:
+            st.write("Latency per stage (s)", recommendations.stage_seconds)
+
+
+def show_recommendations(recommendations: Recommendations):
+    if recommendations.stage == "lexical":
+        st.caption("Quick matches, refining ...")
+    course_names = [course.metadata["naam"] for course in recommendations.courses]
+    course_links = [make_clickable(course.metadata["url"]) for course in recommendations.courses]
+    # table with "naam" as index and clickable urls with shortcut "link"
+    df = pd.DataFrame({"Course name": course_names, "Webpage": course_links})
+
+    # Display the DataFrame as an HTML table with clickable links
+    st.write(
+        df.to_html(
+            escape=False,
+            index=False,
+            col_space=350,
+            justify="left",
+        ),
+        unsafe_allow_html=True,
+    )
 
 
 if __name__ == "__main__":
     if check_password():
         app()
+    else:
+        get_recommender()  # warm up while the password is entered
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.metrics import span
+
+TFIDF_INDEX_PATH = "output/tfidf_index"
+_ARRAYS = ["data", "indices", "indptr", "idf"]
+
+# indexes loaded in this process, by path, with the course documents they were loaded for
+_loaded_indexes: Dict[str, Tuple[List[Document], "TfidfIndex"]] = {}
+
+
+def _array_file(name: str, version: str) -> str:
+    return f"{name}.{version}.npy"
+
+
+def corpus_hash(texts: List[str]) -> str:
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class TfidfIndex:
+    """
+    TF-IDF index over the course documents, fitted once and persisted.
+
+    The document matrix is stored as raw CSR arrays (one .npy file each) next to the
+    vocabulary, so loading is a memory map instead of a refit. Queries are scored
+    in one sparse matmul and the top k is selected with argpartition.
+
+    The arrays are saved under the version of the corpus and meta.json points to them,
+    so a save never overwrites the files that another process has memory mapped.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        idf: np.ndarray,
+        matrix: sparse.csr_matrix,
+        data_hash: str,
+    ):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.matrix = matrix  # (n_documents, n_terms), rows are l2 normalized
+        self.data_hash = data_hash
+        self._counter = CountVectorizer(vocabulary=vocabulary)
+        self._term_columns: Optional[sparse.csc_matrix] = None
+
+    @classmethod
+    def build(cls, texts: List[str]) -> "TfidfIndex":
+        vectorizer = TfidfVectorizer()
+        matrix = vectorizer.fit_transform(texts).tocsr()
+        vocabulary = {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+        return cls(vocabulary, vectorizer.idf_, matrix, corpus_hash(texts))
+
+    @property
+    def version(self) -> str:
+        return self.data_hash[:16]
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        previous = TfidfIndex.stored_meta(path)
+        arrays = {
+            "data": self.matrix.data,
+            "indices": self.matrix.indices,
+            "indptr": self.matrix.indptr,
+            "idf": self.idf,
+        }
+        for name, array in arrays.items():
+            tmp_file = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(path, _array_file(name, self.version)))
+        meta = {
+            "data_hash": self.data_hash,
+            "version": self.version,
+            "shape": list(self.matrix.shape),
+            "vocabulary": self.vocabulary,
+        }
+        # swapping in the metadata switches to the new arrays at once, and an interrupted
+        # save is never loaded
+        tmp_file = os.path.join(path, "meta.json.tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_file, os.path.join(path, "meta.json"))
+
+        # the previous arrays are kept for processes that read the old metadata just now
+        keep = {_array_file(name, self.version) for name in _ARRAYS}
+        if previous is not None and "version" in previous:
+            keep |= {_array_file(name, previous["version"]) for name in _ARRAYS}
+        for file in os.listdir(path):
+            if file.endswith(".npy") and file not in keep:
+                os.remove(os.path.join(path, file))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TfidfIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(
+                os.path.join(path, _array_file(name, meta["version"])),
+                mmap_mode="r" if mmap else None,
+            )
+            for name in _ARRAYS
+        }
+        matrix = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return cls(meta["vocabulary"], np.asarray(arrays["idf"]), matrix, meta["data_hash"])
+
+    @staticmethod
+    def stored_meta(path: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def stored_hash(path: str) -> Optional[str]:
+        meta = TfidfIndex.stored_meta(path)
+        # indexes saved before the arrays were versioned are rebuilt
+        if meta is None or "version" not in meta:
+            return None
+        return meta.get("data_hash")
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def term_ids(self, text: str) -> List[int]:
+        """
+        -> vocabulary ids of the words in `text`, words that are not indexed are skipped
+        """
+        analyze = self._counter.build_analyzer()
+        return [self.vocabulary[term] for term in analyze(text) if term in self.vocabulary]
+
+    def transform(self, queries: List[str]) -> sparse.csr_matrix:
+        # the same weighting as TfidfVectorizer: raw counts times idf, l2 normalized
+        counts = self._counter.transform(queries)
+        return normalize(counts.multiply(self.idf).tocsr())
+
+    @property
+    def term_columns(self) -> sparse.csc_matrix:
+        """
+        The document matrix by term (CSC), built on first use, to look up the documents of a term.
+        """
+        if self._term_columns is None:
+            self._term_columns = self.matrix.tocsc()
+        return self._term_columns
+
+    def scores(self, queries: List[str]) -> np.ndarray:
+        """
+        -> (n_queries, n_documents) cosine similarities
+        """
+        # only the columns of the query terms contribute, so only those are multiplied
+        query_matrix = self.transform(queries)
+        term_ids = np.unique(query_matrix.indices)
+        return (query_matrix[:, term_ids] @ self.term_columns[:, term_ids].T).toarray()
+
+    def search(
+        self, queries: List[str], k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        -> (indices, scores), both (n_queries, k), best first
+
+        Only documents where `mask` is True are returned, if given. Rows with less
+        than k candidates are padded with index -1.
+        """
+        return top_k(self.scores(queries), k, mask)
+
+
+def top_k(
+    scores: np.ndarray, k: int, mask: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    -> (indices, scores) of the `k` best scores per row, best first, selected with argpartition
+
+    Documents where `mask` is False and scores of -inf are left out, rows with less
+    than k candidates are padded with index -1.
+    """
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    k = min(k, scores.shape[1])
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_k_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top_k_scores, axis=1, kind="stable")
+    indices = np.take_along_axis(indices, order, axis=1)
+    top_k_scores = np.take_along_axis(top_k_scores, order, axis=1)
+    indices[np.isneginf(top_k_scores)] = -1
+    return indices, top_k_scores
+
+
+def get_tfidf_index(courses: List[Document], path: str = TFIDF_INDEX_PATH) -> TfidfIndex:
+    """
+    Returns the index for these course documents, loaded once per process.
+
+    The index is rebuilt (and saved to `path`) only when the course data changed. The
+    corpus is only hashed when a different list of course documents is passed, so
+    pass the same list on every query.
+    """
+    loaded = _loaded_indexes.get(path)
+    if loaded is not None and loaded[0] is courses:
+        return loaded[1]
+    texts = [course.page_content for course in courses]
+    data_hash = corpus_hash(texts)
+    if loaded is not None and loaded[1].data_hash == data_hash:
+        index = loaded[1]
+    elif TfidfIndex.stored_hash(path) == data_hash:
+        with span("index.tfidf.load"):
+            index = TfidfIndex.load(path)
+    else:
+        with span("index.tfidf.build", courses=len(texts)):
+            index = TfidfIndex.build(texts)
+            index.save(path)
+    _loaded_indexes[path] = (courses, index)
+    return index
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+
+    course_data = load_course_data("output/course_data.parquet", columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+    get_tfidf_index(courses, TFIDF_INDEX_PATH)
+
+    print("--- %s seconds ---" % (time.time() - start_time))
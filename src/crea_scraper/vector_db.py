@@ -1,41 +1,242 @@
+import hashlib
+import json
+import logging
 import os
+import shutil
 import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
 
-import openai
+import faiss
+import numpy as np
 import pandas as pd
+from langchain.docstore.in_memory import InMemoryDocstore
 from langchain.embeddings import OpenAIEmbeddings
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
 from langchain.vectorstores import FAISS
 
-from crea_scraper.data import get_course_documents_for_search, load_course_data, prepare_for_search
+from crea_scraper.compact_vector_db import (
+    COMPACT_VECTOR_DB_FILES,
+    CompactVectorDb,
+    is_compact_vector_db,
+    save_compact_vector_db,
+    vectors_and_documents,
+)
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import CachedEmbeddings, EmbeddingCache
+from crea_scraper.index_handle import FileVersion, IndexHandle, get_index_handle
 
-openai.api_type = os.environ["OPENAI_API_TYPE"]
-openai.api_base = os.environ["OPENAI_API_BASE"]
-openai.api_version = os.environ["OPENAI_API_VERSION"]
-openai.api_key = os.environ["OPENAI_API_KEY"]
+logger = logging.getLogger(__name__)
 
 
-def create_vector_db(data_for_seach: pd.DataFrame, save_path: str, save: bool = True) -> FAISS:
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-ada-002",
-        chunk_size=1,
-    )
+def configure_openai() -> None:
+    # on first use rather than on import, so the offline parts work without credentials
+    import openai
+
+    openai.api_type = os.environ["OPENAI_API_TYPE"]
+    openai.api_base = os.environ["OPENAI_API_BASE"]
+    openai.api_version = os.environ["OPENAI_API_VERSION"]
+    openai.api_key = os.environ["OPENAI_API_KEY"]
+
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+VECTOR_DB_FILES = ["index.faiss", "index.pkl"]
+VECTOR_DB_PATH = "output/vector_db"
+COMPACT_VECTOR_DB_PATH = "output/vector_db_sq8"
+
+
+def create_vector_db(
+    data_for_seach: pd.DataFrame,
+    save_path: str,
+    save: bool = True,
+    embeddings: Optional[Embeddings] = None,
+) -> FAISS:
+    """
+    Builds the vector db, or updates the one at `save_path` when it exists.
+    Only courses that are new or changed since the last build get embedded.
+    """
+    if embeddings is None:
+        embeddings = get_cached_embeddings()
     courses = get_course_documents_for_search(data_for_seach)
-    db = FAISS.from_documents(courses, embeddings)
+    db = None
+    if os.path.exists(os.path.join(save_path, "index.faiss")):
+        db = FAISS.load_local(save_path, embeddings)
+    db = update_vector_db(db, courses, embeddings)
     if save:
-        db.save_local(save_path)
+        save_vector_db(db, save_path)
     return db
 
 
-def load_vector_db(path: str) -> FAISS:
-    embeddings = OpenAIEmbeddings(model="text-embedding-ada-002", chunk_size=1)
-    return FAISS.load_local(path, embeddings)
+def _course_id(course: Document) -> int:
+    # content addressed, so a changed course is removed and added again
+    key = course.page_content + json.dumps(course.metadata, sort_keys=True, default=str)
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "little") >> 1
+
+
+def _seed_embedding_cache(db: FAISS, embeddings: CachedEmbeddings) -> None:
+    # vector dbs built before the cache existed still hold the vectors of all their courses
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    texts = [
+        db.docstore.search(db.index_to_docstore_id[i]).page_content for i in range(len(vectors))
+    ]
+    embeddings.cache.put_many(texts, vectors)
+    embeddings.cache.save()
+
+
+def update_vector_db(db: Optional[FAISS], courses: List[Document], embeddings: Embeddings) -> FAISS:
+    """
+    Updates `db` in place to hold exactly `courses`, by removing and adding vectors by id,
+    and returns it. A new db is created when `db` is None.
+    """
+    if db is not None and not isinstance(db.index, faiss.IndexIDMap2):
+        # built with FAISS.from_documents, which has no ids to update by
+        if isinstance(embeddings, CachedEmbeddings):
+            _seed_embedding_cache(db, embeddings)
+        db = None
+
+    courses_by_id = {_course_id(course): course for course in courses}
+    existing_ids = set(db.index_to_docstore_id) if db is not None else set()
+    removed_ids = [i for i in existing_ids if i not in courses_by_id]
+    added_ids = [i for i in courses_by_id if i not in existing_ids]
+    vectors = np.array(
+        embeddings.embed_documents([courses_by_id[i].page_content for i in added_ids]),
+        dtype="float32",
+    )
+
+    if db is None:
+        if not added_ids:
+            raise ValueError("Cannot create a vector db without courses")
+        index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+        db = FAISS(embeddings.embed_query, index, InMemoryDocstore({}), {})
+    if removed_ids:
+        db.index.remove_ids(np.array(removed_ids, dtype="int64"))
+    if added_ids:
+        db.index.add_with_ids(vectors, np.array(added_ids, dtype="int64"))
+    logger.info(f"Added {len(added_ids)} and removed {len(removed_ids)} courses")
+
+    db.index_to_docstore_id = {i: str(i) for i in courses_by_id}
+    db.docstore = InMemoryDocstore({str(i): course for i, course in courses_by_id.items()})
+    db.embedding_function = embeddings.embed_query
+    return db
+
+
+def save_vector_db(db: FAISS, path: str) -> None:
+    # save next to the old db first, so running searches never read a half written one
+    tmp_path = path.rstrip("/") + ".tmp"
+    db.save_local(tmp_path)
+    os.makedirs(path, exist_ok=True)
+    for file in VECTOR_DB_FILES:
+        os.replace(os.path.join(tmp_path, file), os.path.join(path, file))
+    shutil.rmtree(tmp_path)
+
+
+@lru_cache(maxsize=None)
+def get_cached_embeddings() -> CachedEmbeddings:
+    """
+    Course embeddings through the on-disk embedding cache. The Azure api version
+    (2023-03-15-preview) takes one text per request, so the texts that are not cached
+    are sent one per request, `max_concurrency` requests at a time.
+    """
+    configure_openai()
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model=EMBEDDING_MODEL, chunk_size=1),
+        EmbeddingCache(model=EMBEDDING_MODEL),
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_embeddings() -> OpenAIEmbeddings:
+    configure_openai()
+    return OpenAIEmbeddings(model=EMBEDDING_MODEL, chunk_size=1)
+
+
+def load_vector_db(path: str) -> Union[FAISS, CompactVectorDb]:
+    if is_compact_vector_db(path):
+        return CompactVectorDb(path, _get_embeddings().embed_query)
+    return FAISS.load_local(path, _get_embeddings())
+
+
+def _vector_db_size(db: Union[FAISS, CompactVectorDb]) -> int:
+    if isinstance(db, CompactVectorDb):
+        # the documents are memory mapped, their pages belong to the OS page cache
+        return db.memory_bytes
+    # float32 vectors, without serializing the index
+    return db.index.ntotal * db.index.d * 4
+
+
+def _vector_db_handle(path: str) -> IndexHandle:
+    files = COMPACT_VECTOR_DB_FILES if is_compact_vector_db(path) else VECTOR_DB_FILES
+    return get_index_handle(path, load_vector_db, files, _vector_db_size)
+
+
+def get_vector_db(path: str) -> Union[FAISS, CompactVectorDb]:
+    """
+    Returns the vector db at `path`, loaded once per process and shared by all callers
+    (e.g. all Streamlit sessions). It is reloaded when the files on disk change.
+    """
+    return _vector_db_handle(path).get()
+
+
+def get_vector_db_metrics(path: str) -> Dict[str, float]:
+    """
+    -> load count, last load time, and file and memory size of the loaded vector db
+    """
+    return _vector_db_handle(path).metrics
+
+
+def default_vector_db_path() -> Optional[str]:
+    """
+    -> the vector db built by the pipeline, the compact one if there is one, or None
+    """
+    for path in [COMPACT_VECTOR_DB_PATH, VECTOR_DB_PATH]:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_course_vectors(courses: List[Document], embeddings: Embeddings, path: str) -> np.ndarray:
+    """
+    -> (n_courses, dim) vectors of `courses`, read from the vector db at `path`, which must
+    be built with the model of `embeddings`. Only courses that are not in the db (e.g.
+    when it is older than the course data) are embedded.
+    """
+    if is_compact_vector_db(path):
+        db = CompactVectorDb(path, embeddings.embed_query)
+        vectors = db.index.reconstruct_n(0, len(db))
+        texts = db.docs.column("page_content").to_pylist()
+    else:
+        vectors, documents = vectors_and_documents(FAISS.load_local(path, embeddings))
+        texts = [document.page_content for document in documents]
+    stored = dict(zip(texts, vectors))
+    missing = list(dict.fromkeys(c.page_content for c in courses if c.page_content not in stored))
+    if missing:
+        logger.warning(
+            f"{len(missing)} of {len(courses)} courses are not in the vector db at {path}, "
+            "embedding them. Rebuild it with the pipeline to skip this on start up."
+        )
+        stored.update(zip(missing, np.array(embeddings.embed_documents(missing), "float32")))
+    return np.stack([stored[course.page_content] for course in courses])
+
+
+def get_vector_db_version(path: str) -> Optional[FileVersion]:
+    """
+    -> the version of the vector db files on disk, which changes when they are rewritten
+    """
+    return _vector_db_handle(path).version()
 
 
 if __name__ == "__main__":
     start_time = time.time()
 
-    course_data = load_course_data("output/course_data.csv")
+    course_data = load_course_data("output/course_data.parquet", columns=SEARCH_COLUMNS)
     data_for_search = prepare_for_search(course_data)
-    vector_db = create_vector_db(data_for_search, save_path="output/vector_db")
+    vector_db = create_vector_db(data_for_search, save_path=VECTOR_DB_PATH)
+    save_compact_vector_db(vector_db, COMPACT_VECTOR_DB_PATH, quantization="sq8")
 
     print("--- %s seconds ---" % (time.time() - start_time))
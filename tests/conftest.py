@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the checked in course data, independent of the working directory of the test run
+COURSE_DATA_PATH = os.path.join(ROOT_DIR, "output", "course_data.parquet")
+QUERIES_PATH = os.path.join(ROOT_DIR, "benchmarks", "queries.jsonl")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def course_page_html():
+    return read_fixture("course_1.html")
+
+
+async def _serve(handler, coro_fn):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        return await coro_fn(f"http://127.0.0.1:{runner.addresses[0][1]}")
+    finally:
+        await runner.cleanup()
+
+
+@pytest.fixture
+def serve():
+    """
+    serve(handler, coro_fn) answers every GET with `handler` on a local port, runs
+    `coro_fn(base_url)` against it and returns its result.
+    """
+    return lambda handler, coro_fn: asyncio.run(_serve(handler, coro_fn))
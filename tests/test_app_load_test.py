@@ -0,0 +1,19 @@
+from benchmarks.app_load_test import run_load_test
+
+from tests.conftest import COURSE_DATA_PATH
+
+
+def test_load_test_with_fake_backends(tmp_path):
+    report = run_load_test(
+        ["dansen", "fotografie"],
+        COURSE_DATA_PATH,
+        n_sessions=4,
+        requests_per_session=2,
+        k=3,
+        tfidf_index_path=str(tmp_path / "tfidf_index"),
+    )
+    assert report["requests"] == 8
+    assert set(report["latency_ms"]) == {"lexical", "refined"}
+    assert report["latency_ms"]["lexical"]["p50"] <= report["latency_ms"]["refined"]["p50"]
+    rewriter = report["rewriter"]
+    assert rewriter["misses"] + rewriter["coalesced"] == 8 and rewriter["fallbacks"] == 0
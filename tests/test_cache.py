@@ -0,0 +1,61 @@
+from aiohttp import web
+
+from crea_scraper import scraper
+from crea_scraper.cache import PageCache
+from crea_scraper.fetch import FetchScheduler
+from tests.conftest import read_fixture
+
+
+def test_page_cache_roundtrip(tmp_path):
+    cache = PageCache(str(tmp_path))
+    page = cache.put("https://example.org/a", "<html></html>", etag='"v1"', last_modified="Sat")
+
+    assert cache.get("https://example.org/a").content_hash == page.content_hash
+    assert cache.conditional_headers("https://example.org/a") == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Sat",
+    }
+    assert cache.conditional_headers("https://example.org/b") == {}
+
+
+def test_records_are_invalidated_when_content_changes(tmp_path):
+    cache = PageCache(str(tmp_path))
+    page = cache.put("https://example.org/a", "<html>1</html>")
+    cache.put_records(page, ["record"])
+
+    assert cache.get_records(cache.put("https://example.org/a", "<html>1</html>")) == ["record"]
+    assert cache.get_records(cache.put("https://example.org/a", "<html>2</html>")) is None
+
+
+def test_unchanged_course_page_is_revalidated_and_not_parsed_again(tmp_path, monkeypatch, serve):
+    body = read_fixture("course_1.html")
+    statuses = []
+
+    async def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            statuses.append(304)
+            return web.Response(status=304)
+        statuses.append(200)
+        return web.Response(text=body, content_type="text/html", headers={"ETag": '"v1"'})
+
+    cache = PageCache(str(tmp_path))
+
+    async def fetch_twice(base_url):
+        async with FetchScheduler(cache=cache) as scheduler:
+            first = await scheduler.fetch_many([f"{base_url}/course"])
+            second = await scheduler.fetch_many([f"{base_url}/course"])
+        return first[0], second[0]
+
+    first, second = serve(handler, fetch_twice)
+    assert statuses == [200, 304]
+    assert not first.not_modified and second.not_modified
+
+    info, courses = scraper._get_course_data_from_page(first, cache)
+
+    def fail(body, parser_name):
+        raise AssertionError("unchanged page should not be parsed again")
+
+    monkeypatch.setattr(scraper, "_parse_course_page", fail)
+    cached_info, cached_courses = scraper._get_course_data_from_page(second, cache)
+    assert cached_info == info
+    assert cached_courses == courses
@@ -0,0 +1,61 @@
+import shutil
+
+import pandas as pd
+
+from crea_scraper.changes import (
+    apply_changes,
+    diff_snapshots,
+    read_change_feed,
+    row_keys,
+    snapshot_rows,
+    update_snapshot,
+)
+from crea_scraper.data import load_course_data
+from tests.conftest import COURSE_DATA_PATH
+
+
+def _changed_snapshot(old):
+    new = old.copy()
+    new["status"] = new["status"].astype(str)  # other categories, same values
+    new.loc[6, "status"] = "Schrijf je in voor de wachtlijst"
+    new.loc[5, "prijs"] = "overigen:€250"
+    new = new.drop(index=7)
+    return pd.concat([new, old.iloc[[0]].assign(cursusnummer="999999")], ignore_index=True)
+
+
+def test_diff_has_field_level_deltas():
+    old = load_course_data(COURSE_DATA_PATH)
+    new = _changed_snapshot(old)
+    changes = {change["key"]: change for change in diff_snapshots(old, new)}
+    keys = row_keys(old)
+
+    assert len(changes) == 4
+    assert changes[keys[6]] == {
+        "op": "modified",
+        "key": keys[6],
+        "changes": {"status": ["Schrijf je in", "Schrijf je in voor de wachtlijst"]},
+    }
+    assert changes[keys[5]]["changes"] == {"prijs": [old.loc[5, "prijs"], "overigen:€250"]}
+    assert changes[keys[7]]["op"] == "removed"
+    added = next(change for change in changes.values() if change["op"] == "added")
+    assert added["row"]["cursusnummer"] == "999999"
+    assert added["row"]["startdatum"] == old.loc[0, "startdatum"].date().isoformat()
+
+    assert apply_changes(snapshot_rows(old), changes.values()) == snapshot_rows(new)
+
+
+def test_update_snapshot_writes_change_feed(tmp_path):
+    snapshot_path, new_path = tmp_path / "course_data.parquet", tmp_path / "new.parquet"
+    feed_path = str(tmp_path / "changes.jsonl")
+    shutil.copyfile(COURSE_DATA_PATH, new_path)
+    counts = update_snapshot(str(new_path), str(snapshot_path), feed_path)
+    assert counts["added"] == len(load_course_data(COURSE_DATA_PATH))
+
+    shutil.copyfile(snapshot_path, new_path)
+    assert update_snapshot(str(new_path), str(snapshot_path), feed_path) == {
+        "added": 0,
+        "removed": 0,
+        "modified": 0,
+    }
+    assert read_change_feed(feed_path) == []
+    assert not new_path.exists()
@@ -0,0 +1,85 @@
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain.vectorstores import FAISS
+
+from crea_scraper.compact_vector_db import CompactVectorDb, save_compact_vector_db
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import HashEmbeddings
+from tests.conftest import COURSE_DATA_PATH
+
+
+@pytest.fixture(scope="module")
+def db():
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+    return FAISS.from_documents(courses, HashEmbeddings())
+
+
+@pytest.mark.parametrize("quantization", ["fp16", "sq8", "pq"])
+def test_compact_vector_db_matches_flat_index(db, tmp_path, quantization):
+    save_compact_vector_db(db, str(tmp_path), quantization)
+    compact = CompactVectorDb(str(tmp_path), HashEmbeddings().embed_query)
+    assert len(compact) == db.index.ntotal
+
+    queries = ["jazz muziek instrument", "schilderen tekenen", "dansen", "fotografie"]
+    overlap = []
+    for query in queries:
+        expected = [doc.page_content for doc in db.similarity_search(query, k=5)]
+        found = compact.similarity_search(query, k=5)
+        overlap.append(len(set(expected) & {doc.page_content for doc in found}) / 5)
+        assert found[0].metadata.keys() == {"naam", "beschrijving", "url", "categorie"}
+    assert np.mean(overlap) >= (0.6 if quantization == "pq" else 0.9)
+
+
+def test_compact_vector_db_filter_and_size(db, tmp_path):
+    save_compact_vector_db(db, str(tmp_path), "sq8")
+    compact = CompactVectorDb(str(tmp_path), HashEmbeddings().embed_query)
+    url = compact.docs.column("url")[3].as_py()
+    found = compact.similarity_search("jazz", k=3, filter={"url": [url]}, fetch_k=len(compact))
+    assert [doc.metadata["url"] for doc in found] == [url]
+
+    flat_bytes = db.index.ntotal * db.index.d * 4
+    assert os.path.getsize(tmp_path / "codes.npy") < flat_bytes / 3
+    assert compact.memory_bytes < flat_bytes / 3
+
+
+def test_compact_vector_db_codes_are_memory_mapped(db, tmp_path):
+    save_compact_vector_db(db, str(tmp_path), "sq8")
+    compact = CompactVectorDb(str(tmp_path), HashEmbeddings().embed_query)
+    with open("/proc/self/maps") as f:
+        mapped = f.read()
+    assert str(tmp_path / "codes.npy") in mapped
+    assert str(tmp_path / "docs.arrow") in mapped
+    assert len(compact.similarity_search("dansen", k=3)) == 3
+
+
+@pytest.mark.parametrize("quantization", ["sq8", "pq"])
+def test_compact_vector_db_searches_without_decoding(db, tmp_path, monkeypatch, quantization):
+    save_compact_vector_db(db, str(tmp_path), quantization)
+    compact = CompactVectorDb(str(tmp_path), HashEmbeddings().embed_query)
+    decoded = []
+
+    def spy(index_type):
+        sa_decode = index_type.sa_decode
+
+        def counting_sa_decode(self, codes):
+            decoded.append(len(codes))
+            return sa_decode(self, codes)
+
+        return counting_sa_decode
+
+    for index_type in [faiss.IndexScalarQuantizer, faiss.IndexPQ]:
+        monkeypatch.setattr(index_type, "sa_decode", spy(index_type))
+
+    # the codes are scored in code space, by the quantized index
+    for query in ["dansen", "fotografie", "schilderen"]:
+        assert len(compact.similarity_search(query, k=3)) == 3
+    assert decoded == []
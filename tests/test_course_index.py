@@ -0,0 +1,55 @@
+import datetime
+
+from crea_scraper.course import Weekday, parse_duration_weeks, parse_price, parse_time
+from crea_scraper.course_index import CourseIndex, CourseQuery
+from crea_scraper.data import load_course_data
+from tests.conftest import COURSE_DATA_PATH
+
+
+def test_parse_typed_fields():
+    assert parse_price("student:€115jong-alumnus UvA/HvA:€173overigen:€230") == {
+        "student": 115.0,
+        "jong-alumnus UvA/HvA": 173.0,
+        "overigen": 230.0,
+    }
+    assert parse_price("€100") == {"overigen": 100.0}
+    assert parse_time("19:45 - 21:45") == (19 * 60 + 45, 21 * 60 + 45)
+    assert parse_duration_weeks("9 weken") == 9.0
+    assert parse_duration_weeks("1 dag") == round(1 / 7, 2)
+
+
+def test_course_index_matches_full_scan():
+    course_data = load_course_data(COURSE_DATA_PATH)
+    index = CourseIndex(course_data)
+    query = CourseQuery(
+        weekdays=[Weekday.DI, Weekday.MA],
+        starts_after=17 * 60,
+        max_price=150,
+        price_tier="student",
+        starts_from=datetime.date(2025, 3, 1),
+        languages=["English"],
+    )
+
+    expected = []
+    for row, course in course_data.iterrows():
+        start = parse_time(course["tijd"])[0]
+        prices = parse_price(course["prijs"])
+        if (
+            course["dag"] in ["di", "ma"]
+            and start is not None
+            and start >= 17 * 60
+            and prices.get("student", prices.get("overigen", 1e9)) <= 150
+            and course["startdatum"] >= datetime.datetime(2025, 3, 1)
+            and "English" in course["taal"]
+        ):
+            expected.append(row)
+    assert expected
+    assert list(index.query(query)) == expected
+
+
+def test_course_index_empty_query_matches_all():
+    course_data = load_course_data(COURSE_DATA_PATH)
+    index = CourseIndex(course_data)
+    assert len(index.query(CourseQuery())) == len(course_data)
+    assert index.query_urls(CourseQuery(categories=["nonexistent"])) == set()
+    assert "theater" in index.values("categorie")
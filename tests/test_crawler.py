@@ -0,0 +1,58 @@
+import json
+import urllib.request
+from urllib.parse import urlsplit
+
+import pytest
+from benchmarks.crea_server import Faults, serve_in_background, synthesize_snapshot
+
+from crea_scraper.crawler import crawl
+from crea_scraper.scraper import ScrapeStats, run
+from crea_scraper.sites import CreaSite, SiteAdapter
+
+
+def test_crawl_sites_with_worker_processes(tmp_path):
+    synthesize_snapshot(str(tmp_path / "a"), n_courses=20, courses_per_subpage=8)
+    synthesize_snapshot(str(tmp_path / "b"), n_courses=6, courses_per_subpage=4)
+    (tmp_path / "b" / "00000.html").write_text("<html></html>")  # cannot be parsed
+    faults = Faults(latency=0.001, rate_429=0.05)
+
+    with (
+        serve_in_background(str(tmp_path / "a"), faults) as a_url,
+        serve_in_background(str(tmp_path / "b"), faults) as b_url,
+    ):
+        stats = ScrapeStats()
+        sites = [CreaSite(a_url, name="a"), CreaSite(b_url, name="b")]
+        frontier_path = str(tmp_path / "frontier.sqlite")
+        options = dict(frontier_path=frontier_path, requests_per_second=1000, n_workers=3)
+        course_data = crawl(sites, stats=stats, **options)
+        scraped = run(n_parse_workers=0, requests_per_second=1000, base_url=a_url)
+
+    assert course_data["url"].nunique() == 20 + 5
+    assert set(scraped["url"]) <= set(course_data["url"])
+    assert [error.split(":")[0] for error in stats.failures.values()] == ["parse"]
+    assert stats.fetch["pages"] == 3 + 20 + 2 + 6
+
+
+def test_workers_share_the_request_rate_of_a_host(tmp_path):
+    synthesize_snapshot(str(tmp_path / "a"), n_courses=24, courses_per_subpage=8)
+    with serve_in_background(str(tmp_path / "a")) as url:
+        frontier_path = str(tmp_path / "frontier.sqlite")
+        crawl([CreaSite(url)], frontier_path, requests_per_second=20, n_workers=3)
+        arrivals_url = url.replace(urlsplit(url).path, "/_arrivals")
+        with urllib.request.urlopen(arrivals_url) as resp:
+            arrivals = sorted(json.load(resp))
+
+    # one request per 0.05s in total, give or take the jitter of the local requests
+    assert len(arrivals) == 3 + 24  # overview pages and course pages
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    assert min(gaps) > 0.025
+    assert arrivals[-1] - arrivals[0] > 0.9 * 0.05 * len(gaps)
+
+
+def test_incomplete_site_cannot_be_instantiated():
+    class IncompleteSite(SiteAdapter):
+        def seed_urls(self):
+            return []
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteSite()
@@ -0,0 +1,122 @@
+import json
+import urllib.request
+from urllib.parse import urlsplit
+
+import pytest
+from benchmarks.crea_server import Faults, serve_in_background, synthesize_snapshot
+
+from crea_scraper import scraper
+from crea_scraper.cache import PageCache
+from crea_scraper.fetch import FetchError, FetchScheduler
+from crea_scraper.journal import ScrapeJournal
+from crea_scraper.scraper import ScrapeStats, run
+
+
+def test_scrape_stand_in_server_with_faults(tmp_path):
+    synthesize_snapshot(str(tmp_path / "snapshot"), n_courses=30, courses_per_subpage=8)
+    faults = Faults(latency=0.001, jitter=0.002, rate_429=0.05, rate_5xx=0.05)
+    cache = PageCache(str(tmp_path / "cache"))
+
+    with serve_in_background(str(tmp_path / "snapshot"), faults) as overview_url:
+        first_stats, second_stats = ScrapeStats(), ScrapeStats()
+        options = dict(cache=cache, requests_per_second=1000, base_url=overview_url)
+        first = run(n_parse_workers=2, stats=first_stats, **options)
+        second = run(n_parse_workers=0, stats=second_stats, **options)
+
+    assert first["url"].nunique() == 30
+    assert not first_stats.failures
+    assert len(first_stats.parse_seconds) == 30
+
+    # nothing changed, so every page is revalidated and nothing is parsed again
+    assert second.equals(first)
+    assert second_stats.fetch["not_modified"] == second_stats.fetch["pages"] == 4 + 30
+    assert second_stats.parse_seconds == []
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def _n_requests(overview_url):
+    stats_url = overview_url.replace(urlsplit(overview_url).path, "/_stats")
+    with urllib.request.urlopen(stats_url) as resp:
+        return json.load(resp)["requests"]
+
+
+def test_interrupted_scrape_resumes_from_journal(tmp_path, monkeypatch):
+    snapshot = tmp_path / "snapshot"
+    synthesize_snapshot(str(snapshot), n_courses=12, courses_per_subpage=8)
+    manifest = json.loads((snapshot / "manifest.json").read_text())
+    broken_path = next(path for path in manifest["pages"] if path.endswith("-3"))
+    broken_file = snapshot / manifest["pages"][broken_path]
+    broken_file.write_text(broken_file.read_text().replace("product_main_data", "x"))
+
+    parse, n_parsed = scraper._parse_course_page, []
+
+    def interrupted_parse(body, parser_name):
+        if len(n_parsed) == 6:
+            raise Interrupted()
+        course_data = parse(body, parser_name)
+        n_parsed.append(course_data)
+        return course_data
+
+    journal_path = str(tmp_path / "journal")
+    with serve_in_background(str(snapshot)) as overview_url:
+        options = dict(n_parse_workers=0, requests_per_second=1000, base_url=overview_url)
+        monkeypatch.setattr(scraper, "_parse_course_page", interrupted_parse)
+        journal = ScrapeJournal(journal_path)
+        with pytest.raises(Interrupted):
+            run(journal=journal, **options)
+        journal.close()
+        monkeypatch.undo()
+
+        n_requests, stats = _n_requests(overview_url), ScrapeStats()
+        journal = ScrapeJournal(journal_path)
+        course_data = run(journal=journal, stats=stats, **options)
+        n_resumed_requests = _n_requests(overview_url) - n_requests
+
+    # the overview and the parsed pages come from the journal, the rest is fetched
+    assert journal.resumed
+    assert n_resumed_requests == 12 - len(n_parsed)
+    assert course_data["url"].nunique() == 11
+    broken_url = next(url for url in stats.failures if url.rstrip("/").endswith("-3"))
+    assert stats.failures[broken_url].startswith("parse: ")
+    with open(journal.quarantine_file) as f:
+        assert json.load(f)[broken_url]["stage"] == "parse"
+    assert not ScrapeJournal(journal_path).resumed
+
+
+def test_failed_overview_subpage_is_quarantined_and_fetched_on_resume(tmp_path, monkeypatch):
+    synthesize_snapshot(str(tmp_path / "snapshot"), n_courses=20, courses_per_subpage=8)
+    fetch = FetchScheduler.fetch
+
+    async def failing_fetch(self, url):
+        if url.endswith("/page/2"):
+            raise FetchError(f"Giving up on {url}")
+        return await fetch(self, url)
+
+    def interrupted_parse(body, parser_name):
+        raise Interrupted()
+
+    journal_path = str(tmp_path / "journal")
+    with serve_in_background(str(tmp_path / "snapshot")) as overview_url:
+        options = dict(n_parse_workers=0, requests_per_second=1000, base_url=overview_url)
+        subpage_url = overview_url.rstrip("/") + "/page/2"
+        monkeypatch.setattr(FetchScheduler, "fetch", failing_fetch)
+        stats, journal = ScrapeStats(), ScrapeJournal(journal_path)
+        assert run(journal=journal, stats=stats, **options)["url"].nunique() == 12
+        assert stats.failures[subpage_url].startswith("overview: ")
+        with open(journal.quarantine_file) as f:
+            assert json.load(f)[subpage_url]["stage"] == "overview"
+
+        # interrupted after the overview, which missed the courses of subpage 2
+        monkeypatch.setattr(scraper, "_parse_course_page", interrupted_parse)
+        journal = ScrapeJournal(journal_path)
+        with pytest.raises(Interrupted):
+            run(journal=journal, **options)
+        journal.close()
+        monkeypatch.undo()
+
+        journal = ScrapeJournal(journal_path)
+        assert journal.resumed and journal.course_urls is None
+        assert run(journal=journal, **options)["url"].nunique() == 20
@@ -0,0 +1,77 @@
+import pandas as pd
+
+from crea_scraper.course import Course, CourseGeneralInfo
+from crea_scraper.data import (
+    COURSE_DATA_COLUMNS,
+    SEARCH_COLUMNS,
+    CourseDataBuilder,
+    CourseDataWriter,
+    export_course_data_csv,
+    load_course_data,
+)
+
+
+def _course(naam: str, cursusnummer: str, status: str = "open") -> Course:
+    return Course(
+        naam=naam,
+        dag="ma",
+        tijd="20:00 - 22:00",
+        dag_tijd="ma 20:00 - 22:00",
+        startdatum="15-04-2025",
+        duur="9 weken",
+        periode="block 3 - spring",
+        prijs="student:€115",
+        cursusnummer=cursusnummer,
+        docent="Yke Rusticus",
+        taal="Nederlands",
+        status=status,
+    )
+
+
+def test_records_are_compact():
+    info = CourseGeneralInfo(url="u", naam="Jazz, blues", categorie="muziek", beschrijving="")
+    assert not hasattr(info, "__dict__")
+    assert info.naam == "Jazz, blues"
+
+
+def test_typed_course_data_roundtrip(tmp_path):
+    info = CourseGeneralInfo(url="u", naam="Jazz, blues", categorie="muziek", beschrijving="")
+    with CourseDataWriter(str(tmp_path / "course_data.parquet")) as writer:
+        writer.add(info, [_course("Jazz, blues", "1"), _course("Jazz, blues", "1")])
+
+    df = load_course_data(str(tmp_path / "course_data.parquet"))
+    assert len(df) == 1
+    assert df["status"].dtype == "category"
+    assert df["startdatum"].iloc[0] == pd.Timestamp("2025-04-15")
+
+    projected = load_course_data(str(tmp_path / "course_data.parquet"), columns=SEARCH_COLUMNS)
+    assert list(projected.columns) == SEARCH_COLUMNS
+
+    export_course_data_csv(str(tmp_path / "course_data.parquet"), str(tmp_path / "export.csv"))
+    exported = pd.read_csv(tmp_path / "export.csv", dtype=str)
+    assert exported["naam"].iloc[0] == "Jazz; blues"
+    assert exported["startdatum"].iloc[0] == "15-04-2025"
+
+
+def test_courses_sharing_a_name_are_joined_by_url():
+    builder = CourseDataBuilder()
+    for i in range(3):
+        info = CourseGeneralInfo(url=f"u{i}", naam="Schilderen", categorie=f"c{i}", beschrijving="")
+        builder.add(info, [_course("Schilderen", f"{i}1"), _course("Schilderen", f"{i}2")])
+
+    df = builder.to_dataframe()
+    assert list(df.columns) == COURSE_DATA_COLUMNS
+    assert len(df) == len(builder) == 6
+    assert df["url"].tolist() == ["u0", "u0", "u1", "u1", "u2", "u2"]
+    assert (df["categorie"].astype(str).str[1] == df["cursusnummer"].str[0]).all()
+
+
+def test_general_info_is_stored_once_per_url():
+    builder = CourseDataBuilder()
+    info = CourseGeneralInfo(url="u", naam="Tekenen", categorie="beeldend", beschrijving="")
+    builder.add(info, [_course("Tekenen", "1")])
+    builder.add(info, [_course("Tekenen", "1", status="vol")])
+
+    df = builder.to_dataframe()
+    assert df["status"].tolist() == ["open", "vol"]
+    assert len(builder._info_index) == 1
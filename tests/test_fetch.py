@@ -0,0 +1,73 @@
+import asyncio
+
+from aiohttp import web
+
+from crea_scraper import scraper
+from crea_scraper.fetch import FetchScheduler
+from tests.conftest import read_fixture
+
+
+def test_retries_throttled_and_failing_requests(serve):
+    attempts = {"/flaky": 0, "/down": 0}
+
+    async def handler(request):
+        attempts[request.path] += 1
+        if request.path == "/flaky" and attempts["/flaky"] < 3:
+            status = 429 if attempts["/flaky"] == 1 else 503
+            return web.Response(status=status)
+        if request.path == "/down":
+            return web.Response(status=500)
+        return web.Response(text="ok")
+
+    async def fetch(base_url):
+        async with FetchScheduler(max_retries=2, backoff_base=0.01) as scheduler:
+            pages = await scheduler.fetch_many([f"{base_url}/flaky", f"{base_url}/down"])
+        return pages, scheduler
+
+    (flaky, down), scheduler = serve(handler, fetch)
+    assert flaky.body == "ok"
+    assert down is None
+    assert attempts == {"/flaky": 3, "/down": 3}
+    assert list(scheduler.failures) == [f"{flaky.url.rsplit('/', 1)[0]}/down"]
+    assert scheduler.stats["retries"] == 4
+
+
+def test_concurrency_per_host_is_capped(serve):
+    in_flight, max_in_flight = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return web.Response(text="ok")
+
+    async def fetch(base_url):
+        async with FetchScheduler(max_requests_per_host=3, requests_per_second=1000) as scheduler:
+            return await scheduler.fetch_many([f"{base_url}/{i}" for i in range(20)])
+
+    pages = serve(handler, fetch)
+    assert all(page is not None for page in pages)
+    assert max_in_flight <= 3
+
+
+def test_last_overview_page_is_read_from_pagination(serve):
+    requested = []
+
+    async def handler(request):
+        requested.append(request.path)
+        if request.path.startswith("/overview/page/"):
+            return web.Response(text=read_fixture("overview_1.html"), content_type="text/html")
+        return web.Response(text=read_fixture("course_1.html"), content_type="text/html")
+
+    async def scrape(base_url):
+        async with FetchScheduler() as scheduler:
+            subpages = await scraper.get_course_overview_subpages(
+                scheduler, base_url=f"{base_url}/overview"
+            )
+        return subpages
+
+    subpages = serve(handler, scrape)
+    assert len(subpages) == 3
+    assert sorted(requested) == [f"/overview/page/{i}" for i in (1, 2, 3)]
@@ -0,0 +1,54 @@
+import time
+
+from crea_scraper.frontier import Frontier
+
+
+def test_urls_are_added_once(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"))
+    assert frontier.add(["http://a/1", "http://a/2", "http://a/1#top"], "a", "course") == 2
+    assert frontier.add(["http://a/2", "http://a/3"], "a", "course") == 1
+    assert frontier.counts()["pending"] == 3
+
+
+def test_leases_respect_the_rate_of_every_host(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), requests_per_second=10, max_wait=0.25)
+    frontier.add([f"http://a/{i}" for i in range(5)], "a", "course")
+    frontier.add(["http://b/1"], "b", "course")
+
+    leases = frontier.lease("worker-0", 10)
+    # a slot every 0.1s per host, up to 0.25s ahead
+    assert [lease.url for lease in leases] == [
+        "http://a/0",
+        "http://b/1",
+        "http://a/1",
+        "http://a/2",
+    ]
+    a_slots = [lease.not_before for lease in leases if lease.url.startswith("http://a")]
+    assert all(0.0999 < b - a < 0.1001 for a, b in zip(a_slots, a_slots[1:]))
+
+    # another worker, with its own connection, gets the next slots of the same host
+    other = Frontier(str(tmp_path / "frontier.sqlite"), requests_per_second=10, max_wait=0.25)
+    assert other.lease("worker-1", 10) == []
+    time.sleep(0.2)
+    assert [lease.url for lease in other.lease("worker-1", 10)] == ["http://a/3", "http://a/4"]
+
+
+def test_expired_leases_are_handed_out_again(tmp_path):
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"), lease_seconds=0, max_attempts=2)
+    frontier.add(["http://a/1", "http://b/1", "http://c/1"], "a", "course")
+    leased = [lease.url for lease in frontier.lease("worker-0", 3)]
+    frontier.complete("http://a/1", {"courses": []})
+    frontier.fail("http://b/1", "fetch: HTTP 500")
+    time.sleep(0.01)
+
+    # the worker of http://c/1 died
+    assert [lease.url for lease in frontier.lease("worker-1", 3)] == ["http://c/1"]
+    time.sleep(0.01)
+    assert frontier.lease("worker-1", 3) == []
+    assert not frontier.has_work()
+    assert leased == ["http://a/1", "http://b/1", "http://c/1"]
+    assert frontier.records("course") == [("http://a/1", {"courses": []})]
+    assert frontier.failures() == {
+        "http://b/1": "fetch: HTTP 500",
+        "http://c/1": "lease expired 2 times",
+    }
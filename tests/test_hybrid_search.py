@@ -0,0 +1,119 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.hybrid_search import get_hybrid_index, hybrid_search, split_negated_keywords
+from crea_scraper.tfidf_index import TfidfIndex
+from tests.conftest import COURSE_DATA_PATH
+
+
+@pytest.fixture(scope="module")
+def courses():
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    return get_course_documents_for_search(prepare_for_search(course_data))
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture(scope="module")
+def index_path(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("tfidf_index"))
+
+
+def test_split_negated_keywords():
+    assert split_negated_keywords("dansen, not ballet, hip hop, geen klassiek ballet") == (
+        "dansen, hip hop",
+        ["ballet", "klassiek ballet"],
+    )
+
+
+def test_negated_keywords_exclude_courses(courses, embeddings, index_path):
+    found = hybrid_search(
+        "dansen, dance, tango", courses, 10, embeddings, tfidf_index_path=index_path
+    )
+    assert any("tango" in course.page_content.lower() for course in found)
+
+    found = hybrid_search(
+        "dansen, dance, not tango", courses, 10, embeddings, tfidf_index_path=index_path
+    )
+    assert found
+    assert not any("tango" in course.page_content.lower() for course in found)
+
+    penalized = hybrid_search(
+        "dansen, dance, not tango",
+        courses,
+        len(courses),
+        embeddings,
+        tfidf_index_path=index_path,
+        negation_penalty=10,
+    )
+    assert len(penalized) == len(courses)
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self, size: int):
+        super().__init__(size)
+        self.batches: List[List[str]] = []
+
+    def embed_documents(self, texts):
+        self.batches.append(texts)
+        return super().embed_documents(texts)
+
+
+def _refit(*args):
+    raise AssertionError("The TF-IDF index was fitted again")
+
+
+@pytest.mark.parametrize("fusion", ["weighted", "rrf"])
+def test_hybrid_search_reuses_the_index_and_respects_the_url_mask(
+    courses, fusion, index_path, monkeypatch
+):
+    monkeypatch.setattr("crea_scraper.hybrid_search._hybrid_index", None)
+    embeddings = CountingEmbeddings(128)
+    index = get_hybrid_index(courses, embeddings, index_path)
+    assert [len(batch) for batch in embeddings.batches] == [len(courses)]
+
+    # the course vectors and the TF-IDF matrix are precomputed, only the query is embedded
+    monkeypatch.setattr(TfidfIndex, "build", _refit)
+    embeddings.batches.clear()
+    query = "schilderen, painting, tekenen, not fotografie"
+    for _ in range(20):
+        top_k = index.search([query], 5, fusion=fusion)[0]
+    assert len(top_k) == 5
+    assert embeddings.batches == [["schilderen, painting, tekenen"]] * 20
+
+    urls = {courses[2].metadata["url"], courses[7].metadata["url"]}
+    found = hybrid_search(
+        query, courses, 5, embeddings, urls, tfidf_index_path=index_path, fusion=fusion
+    )
+    assert {course.metadata["url"] for course in found} <= urls
+    assert len(embeddings.batches) == 21
+
+
+def test_fused_scores_prefer_courses_matching_both(courses, embeddings, index_path):
+    index = get_hybrid_index(courses, embeddings, index_path)
+    scores = index.scores(["fotografie, photography"])[0]
+    assert np.isfinite(scores).all()
+    best = courses[int(np.argmax(scores))].page_content.lower()
+    assert "foto" in best or "photo" in best
+
+
+def test_hybrid_index_is_kept_per_embeddings_model(courses, embeddings, index_path):
+    index = get_hybrid_index(courses, embeddings, index_path)
+    # another instance, same model
+    assert get_hybrid_index(courses, HashEmbeddings(), index_path) is index
+
+    other = get_hybrid_index(courses, HashEmbeddings(size=64), index_path)
+    assert other is not index and other.vectors.shape[1] == 64
+    assert get_hybrid_index(courses, embeddings, index_path) is not other
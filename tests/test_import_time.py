@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import _parse_importtime, measure_import
+
+
+def test_scraper_and_search_import_no_search_backends():
+    for module in ["crea_scraper.scraper", "crea_scraper.search"]:
+        result = measure_import(module, repeat=1)
+        assert result["heavy_modules"] == [], module
+        assert result["import_ms"] > 0
+
+
+def test_modules_import_without_configuration():
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith("OPENAI_") and key != "CREA_DEMO_PASSWORD"
+    }
+    code = "import crea_scraper.search, crea_scraper.vector_db, crea_scraper.query_rewrite"
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+def test_parse_importtime():
+    stderr = "\n".join(
+        [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 | site",
+            "import time:       300 |        300 |     numpy.core",
+            "import time:       200 |        500 |   numpy",
+            "import time:        50 |         50 |   json",
+            "import time:       400 |        950 | crea_scraper.search",
+        ]
+    )
+    import_ms, slowest = _parse_importtime(stderr, "crea_scraper.search")
+    assert import_ms == 0.95
+    assert slowest == [("numpy", 0.5), ("json", 0.05)]
@@ -0,0 +1,57 @@
+import threading
+
+from langchain.embeddings import FakeEmbeddings
+from langchain.vectorstores import FAISS
+
+from crea_scraper.index_handle import IndexHandle
+
+FILES = ["index.faiss", "index.pkl"]
+
+
+def _save_db(path, texts):
+    FAISS.from_texts(texts, FakeEmbeddings(size=8)).save_local(str(path))
+
+
+def _load_db(path):
+    return FAISS.load_local(path, FakeEmbeddings(size=8))
+
+
+def test_index_is_loaded_once_and_reloaded_on_change(tmp_path):
+    _save_db(tmp_path, ["jazz", "ballet"])
+    handle = IndexHandle(str(tmp_path), _load_db, FILES, size=lambda db: db.index.ntotal)
+
+    db = handle.get()
+    assert handle.get() is db
+    assert handle.metrics["loads"] == 1 and handle.metrics["memory_bytes"] == 2
+    assert handle.metrics["load_seconds"] > 0
+
+    _save_db(tmp_path, ["jazz", "ballet", "pottery"])
+    reloaded = handle.get()
+    assert reloaded is not db and reloaded.index.ntotal == 3
+    assert handle.metrics["loads"] == 2
+
+
+def test_readers_are_not_blocked_by_a_reload(tmp_path):
+    (tmp_path / "index").write_text("1")
+    loading, loaded = threading.Event(), threading.Event()
+
+    def slow_load(path):
+        with open(f"{path}/index") as f:
+            version = f.read()
+        if version == "22":
+            loading.set()
+            loaded.wait(timeout=10)  # the timeout only ends a blocked test
+        return version
+
+    handle = IndexHandle(str(tmp_path), slow_load, ["index"])
+    assert handle.get() == "1"
+
+    (tmp_path / "index").write_text("22")
+    reloader = threading.Thread(target=handle.get)
+    reloader.start()
+    loading.wait()
+    assert handle.get() == "1"  # the old index, while the new one loads
+    assert reloader.is_alive()  # the new index is not swapped in yet
+    loaded.set()
+    reloader.join()
+    assert handle.get() == "22"
@@ -0,0 +1,79 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from crea_scraper import metrics as metrics_module
+from crea_scraper import scraper
+from crea_scraper.metrics import Metrics, metrics
+from tests.conftest import read_fixture
+
+
+@pytest.fixture
+def recording():
+    metrics_module.enable()
+    yield metrics
+    metrics_module.disable()
+    metrics.reset()
+
+
+def test_nothing_is_recorded_when_disabled():
+    m = Metrics()
+    with m.span("parse", url="x"):
+        pass
+    m.count("fetch.requests")
+    m.observe("parse", 0.1)
+    assert m.span("a") is m.span("b")  # one shared no-op context
+    assert m.to_json()["counters"] == {} and m.to_json()["spans"] == {}
+
+
+def test_spans_and_counters():
+    m = Metrics()
+    m.enabled = True
+    for seconds in (0.0001, 0.002, 0.002, 100):
+        m.observe("parse.page", seconds)
+    with m.span("fetch"):
+        pass
+    m.count("fetch.requests", 3)
+    m.count("fetch.requests")
+
+    snapshot = m.to_json()
+    assert snapshot["counters"] == {"fetch.requests": 4}
+    assert snapshot["spans"]["parse.page"]["count"] == 4
+    assert snapshot["spans"]["fetch"]["count"] == 1
+
+    text = m.to_prometheus()
+    assert "crea_fetch_requests_total 4" in text
+    assert 'crea_parse_page_seconds_bucket{le="0.0005"} 1' in text
+    assert 'crea_parse_page_seconds_bucket{le="0.005"} 3' in text
+    assert 'crea_parse_page_seconds_bucket{le="+Inf"} 4' in text
+    assert "crea_parse_page_seconds_count 4" in text
+
+    other = Metrics()
+    other.enabled = True
+    other.merge(snapshot)
+    other.merge(snapshot)
+    assert other.to_json()["counters"] == {"fetch.requests": 8}
+    assert other.to_json()["spans"]["parse.page"]["counts"][0] == 2
+
+
+def test_parse_metrics_are_collected_from_workers(recording):
+    body = read_fixture("course_1.html")
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        _, (general_info, _), snapshot = executor.submit(
+            scraper._timed_parse_course_page, body, "lxml", True
+        ).result()
+    assert general_info.naam == "Acteren en Theatermaken"
+    for step in ["page", "url", "name", "category", "description", "tables"]:
+        assert snapshot["spans"][f"parse.{step}"]["count"] == 1
+
+    recording.merge(snapshot)
+    scraper._parse_course_page(body, "lxml")
+    assert recording.to_json()["spans"]["parse.page"]["count"] == 2
+
+
+def test_dump(tmp_path, recording):
+    recording.count("parse.cache_hits")
+    metrics_module.dump(str(tmp_path / "metrics.prom"))
+    metrics_module.dump(str(tmp_path / "metrics.json"))
+    assert "crea_parse_cache_hits_total 1" in (tmp_path / "metrics.prom").read_text()
+    assert '"parse.cache_hits": 1' in (tmp_path / "metrics.json").read_text()
@@ -0,0 +1,58 @@
+import pytest
+
+from crea_scraper.parsers import PARSERS, HtmlParser, ParseError, get_parser
+from tests.conftest import read_fixture
+
+
+@pytest.mark.parametrize("fixture", ["course_1.html", "course_2.html", "course_3.html"])
+def test_backends_give_identical_course_records(fixture):
+    body = read_fixture(fixture)
+    reference = get_parser("bs4").get_course_data(body)
+    for name in PARSERS:
+        assert get_parser(name).get_course_data(body) == reference, name
+
+
+def test_backends_give_identical_overview_records():
+    body = read_fixture("overview_1.html")
+    reference = get_parser("bs4").get_overview_records(body)
+    assert reference["last_page_nr"] == 3
+    assert len(reference["course_urls"]) == 3
+    for name in PARSERS:
+        assert get_parser(name).get_overview_records(body) == reference, name
+
+
+def test_regions_mentioned_in_head_do_not_change_records():
+    body = read_fixture("course_1.html").replace(
+        "</head>",
+        "<style>.wpb_wrapper p { margin: 0 }</style>"
+        "<script>var tpl = '<div class=\"meta_values\">Categorie <a>x,</a></div>';</script></head>",
+    )
+    assert get_parser("lxml").get_course_data(body) == get_parser("bs4").get_course_data(body)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_parser("regex")
+
+
+def test_course_without_category():
+    body = read_fixture("course_1.html").replace(">Categorie<", ">Locatie<")
+    for name in PARSERS:
+        general_info, _ = get_parser(name).get_course_data(body)
+        assert general_info.categorie == "", name
+
+
+def test_malformed_time_raises_parse_error():
+    body = read_fixture("course_1.html").replace(" di 19:45 - 21:45 ", "di 19:45 - 21:45 uur")
+    for name in PARSERS:
+        with pytest.raises(ParseError):
+            get_parser(name).get_course_data(body)
+
+
+def test_incomplete_backend_cannot_be_instantiated():
+    class IncompleteParser(HtmlParser):
+        def parse_course_page(self, body: str):
+            return body
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteParser()
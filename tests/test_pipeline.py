@@ -0,0 +1,85 @@
+import shutil
+import threading
+
+import pytest
+
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.pipeline import Pipeline, Stage, artifact_fingerprint, crea_pipeline
+from tests.conftest import COURSE_DATA_PATH
+
+
+def _copy_stage(name, source, target, runs):
+    def run():
+        runs.append(name)
+        shutil.copyfile(source, target)
+
+    return Stage(name, run, inputs=[str(source)], outputs=[str(target)])
+
+
+def test_unchanged_stages_are_skipped(tmp_path):
+    source, middle, target = tmp_path / "a.txt", tmp_path / "b.txt", tmp_path / "c.txt"
+    source.write_text("a")
+    runs = []
+    stages = [_copy_stage("b", source, middle, runs), _copy_stage("c", middle, target, runs)]
+    pipeline = Pipeline(stages, str(tmp_path / "manifests"))
+
+    assert {r.status for r in pipeline.run().values()} == {"ran"}
+    assert {r.status for r in pipeline.run().values()} == {"skipped"}
+    assert runs == ["b", "c"]
+
+    source.write_text("changed")
+    results = pipeline.run()
+    assert [results["b"].status, results["c"].status] == ["ran", "ran"]
+
+    # a changed output is rebuilt, a forced run runs everything
+    target.write_text("edited")
+    assert pipeline.run()["c"].status == "ran"
+    assert {r.status for r in pipeline.run(force=True).values()} == {"ran"}
+
+
+def test_independent_stages_run_in_parallel_and_failures_stop_downstream(tmp_path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    stages = [
+        Stage("left", barrier.wait, outputs=[str(tmp_path / "left")]),
+        Stage("right", barrier.wait),
+        Stage("broken", fail, inputs=[str(tmp_path / "left")], outputs=[str(tmp_path / "x")]),
+        Stage("after", lambda: None, inputs=[str(tmp_path / "x")]),
+    ]
+    results = Pipeline(stages, str(tmp_path / "manifests"), max_workers=2).run()
+    assert results["left"].status == results["right"].status == "ran"
+    assert results["broken"].status == "failed"
+    assert results["after"].status == "upstream_failed"
+
+    with pytest.raises(ValueError):
+        Pipeline(stages[::-1], str(tmp_path / "manifests"))
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.n_embedded = 0
+
+    def embed_documents(self, texts):
+        self.n_embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_crea_pipeline_skips_everything_when_nothing_changed(tmp_path):
+    shutil.copyfile(COURSE_DATA_PATH, tmp_path / "course_data.parquet")
+    embeddings = CountingEmbeddings()
+    pipeline = crea_pipeline(str(tmp_path), scrape=False, embeddings=embeddings)
+
+    results = pipeline.run()
+    assert {r.status for r in results.values()} == {"ran"}
+    assert embeddings.n_embedded > 0
+    tfidf_fingerprint = artifact_fingerprint(str(tmp_path / "tfidf_index"))
+
+    embeddings.n_embedded = 0
+    results = pipeline.run()
+    assert {r.status for r in results.values()} == {"skipped"}
+    assert embeddings.n_embedded == 0
+    assert artifact_fingerprint(str(tmp_path / "tfidf_index")) == tfidf_fingerprint
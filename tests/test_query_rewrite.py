@@ -0,0 +1,49 @@
+import threading
+
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter, RewriteCache, rewrite_key
+
+
+def test_rewrites_are_cached_by_normalized_query(tmp_path):
+    llm = FakeLLM()
+    rewriter = QueryRewriter(llm, RewriteCache(str(tmp_path / "rewrites.sqlite")))
+    assert rewriter.rewrite("I like to draw and paint") == "i, like, to, draw, and, paint"
+    assert rewriter.rewrite("  i like to DRAW and paint ") == "i, like, to, draw, and, paint"
+    assert len(llm.prompts) == 1
+
+    # a new process reads the rewrite from disk
+    llm = FakeLLM()
+    rewriter = QueryRewriter(llm, RewriteCache(str(tmp_path / "rewrites.sqlite")))
+    rewriter.rewrite("I like to draw and paint")
+    assert llm.prompts == [] and rewriter.stats["hits"] == 1
+
+
+def test_rewrite_key_depends_on_the_prompt():
+    assert rewrite_key("jazz", "prompt v1") == rewrite_key(" Jazz", "prompt v1")
+    assert rewrite_key("jazz", "prompt v1") != rewrite_key("jazz", "prompt v2")
+
+
+def test_rewrites_expire(tmp_path):
+    cache = RewriteCache(str(tmp_path / "rewrites.sqlite"), ttl=-1)
+    cache.put("key", "jazz")
+    assert cache.get("key") is None
+
+
+def test_concurrent_identical_queries_share_one_call(tmp_path):
+    llm = FakeLLM(delay=0.2)
+    rewriter = QueryRewriter(llm, RewriteCache(str(tmp_path / "rewrites.sqlite")))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(rewriter.rewrite("jazz"))) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["jazz"] * 5
+    assert len(llm.prompts) == 1 and rewriter.stats["coalesced"] == 4
+
+
+def test_slow_rewrites_fall_back_to_the_raw_query(tmp_path):
+    rewriter = QueryRewriter(FakeLLM(delay=0.5), RewriteCache(str(tmp_path / "r.sqlite")), 0.05)
+    assert rewriter.rewrite("Jazz Blues") == "Jazz Blues"
+    assert rewriter.stats["fallbacks"] == 1
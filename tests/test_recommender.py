@@ -0,0 +1,58 @@
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.hybrid_search import hybrid_search
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter
+from crea_scraper.recommender import Recommender
+from crea_scraper.search import tfidf_search
+from tests.conftest import COURSE_DATA_PATH
+
+
+def test_lexical_results_come_before_refined_ones(tmp_path):
+    llm, embeddings = FakeLLM(), HashEmbeddings()
+    index_path = str(tmp_path / "tfidf_index")
+    recommender = Recommender(
+        COURSE_DATA_PATH, QueryRewriter(llm), embeddings, tfidf_index_path=index_path
+    ).warm_up()
+    assert set(recommender.warm_up_seconds) == {"documents", "tfidf_index", "hybrid_index"}
+    courses = recommender.courses
+
+    query = "Ik wil leren schilderen"
+    lexical, refined = recommender.recommend(query, 5)
+    assert lexical.stage == "lexical" and set(lexical.stage_seconds) == {"lexical"}
+    assert lexical.courses == tfidf_search(query, courses, 5, index_path=index_path)
+    assert refined.stage == "refined"
+    assert set(refined.stage_seconds) == {"lexical", "rewrite", "refined"}
+    search_query = llm(f"Users query: {query}")
+    assert refined.courses == hybrid_search(
+        search_query, courses, 5, embeddings, tfidf_index_path=index_path
+    )
+    assert len(llm.prompts) == 2  # one by the recommender, one above
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self, size: int):
+        super().__init__(size)
+        self.n_embedded = 0
+
+    def embed_documents(self, texts):
+        self.n_embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_warm_up_reads_the_course_vectors_from_the_vector_db(tmp_path):
+    from langchain.vectorstores import FAISS
+
+    recommender = Recommender(
+        COURSE_DATA_PATH, embeddings=HashEmbeddings(), tfidf_index_path=str(tmp_path / "i")
+    )
+    courses = recommender.warm_up().courses
+    FAISS.from_documents(courses[:-2], HashEmbeddings(96)).save_local(str(tmp_path / "db"))
+
+    embeddings = CountingEmbeddings(96)
+    Recommender(
+        COURSE_DATA_PATH,
+        rewriter=QueryRewriter(FakeLLM()),
+        embeddings=embeddings,
+        tfidf_index_path=str(tmp_path / "i"),
+        vector_db_path=str(tmp_path / "db"),
+    ).warm_up()
+    assert embeddings.n_embedded == 2  # only the courses that are not in the db
@@ -0,0 +1,133 @@
+from typing import List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from crea_scraper import search
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import CachedEmbeddings, EmbeddingCache, HashEmbeddings
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter
+from crea_scraper.recommender import Recommender
+from crea_scraper.result_cache import ResultCache, embed_query_text
+from tests.conftest import COURSE_DATA_PATH
+
+
+def test_paraphrases_are_close():
+    query = embed_query_text("I like to draw and paint")
+    assert embed_query_text("Painting and drawing!") @ query > 0.99
+    assert embed_query_text("painting, not drawing") @ query < 0.9
+    assert embed_query_text("I want to dance") @ query < 0.1
+
+
+class ConceptEmbeddings(Embeddings):
+    """
+    A stand-in for a model that knows words of the same meaning, in Dutch and English.
+    """
+
+    CONCEPTS = {"tekenen": 0, "drawing": 0, "sketching": 0, "schilderen": 1, "painting": 1}
+
+    def __init__(self):
+        self.queries: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries.append(text)
+        vector = np.zeros(3)
+        for word in text.lower().split():
+            vector[self.CONCEPTS.get(word, 2)] += 1.0
+        return vector.tolist()
+
+
+def test_paraphrases_without_common_words_need_a_model(tmp_path):
+    assert embed_query_text("ik wil leren tekenen") @ embed_query_text("drawing lessons") < 0.9
+
+    model = ConceptEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), model="concepts"))
+    cache = ResultCache(embeddings=embeddings)
+    cache.put("tekenen", "v1", 2, ["a", "b"])
+    assert cache.get("drawing", "v1", 2) == ["a", "b"]
+    assert cache.get("sketching", "v1", 2) == ["a", "b"]
+    assert cache.get("schilderen", "v1", 2) is None
+    assert cache.get("drawing", "v1", 2) == ["a", "b"]
+    # every query is sent to the model once
+    assert model.queries == ["tekenen", "drawing", "sketching", "schilderen"]
+
+
+def test_lookup_by_meaning_version_and_k():
+    cache = ResultCache(threshold=0.9)
+    assert cache.get("I like to draw and paint", "v1", 3) is None
+    cache.put("I like to draw and paint", "v1", 3, ["a", "b", "c"])
+
+    assert cache.get("painting and drawing", "v1", 2) == ["a", "b"]
+    assert cache.get("painting and drawing", "v2", 2) is None  # the index changed
+    assert cache.get("painting and drawing", "v1", 5) is None  # not enough results
+    assert cache.get("ik wil dansen", "v1", 3) is None
+    assert cache.stats == {"hits": 1, "misses": 4, "evictions": 0}
+    assert cache.hit_rate == 0.2
+
+
+def test_least_recently_used_queries_are_evicted():
+    cache = ResultCache(max_size=2)
+    cache.put("dansen", "v1", 1, ["dance"])
+    cache.put("fotografie", "v1", 1, ["photo"])
+    assert cache.get("dansen", "v1", 1) == ["dance"]
+    cache.put("keramiek", "v1", 1, ["ceramics"])
+
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.get("fotografie", "v1", 1) is None
+    assert cache.get("dansen", "v1", 1) == ["dance"]
+    assert cache.get("keramiek", "v1", 1) == ["ceramics"]
+
+
+def test_cached_searches_skip_the_rewrite(monkeypatch, tmp_path):
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+    llm = FakeLLM()
+    monkeypatch.setattr(search, "prepare_query_for_search", lambda q: llm(f"Users query: {q}"))
+    cache = ResultCache()
+
+    index_path = str(tmp_path / "tfidf_index")
+    options = dict(method="tfidf", k=5, verbose=False, result_cache=cache, index_path=index_path)
+    first = search.get_relevant_courses("Ik wil leren schilderen", courses, **options)
+    second = search.get_relevant_courses("schilderen", courses, **options)
+    assert second == first and len(llm.prompts) == 1
+
+    # other urls search another index
+    urls = {first[0].metadata["url"]}
+    assert search.get_relevant_courses("schilderen", courses, urls=urls, **options) == first[:1]
+    assert len(llm.prompts) == 2
+
+
+def test_recommender_answers_from_the_cache(tmp_path):
+    recommender = Recommender(
+        COURSE_DATA_PATH,
+        rewriter=QueryRewriter(FakeLLM()),
+        embeddings=HashEmbeddings(),
+        tfidf_index_path=str(tmp_path / "tfidf_index"),
+        result_cache=ResultCache(),
+    )
+    first = list(recommender.recommend("I like to draw and paint", 5))
+    second = list(recommender.recommend("painting and drawing", 5))
+    assert [r.stage for r in first] == ["lexical", "refined"]
+    assert [r.stage for r in second] == ["refined"]
+    assert second[0].courses == first[-1].courses
+    assert set(second[0].stage_seconds) == {"cache"}
+
+
+def test_index_version_depends_on_the_embeddings_and_the_prompt(tmp_path, monkeypatch):
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+    options = dict(courses=courses, index_path=str(tmp_path / "index"))
+    version = search.index_version("hybrid", embeddings=HashEmbeddings(), **options)
+    assert search.index_version("hybrid", embeddings=HashEmbeddings(), **options) == version
+    assert search.index_version("hybrid", embeddings=HashEmbeddings(64), **options) != version
+
+    monkeypatch.setattr("crea_scraper.query_rewrite.prompt_hash", lambda: "prompt v2")
+    assert search.index_version("hybrid", embeddings=HashEmbeddings(), **options) != version
@@ -0,0 +1,55 @@
+from benchmarks.retrieval_eval import STAGES, evaluate, load_queries
+
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import HashEmbeddings
+from crea_scraper.hybrid_search import hybrid_search
+from crea_scraper.query_rewrite import FakeLLM, QueryRewriter
+from crea_scraper.search import SearchStats, get_relevant_courses_batch
+from tests.conftest import COURSE_DATA_PATH, QUERIES_PATH
+
+
+def test_batch_results_match_single_queries(tmp_path):
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    courses = get_course_documents_for_search(prepare_for_search(course_data))
+    embeddings = HashEmbeddings()
+    llm = FakeLLM()
+    queries = ["I want to dance", "fotografie", "I want to dance"]
+
+    stats = SearchStats()
+    index_path = str(tmp_path / "tfidf_index")
+    results = get_relevant_courses_batch(
+        queries,
+        courses,
+        k=5,
+        rewriter=QueryRewriter(llm),
+        embeddings=embeddings,
+        stats=stats,
+        index_path=index_path,
+    )
+    assert set(stats.stage_seconds) == set(STAGES)
+    for query, found in zip(queries, results):
+        search_query = llm(f"Users query: {query}")
+        assert found == hybrid_search(
+            search_query, courses, 5, embeddings, tfidf_index_path=index_path
+        )
+
+
+def test_evaluate_offline(tmp_path):
+    report = evaluate(
+        load_queries(QUERIES_PATH),
+        COURSE_DATA_PATH,
+        k=10,
+        batch_size=4,
+        rewriter=QueryRewriter(FakeLLM()),
+        embeddings=HashEmbeddings(),
+        tfidf_index_path=str(tmp_path / "tfidf_index"),
+    )
+    assert report["n_queries"] == 12
+    assert 0 < report["recall@10"] <= 1 and 0 < report["mrr"] <= 1
+    assert set(report["latency_ms"]) == set(STAGES)
+    assert set(report["latency_ms"]["score"]) == {"p50", "p95", "p99"}
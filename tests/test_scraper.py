@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from aiohttp import web
+
+from crea_scraper import scraper
+from crea_scraper.cache import CachedPage
+from crea_scraper.data import (
+    COURSE_DATA_COLUMNS,
+    CourseDataWriter,
+    export_course_data_csv,
+    load_course_data,
+    write_course_data,
+)
+from crea_scraper.fetch import FetchScheduler
+from tests.conftest import read_fixture
+
+COURSE_FIXTURES = {f"/course/{i}": f"course_{i}.html" for i in (1, 2, 3)}
+
+
+def test_course_pages_are_streamed_in_order(tmp_path, serve):
+    async def handler(request):
+        # answer the first course last, so pages arrive out of order
+        await asyncio.sleep(0.1 if request.path.endswith("1") else 0)
+        return web.Response(text=read_fixture(COURSE_FIXTURES[request.path]))
+
+    received = []
+    output_path = str(tmp_path / "course_data.parquet")
+
+    async def scrape(base_url):
+        course_urls = [base_url + path for path in COURSE_FIXTURES]
+        with (
+            ProcessPoolExecutor(max_workers=2) as executor,
+            CourseDataWriter(output_path) as writer,
+        ):
+
+            def on_course_data(general_info, courses):
+                received.append(general_info.naam)
+                writer.add(general_info, courses)
+
+            async with FetchScheduler() as scheduler:
+                await scraper.scrape_courses(scheduler, course_urls, on_course_data, executor)
+
+    serve(handler, scrape)
+    assert received == ["Acteren en Theatermaken", "Creatief Schrijven", "Acteren voor Camera"]
+
+    streamed = load_course_data(output_path)
+    assert list(streamed.columns) == COURSE_DATA_COLUMNS
+    assert len(streamed) == 2 + 4 + 1
+
+
+def test_streamed_csv_matches_written_csv(tmp_path):
+    pages = [scraper._parse_course_page(read_fixture(f"course_{i}.html")) for i in (1, 2, 3, 1)]
+    with CourseDataWriter(str(tmp_path / "streamed.parquet"), row_group_size=2) as writer:
+        for general_info, courses in pages:
+            writer.add(general_info, courses)
+    export_course_data_csv(str(tmp_path / "streamed.parquet"), str(tmp_path / "streamed.csv"))
+
+    df = scraper.get_courses_data(
+        [
+            CachedPage(url="", body=read_fixture(f"course_{i}.html"), content_hash="")
+            for i in (1, 2, 3)
+        ]
+    )
+    write_course_data(df, str(tmp_path / "written.csv"))
+
+    assert (tmp_path / "streamed.csv").read_text() == (tmp_path / "written.csv").read_text()
@@ -0,0 +1,86 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.tfidf_index import TfidfIndex, get_tfidf_index
+from tests.conftest import COURSE_DATA_PATH
+
+QUERIES = ["jazz, muziek, instrument", "schilderen, painting, tekenen", "dansen, not ballet"]
+
+
+def _courses():
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    return get_course_documents_for_search(prepare_for_search(course_data))
+
+
+def test_tfidf_index_matches_refit(tmp_path):
+    courses = _courses()
+    texts = [course.page_content for course in courses]
+    vectorizer = TfidfVectorizer()
+    documents = vectorizer.fit_transform(texts)
+    expected = linear_kernel(vectorizer.transform(QUERIES), documents)
+
+    index = get_tfidf_index(courses, str(tmp_path / "index"))
+    np.testing.assert_allclose(index.scores(QUERIES), expected, atol=1e-12)
+
+    top_k, scores = index.search(QUERIES, k=5)
+    for row, query_scores in enumerate(expected):
+        np.testing.assert_allclose(scores[row], np.sort(query_scores)[::-1][:5])
+        np.testing.assert_allclose(query_scores[top_k[row]], scores[row])
+
+
+def test_tfidf_index_is_persisted_and_rebuilt_on_change(tmp_path):
+    courses = _courses()
+    path = str(tmp_path / "index")
+    index = get_tfidf_index(courses, path)
+    assert get_tfidf_index(courses, path) is index
+
+    loaded = TfidfIndex.load(path)
+    assert not loaded.matrix.data.flags.writeable  # a view on the memory mapped file
+    np.testing.assert_allclose(loaded.scores(QUERIES), index.scores(QUERIES))
+
+    changed = get_tfidf_index(courses[:-1], path)
+    assert len(changed) == len(courses) - 1
+    assert TfidfIndex.stored_hash(path) == changed.data_hash != index.data_hash
+
+
+def test_tfidf_search_mask(tmp_path):
+    index = get_tfidf_index(_courses(), str(tmp_path / "index"))
+    mask = np.zeros(len(index), dtype=bool)
+    mask[[1, 3]] = True
+    top_k, _ = index.search(QUERIES, k=4, mask=mask)
+    for row in top_k:
+        assert set(row[:2]) == {1, 3}
+        assert list(row[2:]) == [-1, -1]
+
+
+def test_tfidf_save_keeps_mapped_arrays(tmp_path):
+    courses = _courses()
+    path = str(tmp_path / "index")
+    TfidfIndex.build([course.page_content for course in courses]).save(path)
+    mapped = TfidfIndex.load(path)
+    expected = np.array(mapped.scores(QUERIES))
+
+    # a rebuild for other courses is saved next to the mapped arrays, not over them
+    TfidfIndex.build([course.page_content for course in courses[:-1]]).save(path)
+    np.testing.assert_allclose(mapped.scores(QUERIES), expected)
+    assert len(TfidfIndex.load(path)) == len(courses) - 1
+    assert len(list((tmp_path / "index").glob("*.npy"))) == 8  # this and the previous version
+
+
+def test_tfidf_index_is_not_rehashed_for_the_same_courses(tmp_path, monkeypatch):
+    courses = _courses()
+    path = str(tmp_path / "index")
+    index = get_tfidf_index(courses, path)
+
+    def corpus_hash(texts):
+        raise AssertionError("the corpus is hashed again")
+
+    monkeypatch.setattr("crea_scraper.tfidf_index.corpus_hash", corpus_hash)
+    assert get_tfidf_index(courses, path) is index
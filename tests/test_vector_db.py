@@ -0,0 +1,82 @@
+from typing import List
+
+import numpy as np
+from langchain.vectorstores import FAISS
+
+from crea_scraper.data import (
+    SEARCH_COLUMNS,
+    get_course_documents_for_search,
+    load_course_data,
+    prepare_for_search,
+)
+from crea_scraper.embeddings import CachedEmbeddings, EmbeddingCache, HashEmbeddings
+from crea_scraper.vector_db import update_vector_db
+from tests.conftest import COURSE_DATA_PATH
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.batches: List[List[str]] = []
+
+    def embed_documents(self, texts):
+        self.batches.append(texts)
+        return super().embed_documents(texts)
+
+
+def _courses():
+    course_data = load_course_data(COURSE_DATA_PATH, columns=SEARCH_COLUMNS)
+    return get_course_documents_for_search(prepare_for_search(course_data))
+
+
+def test_hash_embeddings_are_deterministic():
+    embeddings = HashEmbeddings(size=64)
+    a, b = embeddings.embed_documents(["jazz en blues", "ballet"])
+    assert a == HashEmbeddings(size=64).embed_query("jazz en blues")
+    assert np.isclose(np.linalg.norm(a), 1.0) and a != b
+
+
+def test_only_uncached_texts_are_embedded_in_batches(tmp_path):
+    provider = CountingEmbeddings()
+    embeddings = CachedEmbeddings(provider, EmbeddingCache(str(tmp_path)), batch_size=2)
+    vectors = embeddings.embed_documents(["a", "b", "c", "a"])
+    assert sorted(map(len, provider.batches)) == [1, 2]
+    assert vectors[0] == vectors[3] == HashEmbeddings().embed_query("a")
+
+    # a new process, reading the cache from disk
+    provider = CountingEmbeddings()
+    embeddings = CachedEmbeddings(provider, EmbeddingCache(str(tmp_path)), batch_size=2)
+    assert embeddings.embed_documents(["c", "d"])[0] == vectors[2]
+    assert provider.batches == [["d"]]
+
+
+def test_vector_db_is_updated_incrementally(tmp_path):
+    courses = _courses()
+    provider = CountingEmbeddings()
+    embeddings = CachedEmbeddings(provider, EmbeddingCache(str(tmp_path)))
+    db = update_vector_db(None, courses, embeddings)
+    assert db.index.ntotal == len(courses)
+
+    changed = courses[1:]
+    changed[0] = type(changed[0])(page_content="Course title: Jazz", metadata=changed[0].metadata)
+    provider.batches = []
+    db = update_vector_db(db, changed, embeddings)
+    assert provider.batches == [["Course title: Jazz"]]
+    assert db.index.ntotal == len(changed)
+
+    rebuilt = FAISS.from_documents(changed, HashEmbeddings())
+    for query in ["jazz muziek", "schilderen en tekenen"]:
+        assert [d.page_content for d in db.similarity_search(query, k=5)] == [
+            d.page_content for d in rebuilt.similarity_search(query, k=5)
+        ]
+
+
+def test_vectors_of_an_old_vector_db_are_reused(tmp_path):
+    courses = _courses()
+    old_db = FAISS.from_documents(courses, HashEmbeddings())
+    provider = CountingEmbeddings()
+    db = update_vector_db(
+        old_db, courses, CachedEmbeddings(provider, EmbeddingCache(str(tmp_path)))
+    )
+    assert provider.batches == []
+    assert db.index.ntotal == len(courses)